@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'erp.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,16 +77,56 @@ TEMPLATES = [
 WSGI_APPLICATION = 'delicious_erp.wsgi.application'
 
 
+# Request timing (see erp/middleware.py)
+
+# Instrumenting costs a little on every query, so only a sample of requests
+# is timed by default.
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 0.01))
+
+REQUEST_TIMING_SLOW_MS = 500
+
+REQUEST_TIMING_SLOWEST_STATEMENTS = 3
+
+# Seconds to keep cached balance sheet pages for. Entries are invalidated by
+# version when the ledger changes, this only bounds their lifetime.
+LEDGER_CACHE_TIMEOUT = 3600
+
+
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# SQLite, set up for several worker processes: readers and the writer do not
+# block each other in WAL mode, writers queue for the lock for up to
+# busy_timeout milliseconds, and connections are reused across requests.
+# Every value can be overridden through the environment.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'erp.backends.sqlite3',
+        'NAME': os.environ.get('DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+            'pragmas': {
+                'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+                'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'normal'),
+                'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+                'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 2**20)),
+                # Negative sizes are in KiB.
+                'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 2**10)),
+                'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'memory'),
+            },
+        },
     }
 }
 
+# Retries of write transactions that found the database locked (see
+# erp/db.py).
+WRITE_RETRY_ATTEMPTS = int(os.environ.get('WRITE_RETRY_ATTEMPTS', 5))
+
+WRITE_RETRY_BACKOFF_MS = int(os.environ.get('WRITE_RETRY_BACKOFF_MS', 50))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -18,6 +18,7 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 
+import erp.api as api
 import erp.views as erp
 
 
@@ -26,12 +27,22 @@ urlpatterns = (
         path("", erp.home),
         path("cost-centers", erp.CostCenterListView.as_view()),
         path("cost-centers/<int:pk>", erp.CostCenterDetailView.as_view(), name='cost-center'),
+        path("cost-centers/<int:pk>/export", erp.export_balance_sheet),
+        path("cost-centers/<int:pk>/runway", erp.cost_center_runway),
         path("purchases", erp.PurchasesListView.as_view()),
         path("purchases/<int:pk>", erp.PurchaseDetailView.as_view(), name='purchase'),
         path("purchases/create", erp.PurchaseCreateView.as_view()),
+        path("purchases/create-batch", erp.create_purchase_batch),
+        path("purchases/export", erp.export_purchases),
         path("fundings", erp.FundingsListView.as_view()),
         path("fundings/<int:pk>", erp.FundingDetailView.as_view(), name='funding'),
+        path("fundings/export", erp.export_fundings),
+        path("item-kinds/search", erp.search_item_kinds),
+        path("search", erp.search),
+        path("analytics/<report>", erp.analytics),
         path("s/<id>", erp.resolve_id),
+        path("api/<resource>", api.list_view),
+        path("api/<resource>/<id>", api.detail_view),
         path("admin/", admin.site.urls),
     ]
     + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,8 +1,145 @@
-from django.contrib import admin
-from .models import *
-
-# Register your models here.
-admin.site.register(CostCenter)
-admin.site.register(ItemKind)
-admin.site.register(Purchase)
-admin.site.register(Funding)
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.paginator import Paginator
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+
+from .forms import ReassignCostCenterForm
+from .models import (
+    CostCenter,
+    Funding,
+    ItemKind,
+    Purchase,
+    delete_transactions,
+    reassign_transactions,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Estimates the length of unfiltered lists of big tables from the range
+    of their ids, which SQLite reads off the primary key at once, where
+    COUNT(*) scans the whole table. Deleted and archived rows still count,
+    so the estimate errs high. Filtered lists are counted exactly.
+    """
+
+    # Tables up to this size are counted exactly.
+    EXACT_COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if queryset.query.has_filters():
+            return super().count
+        ids = queryset.model.objects.values_list("pk", flat=True)
+        first, last = ids.order_by("pk").first(), ids.order_by("-pk").first()
+        if first is None:
+            return 0
+        estimate = last - first + 1
+        if estimate <= self.EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class TransactionAdmin(admin.ModelAdmin):
+    """
+    Shared options of the purchase and funding admins, which must stay
+    usable with millions of rows.
+    """
+
+    paginator = EstimatedCountPaginator
+    # Otherwise filtered lists count the whole table too.
+    show_full_result_count = False
+    list_select_related = ["cost_center"]
+    autocomplete_fields = ["cost_center"]
+    actions = ["reassign_cost_center"]
+
+    def delete_queryset(self, request, queryset):
+        # The deletion collector would load the selected rows and update the
+        # ledger one row at a time.
+        delete_transactions(queryset)
+
+    @admin.action(description="Reassign selected %(verbose_name_plural)s")
+    def reassign_cost_center(self, request, queryset):
+        form = ReassignCostCenterForm(request.POST if "apply" in request.POST else None)
+        if form.is_valid():
+            cost_center = form.cleaned_data["cost_center"]
+            count = reassign_transactions(queryset, cost_center)
+            self.message_user(
+                request,
+                f"Moved {count} {self.opts.verbose_name_plural} to {cost_center}.",
+                messages.SUCCESS,
+            )
+            return None
+
+        return TemplateResponse(
+            request,
+            "admin/erp/reassign_cost_center.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": f"Reassign {self.opts.verbose_name_plural}",
+                "opts": self.opts,
+                "form": form,
+                "count": queryset.count(),
+                "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                "select_across": request.POST.get("select_across") == "1",
+                "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            },
+        )
+
+
+@admin.register(Purchase)
+class PurchaseAdmin(TransactionAdmin):
+    list_display = [
+        "id",
+        "purchase_date",
+        "item",
+        "quantity",
+        "total_price",
+        "cost_center",
+        "comment",
+    ]
+    list_display_links = ["id", "purchase_date"]
+    list_select_related = ["cost_center", "item"]
+    # Both are served by the (cost_center, purchase_date) and
+    # (purchase_date, id) indexes. A date_hierarchy would list the years of
+    # every purchase first, in a full scan.
+    list_filter = [("purchase_date", admin.DateFieldListFilter), "cost_center"]
+    ordering = ["-purchase_date", "-id"]
+    autocomplete_fields = ["cost_center", "item"]
+    raw_id_fields = ["purchaser"]
+    readonly_fields = ["create_date", "last_update_date"]
+
+
+@admin.register(Funding)
+class FundingAdmin(TransactionAdmin):
+    list_display = ["id", "funding_date", "name", "credit", "cost_center"]
+    list_display_links = ["id", "funding_date", "name"]
+    list_filter = [("funding_date", admin.DateFieldListFilter), "cost_center"]
+    ordering = ["-funding_date", "-id"]
+    readonly_fields = ["create_date", "last_update_date"]
+
+
+@admin.register(CostCenter)
+class CostCenterAdmin(admin.ModelAdmin):
+    list_display = ["name", "parent", "path", "total_balance"]
+    list_select_related = ["parent", "balance"]
+    search_fields = ["name"]
+    ordering = ["path"]
+    autocomplete_fields = ["parent"]
+    readonly_fields = ["path"]
+
+
+@admin.register(ItemKind)
+class ItemKindAdmin(admin.ModelAdmin):
+    list_display = ["name", "description"]
+    # Searches are served by the unique index, see get_search_results().
+    search_fields = ["^normalized_name"]
+    ordering = ["normalized_name"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # The whole term is one prefix of the normalized name, rather than a
+        # LIKE per word, which SQLite cannot answer from the index.
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(ItemKind.prefix_q(search_term)), False
@@ -0,0 +1,335 @@
+"""
+Spend analytics over the ledger, computed with NumPy.
+
+The purchase and funding columns that the reports need are loaded once per
+request into integer arrays, with amounts in cents and dates as month
+numbers, so that every report is a handful of vectorized group-bys instead
+of a loop over rows. Totals of subtrees are rolled up along the cost center
+paths.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db import connections
+from django.db.models import F, IntegerField, QuerySet, Value
+from django.db.models.functions import Cast, Round, Substr
+
+from .models import CostCenter, Funding, ItemKind, Purchase, path_ids
+
+CHUNK_SIZE = 10000
+
+
+def month_number(field: str):
+    """
+    An expression for the months since year 0 of a date field.
+
+    SQLite stores datetimes as UTC text, and reading the year and month
+    digits out of it is much faster than ExtractYear and ExtractMonth, which
+    parse every value in Python. Months are therefore UTC months, like
+    TIME_ZONE.
+    """
+    year = Cast(Substr(field, 1, 4), IntegerField())
+    month = Cast(Substr(field, 6, 2), IntegerField())
+    return year * Value(12) + month - Value(1)
+
+
+def cents(field: str):
+    return Cast(Round(F(field) * Value(100)), IntegerField())
+
+
+def format_month(month: int) -> str:
+    return f"{month // 12:04}-{month % 12 + 1:02}"
+
+
+def format_cents(amount) -> str:
+    return str(Decimal(int(amount)).scaleb(-2))
+
+
+def load_array(queryset: QuerySet, width: int) -> np.ndarray:
+    """
+    Reads a values_list() queryset of `width` integer columns into a (rows,
+    width) array, one chunk at a time.
+
+    The rows are fetched with a plain cursor, since Django's per-value
+    converters would cost more than everything else here.
+    """
+    sql, params = queryset.query.sql_with_params()
+    chunks = []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while chunk := cursor.fetchmany(CHUNK_SIZE):
+            chunks.append(np.array(chunk, dtype=np.int64))
+    if not chunks:
+        return np.empty((0, width), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def load_array_and_labels(
+    queryset: QuerySet, width: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Like load_array(), for a values_list() queryset of `width` integer
+    columns followed by a text column, which is returned as a separate
+    array.
+    """
+    sql, params = queryset.query.sql_with_params()
+    chunks = []
+    labels = []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while chunk := cursor.fetchmany(CHUNK_SIZE):
+            *columns, chunk_labels = zip(*chunk)
+            chunks.append(np.array(columns, dtype=np.int64).T)
+            labels += chunk_labels
+    if not chunks:
+        return np.empty((0, width), dtype=np.int64), np.array([], dtype=str)
+    return np.concatenate(chunks), np.array(labels, dtype=str)
+
+
+class Ledger:
+    """
+    The transactions of a cost center's subtree (or of every cost center)
+    in a date range, as columns.
+    """
+
+    def __init__(
+        self,
+        cost_center: Optional[CostCenter] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ):
+        cost_centers = (
+            cost_center.subtree() if cost_center is not None else CostCenter.objects
+        )
+        cost_centers = list(cost_centers.order_by("id").values("id", "name", "path"))
+        self.cost_centers = cost_centers
+        self.cost_center_ids = np.array([cc["id"] for cc in cost_centers], np.int64)
+
+        # (ancestor, descendant) index pairs within the loaded cost centers,
+        # including every cost center with itself.
+        pairs = [
+            (ancestor, descendant)
+            for descendant, cc in enumerate(cost_centers)
+            for ancestor in self.cost_center_index(
+                np.array(path_ids(cc["path"]), np.int64)
+            )
+            if ancestor >= 0
+        ]
+        self.ancestors, self.descendants = np.array(pairs, np.int64).reshape(-1, 2).T
+
+        purchases = Purchase.objects.all()
+        fundings = Funding.objects.all()
+        if cost_center is not None:
+            purchases = purchases.filter(cost_center__in=cost_center.subtree())
+            fundings = fundings.filter(cost_center__in=cost_center.subtree())
+        if start is not None:
+            purchases = purchases.filter(purchase_date__gte=start)
+            fundings = fundings.filter(funding_date__gte=start)
+        if end is not None:
+            purchases = purchases.filter(purchase_date__lt=end)
+            fundings = fundings.filter(funding_date__lt=end)
+
+        p, suppliers = load_array_and_labels(
+            purchases.values_list(
+                "cost_center_id",
+                "item_id",
+                cents("total_price"),
+                month_number("purchase_date"),
+                # An expression, so that it is selected after the others.
+                F("supplier"),
+            ),
+            4,
+        )
+        # Suppliers are strings, so they are kept as their positions in the
+        # sorted list of distinct suppliers. Both come from the same rows, so
+        # they agree even if purchases are written in between queries.
+        unique_suppliers, self.purchase_suppliers = np.unique(
+            suppliers, return_inverse=True
+        )
+        self.suppliers: List[str] = unique_suppliers.tolist()
+        self.purchase_cost_centers = self.cost_center_index(p[:, 0])
+        self.purchase_items = p[:, 1]
+        self.purchase_amounts = p[:, 2]
+        self.purchase_months = p[:, 3]
+
+        f = load_array(
+            fundings.values_list(
+                "cost_center_id", cents("credit"), month_number("funding_date")
+            ),
+            3,
+        )
+        self.funding_cost_centers = self.cost_center_index(f[:, 0])
+        self.funding_amounts = f[:, 1]
+        self.funding_months = f[:, 2]
+
+        months = np.concatenate([self.purchase_months, self.funding_months])
+        self.first_month = int(months.min()) if len(months) else 0
+        self.month_count = (
+            int(months.max()) - self.first_month + 1 if len(months) else 0
+        )
+
+    def cost_center_index(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Maps cost center ids to their positions in self.cost_centers, or -1
+        for cost centers outside of it.
+        """
+        if not len(self.cost_center_ids):
+            return np.full(len(ids), -1, np.int64)
+        index = np.searchsorted(self.cost_center_ids, ids)
+        index = np.minimum(index, len(self.cost_center_ids) - 1)
+        return np.where(self.cost_center_ids[index] == ids, index, -1)
+
+    def group(self, keys: np.ndarray, amounts: np.ndarray, size: int) -> np.ndarray:
+        """
+        Sums amounts per key, for keys in range(size).
+        """
+        return np.bincount(keys, weights=amounts, minlength=size).astype(np.int64)
+
+    def rollup(self, own: np.ndarray) -> np.ndarray:
+        """
+        Turns per cost center totals (along the first axis) into totals of
+        their subtrees.
+        """
+        subtree = np.zeros_like(own)
+        np.add.at(subtree, self.ancestors, own[self.descendants])
+        return subtree
+
+    def per_cost_center_and_month(
+        self, cost_centers: np.ndarray, months: np.ndarray, amounts: np.ndarray
+    ) -> np.ndarray:
+        keys = cost_centers * self.month_count + (months - self.first_month)
+        size = len(self.cost_centers) * self.month_count
+        return self.group(keys, amounts, size).reshape(
+            len(self.cost_centers), self.month_count
+        )
+
+    def monthly(self) -> Dict:
+        """
+        Spending and funding per cost center and month, both of the cost
+        center itself and of its subtree.
+        """
+        spend = self.per_cost_center_and_month(
+            self.purchase_cost_centers, self.purchase_months, self.purchase_amounts
+        )
+        funding = self.per_cost_center_and_month(
+            self.funding_cost_centers, self.funding_months, self.funding_amounts
+        )
+        subtree_spend, subtree_funding = self.rollup(spend), self.rollup(funding)
+        return {
+            "months": [
+                format_month(self.first_month + i) for i in range(self.month_count)
+            ],
+            "cost_centers": [
+                {
+                    **cc,
+                    "spend": list(map(format_cents, spend[i])),
+                    "funding": list(map(format_cents, funding[i])),
+                    "subtree_spend": list(map(format_cents, subtree_spend[i])),
+                    "subtree_funding": list(map(format_cents, subtree_funding[i])),
+                }
+                for i, cc in enumerate(self.cost_centers)
+            ],
+        }
+
+    def item_kinds(self, limit: Optional[int] = None) -> Dict:
+        """
+        Spending and number of purchases per item kind, biggest first.
+        """
+        ids, index = np.unique(self.purchase_items, return_inverse=True)
+        spend = self.group(index, self.purchase_amounts, len(ids))
+        counts = np.bincount(index, minlength=len(ids))
+        order = np.argsort(-spend, kind="stable")[:limit]
+
+        names = dict(
+            ItemKind.objects.filter(pk__in=ids[order].tolist()).values_list(
+                "id", "name"
+            )
+        )
+        return {
+            "item_kinds": [
+                {
+                    "id": int(ids[i]),
+                    "name": names[int(ids[i])],
+                    "purchases": int(counts[i]),
+                    "spend": format_cents(spend[i]),
+                }
+                for i in order
+            ]
+        }
+
+    def top_suppliers(self, limit: Optional[int] = 10) -> Dict:
+        """
+        The suppliers with the most spending.
+        """
+        suppliers = self.suppliers
+        spend = self.group(
+            self.purchase_suppliers, self.purchase_amounts, len(suppliers)
+        )
+        counts = np.bincount(self.purchase_suppliers, minlength=len(suppliers))
+        order = np.argsort(-spend, kind="stable")[:limit]
+        return {
+            "suppliers": [
+                {
+                    "supplier": suppliers[i],
+                    "purchases": int(counts[i]),
+                    "spend": format_cents(spend[i]),
+                }
+                for i in order
+            ]
+        }
+
+    def year_over_year(self) -> Dict:
+        """
+        Spending of every cost center's subtree per year, with the change
+        from the year before (None for the first year).
+        """
+        if not self.month_count:
+            return {"years": [], "cost_centers": []}
+        first_year = self.first_month // 12
+        year_count = (self.first_month + self.month_count - 1) // 12 - first_year + 1
+        keys = self.purchase_cost_centers * year_count + (
+            self.purchase_months // 12 - first_year
+        )
+        spend = self.rollup(
+            self.group(
+                keys, self.purchase_amounts, len(self.cost_centers) * year_count
+            ).reshape(len(self.cost_centers), year_count)
+        )
+        previous = spend[:, :-1]
+        change = spend[:, 1:] - previous
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(previous > 0, change / previous, np.nan)
+
+        return {
+            "years": list(range(first_year, first_year + year_count)),
+            "cost_centers": [
+                {
+                    **cc,
+                    "spend": list(map(format_cents, spend[i])),
+                    "change": [None, *map(format_cents, change[i])],
+                    "relative_change": [
+                        None,
+                        *(
+                            None if np.isnan(r) else round(float(r), 4)
+                            for r in ratio[i]
+                        ),
+                    ],
+                }
+                for i, cc in enumerate(self.cost_centers)
+            ],
+        }
+
+
+REPORTS = {
+    "monthly": Ledger.monthly,
+    "item-kinds": Ledger.item_kinds,
+    "suppliers": Ledger.top_suppliers,
+    "year-over-year": Ledger.year_over_year,
+}
+
+
+def run_report(name: str, **filters) -> Dict:
+    return REPORTS[name](Ledger(**filters))
@@ -0,0 +1,218 @@
+"""
+Read-only JSON API over cost centers, purchases, fundings and ledger
+transactions, served by async views.
+
+Every resource is listed at /api/<resource> and fetched one at a time at
+/api/<resource>/<id>. Query parameters:
+
+fields
+    Comma-separated fields to return, all of them by default.
+ids
+    Comma-separated ids to fetch in one request. Transactions are keyed by
+    their short ids, e.g. "P123,F45", whose prefix is case-insensitive like
+    in /s/<id>.
+cost_center
+    Only the given cost center's subtree.
+after, limit
+    Pagination of lists without ids: up to `limit` rows with ids greater
+    than `after`, in id order. The response links the next page.
+    Transactions are ordered by their short ids as strings, so all
+    carry-forwards come first, then fundings, then purchases, with "P10"
+    before "P9". That order is served by the primary key; sort by date on
+    the client where it matters.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from django.core.exceptions import BadRequest
+from django.db.models import F, Model, QuerySet
+from django.db.models.expressions import Combinable
+from django.http import Http404, HttpRequest, JsonResponse
+
+from .models import CostCenter, Funding, LedgerEntry, Purchase, subtree_q
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class Resource(NamedTuple):
+    model: type[Model]
+    # API field names, mapped to model fields of the same name (None) or to
+    # expressions.
+    fields: Dict[str, Optional[Combinable]]
+    key: str = "id"
+    # Prefix of the lookup of the cost center's path, for the subtree filter.
+    path_prefix: str = "cost_center__"
+
+    def parse_id(self, value: str) -> Union[int, str]:
+        if self.key == "id":
+            try:
+                return int(value)
+            except ValueError:
+                raise BadRequest(f"Invalid id {value!r}")
+        # Short ids, whose prefix is stored in upper case.
+        return value[:1].upper() + value[1:]
+
+    def queryset(self, fields: List[str]) -> QuerySet:
+        fields = list(dict.fromkeys(fields))
+        return self.model.objects.values(
+            *(name for name in fields if self.fields[name] is None),
+            **{
+                name: expression
+                for name, expression in self.fields.items()
+                if name in fields and expression is not None
+            },
+        )
+
+
+SUBTREE_BALANCE = F("balance__subtree_credit") - F("balance__subtree_debit")
+
+RESOURCES = {
+    "cost-centers": Resource(
+        CostCenter,
+        {
+            "id": None,
+            "name": None,
+            "description": None,
+            "parent_id": None,
+            "path": None,
+            "own_credit": F("balance__own_credit"),
+            "own_debit": F("balance__own_debit"),
+            "subtree_credit": F("balance__subtree_credit"),
+            "subtree_debit": F("balance__subtree_debit"),
+            "subtree_balance": SUBTREE_BALANCE,
+            "version": F("balance__version"),
+        },
+        path_prefix="",
+    ),
+    "purchases": Resource(
+        Purchase,
+        {
+            "id": None,
+            "purchase_date": None,
+            "item_id": None,
+            "item_name": F("item__name"),
+            "quantity": None,
+            "total_price": None,
+            "supplier": None,
+            "comment": None,
+            "cost_center_id": None,
+            "cost_center_name": F("cost_center__name"),
+        },
+    ),
+    "fundings": Resource(
+        Funding,
+        {
+            "id": None,
+            "name": None,
+            "funding_date": None,
+            "credit": None,
+            "comment": None,
+            "cost_center_id": None,
+            "cost_center_name": F("cost_center__name"),
+        },
+    ),
+    # Purchases and fundings in the form the balance sheets show them.
+    "transactions": Resource(
+        LedgerEntry,
+        {
+            "source": None,
+            "date": None,
+            "name": None,
+            "amount": None,
+            "cost_center_id": None,
+            "path": None,
+        },
+        key="source",
+        path_prefix="",
+    ),
+}
+
+
+def _resource(name: str) -> Resource:
+    try:
+        return RESOURCES[name]
+    except KeyError:
+        raise Http404(f"Unknown resource {name!r}")
+
+
+def _fields(request: HttpRequest, resource: Resource) -> List[str]:
+    value = request.GET.get("fields")
+    if not value:
+        return list(resource.fields)
+    fields = value.split(",")
+    unknown = [name for name in fields if name not in resource.fields]
+    if unknown:
+        raise BadRequest(
+            f"Unknown fields {', '.join(unknown)}, expected some of "
+            f"{', '.join(resource.fields)}"
+        )
+    return fields
+
+
+def _limit(request: HttpRequest) -> int:
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest("limit must be a number")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+async def list_view(request: HttpRequest, resource: str) -> JsonResponse:
+    resource = _resource(resource)
+    fields = _fields(request, resource)
+    key = resource.key
+    queryset = resource.queryset([*fields, key]).order_by(key)
+
+    cost_center = request.GET.get("cost_center")
+    if cost_center:
+        path = await (
+            CostCenter.objects.filter(
+                pk=RESOURCES["cost-centers"].parse_id(cost_center)
+            )
+            .values_list("path", flat=True)
+            .afirst()
+        )
+        if path is None:
+            raise BadRequest(f"Cost center {cost_center} does not exist")
+        queryset = queryset.filter(subtree_q(path, resource.path_prefix))
+
+    if "ids" in request.GET:
+        ids = [resource.parse_id(i) for i in request.GET["ids"].split(",") if i]
+        if len(ids) > MAX_LIMIT:
+            raise BadRequest(f"At most {MAX_LIMIT} ids can be fetched at once")
+        rows = [row async for row in queryset.filter(**{f"{key}__in": ids})]
+        found = {row[key] for row in rows}
+        body = {"results": rows, "missing": [i for i in ids if i not in found]}
+    else:
+        limit = _limit(request)
+        after = request.GET.get("after")
+        if after:
+            queryset = queryset.filter(**{f"{key}__gt": resource.parse_id(after)})
+        rows = [row async for row in queryset[: limit + 1]]
+        body = {"results": rows[:limit], "next": None}
+        if len(rows) > limit:
+            query = request.GET.copy()
+            query["after"] = rows[limit - 1][key]
+            body["next"] = f"{request.path}?{query.urlencode()}"
+
+    # The key is always loaded, for pagination and missing ids.
+    if key not in fields:
+        for row in body["results"]:
+            del row[key]
+    return JsonResponse(body)
+
+
+async def detail_view(request: HttpRequest, resource: str, id: str) -> JsonResponse:
+    resource = _resource(resource)
+    fields = _fields(request, resource)
+    row = (
+        await resource.queryset(fields)
+        .filter(**{resource.key: resource.parse_id(id)})
+        .afirst()
+    )
+    if row is None:
+        raise Http404(f"No such {resource.model.__name__}")
+    return JsonResponse(row)
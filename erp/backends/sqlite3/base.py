@@ -0,0 +1,51 @@
+"""
+Django's SQLite backend, tuned for several processes sharing the database.
+
+OPTIONS takes, besides the arguments of sqlite3.connect():
+
+pragmas
+    PRAGMA names and values to set on every new connection, e.g.
+    {"journal_mode": "wal", "busy_timeout": 5000}.
+transaction_mode
+    "DEFERRED" (SQLite's default), "IMMEDIATE" or "EXCLUSIVE". Immediate
+    transactions take the write lock when they begin, so waiting for it is
+    covered by busy_timeout. Deferred ones take it on their first write, and
+    fail right away if another connection wrote since they started reading.
+"""
+
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = {"DEFERRED", "IMMEDIATE", "EXCLUSIVE"}
+
+_PRAGMA_NAME = re.compile(r"^[a-z_]+$")
+_PRAGMA_VALUE = re.compile(r"^-?\w+$")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pragmas", None)
+        params.pop("transaction_mode", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas().items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def pragmas(self) -> dict:
+        pragmas = self.settings_dict["OPTIONS"].get("pragmas", {})
+        for name, value in pragmas.items():
+            if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(str(value)):
+                raise ImproperlyConfigured(f"Invalid SQLite pragma {name}={value!r}")
+        return pragmas
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode", "DEFERRED")
+        if mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"Invalid SQLite transaction mode {mode!r}")
+        self.cursor().execute(f"BEGIN {mode.upper()}")
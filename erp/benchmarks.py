@@ -0,0 +1,245 @@
+"""
+Benchmarks of the views and ledger queries, and of view throughput under
+concurrent requests, used by `manage.py benchmark` and by the query count
+regression tests.
+"""
+
+import asyncio
+import multiprocessing
+import statistics
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+
+from .models import CostCenter, Purchase
+
+# Every URL in delicious_erp/urls.py, except the admin and static files, with
+# placeholders for sample object ids. The tests check that none is missing.
+URLS: List[Tuple[str, str]] = [
+    ("home", "/"),
+    ("cost_centers", "/cost-centers"),
+    ("cost_center", "/cost-centers/{cost_center}"),
+    ("cost_center_export", "/cost-centers/{cost_center}/export?format=csv"),
+    ("cost_center_runway", "/cost-centers/{cost_center}/runway"),
+    ("purchases", "/purchases"),
+    ("purchase", "/purchases/{purchase}"),
+    ("purchase_create", "/purchases/create"),
+    ("purchase_batch_create", "/purchases/create-batch"),
+    ("purchases_export", "/purchases/export?format=csv"),
+    ("fundings", "/fundings"),
+    ("funding", "/fundings/{funding}"),
+    ("fundings_export", "/fundings/export?format=csv"),
+    ("item_kind_search", "/item-kinds/search?q=item"),
+    ("search", "/search?q=item"),
+    ("analytics", "/analytics/monthly?cost_center={cost_center}"),
+    ("short_id", "/s/P{purchase}"),
+    ("api_list", "/api/purchases?cost_center={cost_center}"),
+    ("api_detail", "/api/cost-centers/{cost_center}"),
+    ("api_batch", "/api/transactions?ids=P{purchase},F{funding}"),
+]
+
+
+class Measurement(NamedTuple):
+    queries: int
+    seconds: float
+
+    def as_dict(self) -> Dict:
+        return {"queries": self.queries, "seconds": round(self.seconds, 6)}
+
+
+def measure(fn: Callable[[], object], repeat: int = 1) -> Measurement:
+    """
+    Runs fn `repeat` times, returning the query count of the first run and
+    the median wall time.
+    """
+    times = []
+    queries = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        if queries is None:
+            queries = len(ctx)
+    return Measurement(queries, statistics.median(times))
+
+
+def sample_ids() -> Dict[str, int]:
+    """
+    Picks the objects that parametrized URLs and operations are run against:
+    the busiest root cost center, and its newest purchase and funding.
+    """
+    root = max(
+        CostCenter.objects.filter(parent__isnull=True).select_related("balance"),
+        key=lambda cc: cc.balance.subtree_debit,
+    )
+    return {
+        "cost_center": root.id,
+        "purchase": root.recursive_purchases.latest("purchase_date").id,
+        "funding": root.recursive_fundings.latest("funding_date").id,
+    }
+
+
+def fetch(client: Client, url: str):
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def benchmark_urls(repeat: int = 1) -> Dict[str, Dict]:
+    client = Client()
+    ids = sample_ids()
+    results = {}
+    for name, template in URLS:
+        url = template.format(**ids)
+        status = fetch(client, url).status_code
+        results[name] = {
+            "url": url,
+            "status": status,
+            **measure(lambda: fetch(client, url), repeat).as_dict(),
+        }
+    return results
+
+
+def benchmark_throughput(concurrency: int = 20, requests: int = 200) -> Dict[str, Dict]:
+    """
+    Compares a sync HTML view with the async API views under concurrent load:
+    each URL is requested `requests` times through the ASGI handler, with
+    `concurrency` requests in flight at a time.
+    """
+    ids = sample_ids()
+    newest = Purchase.objects.order_by("-id").values_list("id", flat=True)[:20]
+    urls = {
+        "purchase_html": f"/purchases/{ids['purchase']}",
+        "purchase_api": f"/api/purchases/{ids['purchase']}",
+        "transactions_api": "/api/transactions?ids="
+        + ",".join(f"P{id}" for id in newest),
+    }
+    return {
+        name: {"url": url, **async_to_sync(_throughput)(url, concurrency, requests)}
+        for name, url in urls.items()
+    }
+
+
+async def _throughput(url: str, concurrency: int, requests: int) -> Dict:
+    client = AsyncClient()
+    pending = iter(range(requests))
+    statuses = set()
+
+    async def worker():
+        for _ in pending:
+            statuses.add((await client.get(url)).status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    return {
+        "statuses": sorted(statuses),
+        "requests_per_second": round(requests / seconds, 1),
+    }
+
+
+def benchmark_operations(repeat: int = 1) -> Dict[str, Dict]:
+    ids = sample_ids()
+    root = CostCenter.objects.get(id=ids["cost_center"])
+    # A node one level below the root, moved under its sibling and back.
+    node, sibling = CostCenter.objects.filter(parent=root).order_by("id")[:2]
+
+    def reparent():
+        node.parent = sibling
+        node.save()
+        node.parent = root
+        node.save()
+
+    operations = {
+        "query_balance_sheet": lambda: list(
+            root.query_balance_sheet().order_by("t_date", "t_id")
+        ),
+        "balance_sheet_page": lambda: root.balance_sheet_page(100),
+        "total_balance": lambda: CostCenter.objects.get(id=root.id).total_balance,
+        "reparent": reparent,
+    }
+    return {name: measure(fn, repeat).as_dict() for name, fn in operations.items()}
+
+
+# SQLite's defaults, for comparison with the configured connection options in
+# benchmark_concurrency().
+BASELINE_OPTIONS = {
+    "transaction_mode": "DEFERRED",
+    "pragmas": {"journal_mode": "delete", "synchronous": "full"},
+}
+
+
+def benchmark_concurrency(
+    options: Dict, retries: int, readers: int, writers: int, seconds: float
+) -> Dict:
+    """
+    Runs reader and writer processes against the default database, which
+    must be a file, with the given connection OPTIONS and write retries.
+    Readers load balance sheet pages, writers save single purchases.
+    """
+    ids = sample_ids()
+    template = Purchase.objects.get(id=ids["purchase"])
+
+    # Connect once up front, so that persistent settings like the journal
+    # mode are switched while nothing else is connected. Open connections
+    # must not be inherited by the forked processes either.
+    connection.settings_dict["OPTIONS"] = options
+    connection.close()
+    connection.ensure_connection()
+    connections.close_all()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    deadline = time.time() + seconds
+    processes = [
+        context.Process(
+            target=_concurrency_worker,
+            args=(kind, ids["cost_center"], template, retries, deadline, results),
+        )
+        for kind in ["read"] * readers + ["write"] * writers
+    ]
+    for process in processes:
+        process.start()
+    totals = {kind: [0, 0] for kind in ["read", "write"]}
+    for _ in processes:
+        kind, done, failed = results.get()
+        totals[kind][0] += done
+        totals[kind][1] += failed
+    for process in processes:
+        process.join()
+
+    return {
+        f"{kind}s_per_second": round(done / seconds, 1)
+        for kind, (done, _) in totals.items()
+    } | {f"{kind}_errors": failed for kind, (_, failed) in totals.items()}
+
+
+def _concurrency_worker(kind, cost_center_id, template, retries, deadline, results):
+    settings.WRITE_RETRY_ATTEMPTS = retries
+    root = CostCenter.objects.get(id=cost_center_id)
+    done = failed = 0
+    while time.time() < deadline:
+        try:
+            if kind == "read":
+                root.balance_sheet_page(50)
+            else:
+                Purchase(
+                    purchase_date=template.purchase_date,
+                    item_id=template.item_id,
+                    quantity=1,
+                    total_price=1,
+                    cost_center_id=template.cost_center_id,
+                ).save()
+            done += 1
+        except OperationalError:
+            failed += 1
+    connections.close_all()
+    results.put((kind, done, failed))
@@ -0,0 +1,206 @@
+"""
+Caching of cost center data, keyed on per-cost-center version counters, and
+of item kind ids, keyed on a version counter shared the same way.
+
+Every ledger write, rename or reparent raises the version of the cost
+centers it affects and of their ancestors (see CostCenterBalance). Entries
+of other cost centers stay valid, and outdated entries are never read
+again, so nothing has to be deleted explicitly. Works with any of Django's
+cache backends.
+
+Settings:
+
+LEDGER_CACHE_ALIAS
+    The cache to use, "default" unless set.
+LEDGER_CACHE_TIMEOUT
+    Seconds to keep entries for, mostly to let outdated ones expire.
+ITEM_KIND_CACHE_SIZE
+    Number of item kind names whose ids each process remembers.
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import CostCenter, ItemKind, item_name_key
+
+T = TypeVar("T")
+K = TypeVar("K", bound=Hashable)
+
+STATS_KEY = "erp:cache-stats:{}"
+ITEM_KIND_VERSION_KEY = "erp:item-kinds:version"
+
+_MISSING = object()
+
+# Hits and misses of this process. Totals across processes are kept in the
+# cache itself, see get_stats().
+local_stats = Counter()
+
+
+def get_cache():
+    return caches[getattr(settings, "LEDGER_CACHE_ALIAS", "default")]
+
+
+def cost_center_cache_key(cost_center: CostCenter, name: str, params) -> str:
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f"erp:{name}:{cost_center.id}:v{cost_center.balance.version}:{digest}"
+
+
+def cached_for_cost_center(
+    cost_center: CostCenter, name: str, params, compute: Callable[[], T]
+) -> T:
+    """
+    Returns the cached result of compute() for this version of the cost
+    center's subtree, computing and storing it on a miss. `params` must
+    have a stable repr() that identifies everything else the result depends
+    on.
+    """
+    cache = get_cache()
+    key = cost_center_cache_key(cost_center, name, params)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _record("misses")
+        value = compute()
+        cache.set(key, value, getattr(settings, "LEDGER_CACHE_TIMEOUT", 3600))
+    else:
+        _record("hits")
+    return value
+
+
+def _record(event: str):
+    local_stats[event] += 1
+    cache = get_cache()
+    key = STATS_KEY.format(event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats() -> Dict[str, int]:
+    """
+    Returns the hit and miss counts of every process sharing the cache.
+    """
+    cache = get_cache()
+    return {
+        event: cache.get(STATS_KEY.format(event), 0) for event in ("hits", "misses")
+    }
+
+
+def reset_stats():
+    local_stats.clear()
+    get_cache().delete_many([STATS_KEY.format(e) for e in ("hits", "misses")])
+
+
+class LRUCache(Generic[K, T]):
+    """
+    A thread-safe, process-local mapping that forgets the least recently
+    used entries beyond `max_size`.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[K, T]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[T]:
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self.entries[key]
+
+    def set(self, key: K, value: T):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# Ids by item kind version and item_name_key(). Ids of existing kinds never
+# change, so entries only go stale when kinds are renamed or deleted, which
+# raises the version for every process (see signals.py). Outdated entries
+# are never read again and age out.
+item_kind_ids: LRUCache[Tuple[int, str], int] = LRUCache(
+    getattr(settings, "ITEM_KIND_CACHE_SIZE", 10000)
+)
+
+
+def item_kind_version() -> int:
+    # Starts from the clock rather than 0, so that versions are not reused
+    # if the counter is evicted.
+    return get_cache().get_or_set(ITEM_KIND_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_item_kind_version():
+    """
+    Outdates the item kind ids remembered by every process.
+    """
+    cache = get_cache()
+    try:
+        cache.incr(ITEM_KIND_VERSION_KEY)
+    except ValueError:
+        cache.add(ITEM_KIND_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def resolve_item_kind(name: str) -> int:
+    """
+    Returns the id of the item kind with the given name, creating it if
+    necessary.
+    """
+    return resolve_item_kinds([name])[item_name_key(name)]
+
+
+def resolve_item_kinds(names: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the ids of the item kinds with the given names by
+    item_name_key(), creating missing kinds. Kinds that are not cached are
+    looked up together.
+    """
+    version = item_kind_version()
+    ids = {}
+    missing = {}
+    for name in names:
+        key = item_name_key(name)
+        item_id = item_kind_ids.get((version, key))
+        if item_id is None:
+            missing.setdefault(key, name)
+        else:
+            ids[key] = item_id
+
+    if missing:
+        created = ItemKind.ids_for_names(missing.values())
+        ids.update(created)
+
+        # Not before the kinds are committed, as they might be rolled back.
+        def remember():
+            for key, item_id in created.items():
+                item_kind_ids.set((version, key), item_id)
+
+        transaction.on_commit(remember)
+    return ids
@@ -0,0 +1,49 @@
+"""
+Retrying of write transactions that SQLite refuses with "database is locked",
+i.e. when another process held the write lock for longer than busy_timeout.
+
+Settings:
+
+WRITE_RETRY_ATTEMPTS
+    How often to try a write transaction, 1 to not retry.
+WRITE_RETRY_BACKOFF_MS
+    Upper bound of the first delay, doubled after every attempt. The actual
+    delays are random, so that writers that collided do not collide again.
+"""
+
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+
+def is_locked(error: Exception) -> bool:
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+def retry_on_locked(fn):
+    """
+    Decorates a function that runs a write transaction to retry it when the
+    database is locked. Inside an atomic block it runs once, since only the
+    outermost transaction can be retried.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if transaction.get_connection().in_atomic_block:
+            return fn(*args, **kwargs)
+
+        attempts = getattr(settings, "WRITE_RETRY_ATTEMPTS", 5)
+        delay = getattr(settings, "WRITE_RETRY_BACKOFF_MS", 50) / 1000
+        for attempt in range(1, attempts + 1):
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == attempts or not is_locked(e):
+                    raise
+            time.sleep(random.uniform(0, delay))
+            delay *= 2
+
+    return wrapper
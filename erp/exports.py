@@ -0,0 +1,80 @@
+"""
+Streaming CSV/NDJSON exports of ledgers.
+
+Rows are pulled from the database in chunks and encoded one at a time, so
+memory use stays flat regardless of the size of the export.
+"""
+
+import csv
+import json
+from typing import Dict, Iterable, Iterator, List
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class _Echo:
+    """
+    A file-like object that hands back whatever is written to it, so that
+    csv.writer can be used to encode one line at a time.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def encode_csv(columns: List[str], rows: Iterable[Dict]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row[c] for c in columns])
+
+
+def encode_ndjson(columns: List[str], rows: Iterable[Dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps({c: row[c] for c in columns}, cls=DjangoJSONEncoder) + "\n"
+
+
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+}
+
+
+def stream_export(
+    request: HttpRequest,
+    queryset,
+    columns: List[str],
+    format: str,
+    filename: str,
+) -> StreamingHttpResponse:
+    """
+    Streams the rows of a values() queryset in the given format, gzipped on
+    the fly if the client accepts it.
+    """
+    content = (
+        line.encode()
+        for line in ENCODERS[format](
+            columns, queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+    )
+
+    gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    if gzip:
+        content = compress_sequence(content)
+
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{format}"'
+    if gzip:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
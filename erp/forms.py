@@ -1,20 +1,38 @@
-from datetime import datetime
-from typing import Any, Dict
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional
 from django import forms
+from django.db import transaction
+from django.utils import timezone
 
-from .models import ItemKind, Purchase
+from .caching import resolve_item_kind, resolve_item_kinds
+from .db import retry_on_locked
+from .models import (
+    MAX_NAME_LENGTH,
+    CostCenter,
+    Purchase,
+    create_transactions,
+    item_name_key,
+    to_amount,
+)
+
+# Lines of a supplier invoice can be entered at once, see PurchaseBatchForm.
+MAX_BATCH_LINES = 200
 
 
 class PurchaseCreateForm(forms.ModelForm):
-    item = forms.CharField()
+    item = forms.CharField(
+        max_length=MAX_NAME_LENGTH,
+        widget=forms.TextInput(
+            attrs={"list": "item-kinds", "data-autocomplete": "/item-kinds/search"}
+        ),
+    )
     comment = forms.CharField(required=False)
     supplier = forms.URLField(required=False)
     purchase_date = forms.DateTimeField(initial=datetime.now)
 
     def save(self, commit=True):
         purchase: Purchase = super().save(commit=False)
-        item, _ = ItemKind.objects.get_or_create(name=self.cleaned_data['item'])
-        purchase.item = item
+        purchase.item_id = resolve_item_kind(self.cleaned_data["item"])
         purchase.comment = self.cleaned_data['comment']
         purchase.supplier = self.cleaned_data['supplier']
         if commit:
@@ -31,3 +49,166 @@ class PurchaseCreateForm(forms.ModelForm):
             "total_price",
             "cost_center",
         ]
+
+
+class PurchaseLineForm(forms.Form):
+    """
+    One line of a batch of purchases, see PurchaseBatchForm.
+    """
+
+    item = forms.CharField(
+        max_length=MAX_NAME_LENGTH,
+        widget=forms.TextInput(
+            attrs={"list": "item-kinds", "data-autocomplete": "/item-kinds/search"}
+        ),
+    )
+    quantity = Purchase._meta.get_field("quantity").formfield()
+    total_price = Purchase._meta.get_field("total_price").formfield()
+    comment = forms.CharField(required=False, max_length=MAX_NAME_LENGTH)
+
+
+PurchaseLineFormSet = forms.formset_factory(
+    PurchaseLineForm,
+    extra=10,
+    min_num=1,
+    validate_min=True,
+    max_num=MAX_BATCH_LINES,
+    validate_max=True,
+)
+
+
+class PurchaseBatchForm(forms.Form):
+    """
+    The fields that all lines of a batch of purchases, e.g. of one supplier
+    invoice, have in common.
+    """
+
+    purchase_date = forms.DateTimeField(initial=datetime.now)
+    supplier = forms.URLField(required=False)
+    cost_center = forms.ModelChoiceField(
+        CostCenter.objects.only("id", "name", "path").order_by("path")
+    )
+
+    @retry_on_locked
+    def save(self, lines: PurchaseLineFormSet) -> List[Purchase]:
+        """
+        Creates a purchase per filled in line, with one bulk insert.
+        """
+        lines = [line.cleaned_data for line in lines if line.cleaned_data]
+        with transaction.atomic():
+            item_ids = resolve_item_kinds(line["item"] for line in lines)
+            return create_transactions(
+                Purchase,
+                [
+                    Purchase(
+                        purchase_date=self.cleaned_data["purchase_date"],
+                        supplier=self.cleaned_data["supplier"],
+                        cost_center=self.cleaned_data["cost_center"],
+                        item_id=item_ids[item_name_key(line["item"])],
+                        quantity=line["quantity"],
+                        total_price=to_amount(line["total_price"]),
+                        comment=line["comment"],
+                    )
+                    for line in lines
+                ],
+            )
+
+
+class DateRangeForm(forms.Form):
+    """
+    An optional date range in query parameters, inclusive on both ends.
+    """
+
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and start > end:
+            raise forms.ValidationError("start must not be after end")
+        return cleaned_data
+
+    @property
+    def start_datetime(self) -> Optional[datetime]:
+        start = self.cleaned_data["start"]
+        return start and timezone.make_aware(datetime.combine(start, time.min))
+
+    @property
+    def end_datetime(self) -> Optional[datetime]:
+        """
+        The exclusive upper bound, i.e. midnight after the end date.
+        """
+        end = self.cleaned_data["end"]
+        return end and timezone.make_aware(
+            datetime.combine(end + timedelta(days=1), time.min)
+        )
+
+
+class ExportForm(DateRangeForm):
+    """
+    Query parameters of the ledger export endpoints.
+    """
+
+    format = forms.ChoiceField(choices=[("csv", "CSV"), ("ndjson", "NDJSON")])
+
+
+class FundingFilterForm(DateRangeForm):
+    """
+    Filters of the funding list.
+    """
+
+    cost_center = forms.ModelChoiceField(
+        CostCenter.objects.only("id", "name", "path").order_by("path"),
+        required=False,
+        help_text="Includes the cost center's whole subtree.",
+    )
+
+
+class PurchaseFilterForm(FundingFilterForm):
+    """
+    Filters of the purchase list.
+    """
+
+    item = forms.IntegerField(required=False, label="Item kind ID")
+
+
+class ItemKindSearchForm(forms.Form):
+    """
+    Query parameters of the item kind autocomplete endpoint.
+    """
+
+    q = forms.CharField(required=False, max_length=MAX_NAME_LENGTH)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=50)
+
+
+class SearchForm(FundingFilterForm):
+    """
+    Query parameters of the transaction search.
+    """
+
+    q = forms.CharField(label="Search", max_length=200)
+
+
+class RunwayForm(forms.Form):
+    """
+    Query parameters of the runway endpoint.
+    """
+
+    window = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=3650,
+        help_text="Days of past spending to average.",
+    )
+
+
+class ReassignCostCenterForm(forms.Form):
+    """
+    The target of the admin's bulk cost center reassignment.
+    """
+
+    cost_center = forms.ModelChoiceField(
+        CostCenter.objects.order_by("path"),
+        help_text="The cost center to move the selected transactions to.",
+    )
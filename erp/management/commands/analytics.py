@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from erp.analytics import REPORTS, run_report
+from erp.forms import DateRangeForm
+from erp.models import CostCenter
+
+
+class Command(BaseCommand):
+    help = "Prints a spend analytics report as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("report", choices=list(REPORTS))
+        parser.add_argument(
+            "--cost-center",
+            type=int,
+            help="Limits the report to this cost center's subtree.",
+        )
+        parser.add_argument("--start", help="Inclusive start date.")
+        parser.add_argument("--end", help="Inclusive end date.")
+
+    def handle(self, *args, report, cost_center, start, end, **options):
+        if cost_center is not None:
+            try:
+                cost_center = CostCenter.objects.get(pk=cost_center)
+            except CostCenter.DoesNotExist:
+                raise CommandError(f"Cost center {cost_center} does not exist")
+        # Parsed like the query parameters of the analytics endpoint, so that
+        # both report the same range.
+        dates = DateRangeForm({"start": start, "end": end})
+        if not dates.is_valid():
+            raise CommandError(dates.errors.as_text())
+        result = run_report(
+            report,
+            cost_center=cost_center,
+            start=dates.start_datetime,
+            end=dates.end_datetime,
+        )
+        self.stdout.write(json.dumps(result, indent=2))
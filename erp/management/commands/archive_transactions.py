@@ -0,0 +1,37 @@
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from erp.models import archive_transactions
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves purchases and fundings dated before a cutoff into the archive "
+        "tables, carrying their totals forward as one opening entry per cost "
+        "center."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=date.fromisoformat,
+            required=True,
+            help="Archive transactions dated before this day.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, before, batch_size, **options):
+        cutoff = timezone.make_aware(datetime.combine(before, time.min))
+        if cutoff > timezone.now():
+            raise CommandError("The cutoff must not be in the future.")
+
+        counts = archive_transactions(cutoff, batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Archived "
+                + " and ".join(f"{count} {name}" for name, count in counts.items())
+                + f" dated before {before}."
+            )
+        )
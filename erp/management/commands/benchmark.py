@@ -0,0 +1,97 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from erp.benchmarks import (
+    benchmark_operations,
+    benchmark_throughput,
+    benchmark_urls,
+)
+from scripts.generate_transactions import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds throwaway databases at several sizes and measures wall time and "
+        "query count of every page and of the core ledger operations, and the "
+        "throughput of HTML and API views under concurrent requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="Numbers of transactions to benchmark with.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=20,
+            help="Requests in flight at a time in the throughput benchmark.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON results to this file.")
+
+    def handle(self, *args, scales, repeat, concurrency, seed, output, **options):
+        results = {"meta": self.meta(), "scales": {}}
+
+        # The benchmarks run against the test database, so they never touch
+        # real data.
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            for scale in scales:
+                call_command("flush", interactive=False, verbosity=0)
+                self.stderr.write(f"Seeding {scale} transactions...")
+                generate(
+                    log=lambda _: None,
+                    seed=seed,
+                    purchases=scale - scale // 20,
+                    fundings=scale // 20,
+                    depth=3,
+                    fan_out=5,
+                    item_kinds=1000,
+                )
+
+                self.stderr.write(f"Benchmarking {scale} transactions...")
+                results["scales"][str(scale)] = {
+                    "urls": benchmark_urls(repeat),
+                    "operations": benchmark_operations(repeat),
+                    "throughput": benchmark_throughput(concurrency),
+                }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = json.dumps(results, indent=2, sort_keys=True)
+        if output:
+            with open(output, "w") as f:
+                f.write(report + "\n")
+        else:
+            self.stdout.write(report)
+
+    def meta(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True
+            ).stdout.strip()
+        except OSError:
+            commit = ""
+        return {
+            "commit": commit,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+        }
@@ -0,0 +1,68 @@
+import copy
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from erp.benchmarks import BASELINE_OPTIONS, benchmark_concurrency
+from scripts.generate_transactions import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database file and measures read and write throughput "
+        "of concurrent processes, with SQLite's default connection settings and "
+        "with the configured ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=20_000)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, transactions, readers, writers, seconds, seed, **options):
+        configured = copy.deepcopy(connection.settings_dict["OPTIONS"])
+        profiles = {
+            "baseline": (BASELINE_OPTIONS, 1),
+            "configured": (configured, settings.WRITE_RETRY_ATTEMPTS),
+        }
+
+        # Processes cannot share an in-memory database, so the test database
+        # is a file for once.
+        directory = tempfile.mkdtemp()
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(directory, "db")
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        results = {}
+        try:
+            self.stderr.write(f"Seeding {transactions} transactions...")
+            generate(
+                log=lambda _: None,
+                seed=seed,
+                purchases=transactions - transactions // 20,
+                fundings=transactions // 20,
+            )
+            for name, (profile, retries) in profiles.items():
+                self.stderr.write(f"Benchmarking {name} settings...")
+                results[name] = benchmark_concurrency(
+                    profile, retries, readers, writers, seconds
+                )
+        finally:
+            connection.settings_dict["OPTIONS"] = configured
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(directory)
+
+        self.stdout.write(json.dumps(results, indent=2))
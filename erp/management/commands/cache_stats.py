@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from erp.caching import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows hit and miss counts of the ledger cache. Only shared caches "
+        "(e.g. file-based) see the counts of the server processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, reset=False, **options):
+        stats = get_stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio:.1%}"
+        )
+        if reset:
+            reset_stats()
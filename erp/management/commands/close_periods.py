@@ -0,0 +1,102 @@
+from datetime import date, datetime, time, timedelta
+from typing import List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from erp.models import BalanceSnapshot, Funding, Purchase
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores period-close balance snapshots of every cost center, for fast "
+        "as-of-date balance queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--period", choices=["month", "quarter"], default="month")
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Close periods ending on or before this date. Defaults to today.",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute all existing snapshots from the ledger first.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the existing snapshots against the ledger.",
+        )
+
+    def handle(self, *args, period, until, rebuild, check, **options):
+        if check:
+            mismatched = BalanceSnapshot.verify()
+            if mismatched:
+                raise CommandError(
+                    f"{len(mismatched)} snapshots do not match the ledger, "
+                    f"starting with {mismatched[0]}"
+                )
+            self.stdout.write(self.style.SUCCESS("Snapshots match the ledger."))
+            return
+
+        if rebuild:
+            count = BalanceSnapshot.rebuild()
+            self.stdout.write(f"Rebuilt {count} snapshots.")
+
+        first = min(
+            filter(
+                None,
+                [
+                    Purchase.objects.aggregate(m=Min("purchase_date"))["m"],
+                    Funding.objects.aggregate(m=Min("funding_date"))["m"],
+                ],
+            ),
+            default=None,
+        )
+        if first is None:
+            self.stdout.write("The ledger is empty, nothing to close.")
+            return
+
+        until = (
+            timezone.now()
+            if until is None
+            else timezone.make_aware(
+                datetime.combine(until + timedelta(days=1), time.min)
+            )
+        )
+        existing = set(
+            BalanceSnapshot.objects.values_list("as_of", flat=True).distinct()
+        )
+        new = [
+            boundary
+            for boundary in period_boundaries(
+                first, until, 3 if period == "quarter" else 1
+            )
+            if boundary not in existing
+        ]
+        count = BalanceSnapshot.recompute(new)
+        self.stdout.write(
+            self.style.SUCCESS(f"Closed {len(new)} periods ({count} snapshots).")
+        )
+
+
+def period_boundaries(first: datetime, until: datetime, months: int) -> List[datetime]:
+    """
+    Returns the starts of the periods of `months` months (aligned to the
+    calendar year) that follow the one containing `first`, up to `until`.
+    """
+    first = timezone.localtime(first)
+    month = (first.month - 1) // months * months
+    boundaries = []
+    while True:
+        month += months
+        boundary = timezone.make_aware(
+            datetime(first.year + month // 12, month % 12 + 1, 1)
+        )
+        if boundary > until:
+            return boundaries
+        boundaries.append(boundary)
@@ -0,0 +1,209 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from erp.models import (
+    CostCenter,
+    Funding,
+    ItemKind,
+    Purchase,
+    create_transactions,
+    item_name_key,
+    to_amount,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk imports purchases or fundings from a CSV or JSONL file. "
+        "Cost centers are given by id or path, items by name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["purchases", "fundings"])
+        parser.add_argument("file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format. Guessed from the file extension by default.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--rejects", help="Write rejected rows and their errors to this JSONL file."
+        )
+
+    def handle(self, *args, kind, file, format, batch_size, rejects, **options):
+        if not os.path.exists(file):
+            raise CommandError(f"No such file: {file}")
+        format = format or ("csv" if file.endswith(".csv") else "jsonl")
+        self.kind = kind
+
+        self.cost_centers: Dict[str, int] = {}
+        for cc_id, path in CostCenter.objects.values_list("id", "path"):
+            self.cost_centers[str(cc_id)] = cc_id
+            self.cost_centers[path] = cc_id
+
+        # Ids by item_name_key().
+        self.item_kinds: Dict[str, int] = dict(
+            ItemKind.objects.values_list("normalized_name", "id")
+        )
+
+        imported = rejected = 0
+        start = time.monotonic()
+        rejects_file = open(rejects, "w") if rejects else None
+        try:
+            with open(file, newline="") as f:
+                rows = read_csv(f) if format == "csv" else read_jsonl(f)
+                while batch := list(islice(rows, batch_size)):
+                    objects, errors = self.validate(batch)
+                    self.write(objects)
+
+                    imported += len(objects)
+                    rejected += len(errors)
+                    for line, row, error in errors:
+                        self.stderr.write(f"Line {line}: {error}")
+                        if rejects_file:
+                            rejects_file.write(
+                                json.dumps({"line": line, "row": row, "error": error})
+                                + "\n"
+                            )
+
+                    elapsed = max(time.monotonic() - start, 1e-6)
+                    self.stdout.write(
+                        f"{imported} imported, {rejected} rejected "
+                        f"({(imported + rejected) / elapsed:.0f} rows/s)"
+                    )
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        elapsed = max(time.monotonic() - start, 1e-6)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} {self.kind} in {elapsed:.1f}s "
+                f"({imported / elapsed:.0f} rows/s), rejected {rejected}."
+            )
+        )
+
+    def validate(self, batch: List[Tuple[int, Optional[dict], Optional[str]]]):
+        """
+        Turns a batch of rows into unsaved model instances, along with
+        (line, row, error) for every row that was rejected.
+        """
+        objects = []
+        errors = []
+        for line, row, error in batch:
+            if error is not None:
+                errors.append((line, row, error))
+                continue
+            try:
+                if self.kind == "purchases":
+                    objects.append(self.build_purchase(row))
+                else:
+                    objects.append(self.build_funding(row))
+            except ValidationError as e:
+                errors.append((line, row, "; ".join(e.messages)))
+        return objects, errors
+
+    def build_purchase(self, row: dict) -> Purchase:
+        purchase = Purchase(
+            purchase_date=clean_date(Purchase, "purchase_date", row),
+            quantity=clean(Purchase, "quantity", row),
+            total_price=to_amount(clean(Purchase, "total_price", row)),
+            supplier=clean(Purchase, "supplier", row, required=False),
+            comment=clean(Purchase, "comment", row, required=False),
+            cost_center_id=self.resolve_cost_center(row),
+        )
+        # Resolved to an id once the batch is written, see write().
+        purchase._item_name = clean(ItemKind, "name", {"name": row.get("item")})
+        return purchase
+
+    def build_funding(self, row: dict) -> Funding:
+        return Funding(
+            name=clean(Funding, "name", row),
+            funding_date=clean_date(Funding, "funding_date", row),
+            credit=to_amount(clean(Funding, "credit", row)),
+            comment=clean(Funding, "comment", row, required=False),
+            cost_center_id=self.resolve_cost_center(row),
+        )
+
+    def resolve_cost_center(self, row: dict) -> int:
+        key = str(row.get("cost_center") or "")
+        try:
+            return self.cost_centers[key]
+        except KeyError:
+            raise ValidationError(f"cost_center: unknown cost center {key!r}")
+
+    def write(self, objects: List[models.Model]):
+        """
+        Inserts a batch and updates the tables derived from the ledger, all in
+        one transaction.
+        """
+        if not objects:
+            return
+
+        with transaction.atomic():
+            if self.kind == "purchases":
+                self.create_item_kinds({p._item_name for p in objects})
+                for p in objects:
+                    p.item_id = self.item_kinds[item_name_key(p._item_name)]
+                create_transactions(Purchase, objects)
+            else:
+                create_transactions(Funding, objects)
+
+    def create_item_kinds(self, names):
+        missing = [name for name in names if item_name_key(name) not in self.item_kinds]
+        if missing:
+            self.item_kinds.update(ItemKind.ids_for_names(missing))
+
+
+def clean(model, field_name: str, row: dict, required: bool = True):
+    """
+    Validates a single value of a row with the corresponding model field.
+    """
+    field = model._meta.get_field(field_name)
+    value = row.get(field_name)
+    if value in (None, ""):
+        if required:
+            raise ValidationError(f"{field_name}: this field is required")
+        return field.get_default()
+    try:
+        return field.clean(value, None)
+    except ValidationError as e:
+        raise ValidationError(f"{field_name}: {'; '.join(e.messages)}")
+
+
+def clean_date(model, field_name: str, row: dict):
+    value = clean(model, field_name, row)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def read_csv(f) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, row, None
+
+
+def read_jsonl(f) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    for line, text in enumerate(f, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, None, f"invalid JSON: {e}"
+            continue
+        if isinstance(row, dict):
+            yield line, row, None
+        else:
+            yield line, None, "expected a JSON object"
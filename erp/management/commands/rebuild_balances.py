@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from erp.models import CarryForward, CostCenterBalance, DailySpend
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the stored cost center balances and daily spend totals from "
+        "the ledger and verifies them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the stored balances, without rewriting them.",
+        )
+
+    def handle(self, *args, check=False, **options):
+        if not check:
+            count = CostCenterBalance.rebuild()
+            self.stdout.write(f"Rebuilt balances of {count} cost centers.")
+            count = DailySpend.rebuild()
+            self.stdout.write(f"Rebuilt {count} daily spend totals.")
+
+        mismatched = CarryForward.verify()
+        if mismatched:
+            raise CommandError(
+                f"Carry-forwards do not match the archived transactions for cost "
+                f"centers: {', '.join(map(str, mismatched))}"
+            )
+        mismatched = CostCenterBalance.verify()
+        if mismatched:
+            raise CommandError(
+                f"Stored balances do not match the ledger for cost centers: "
+                f"{', '.join(map(str, mismatched))}"
+            )
+        mismatched_days = DailySpend.verify()
+        if mismatched_days:
+            raise CommandError(
+                f"Daily spend totals do not match the ledger for: "
+                f"{', '.join(f'{cc_id} on {day}' for cc_id, day in mismatched_days)}"
+            )
+        self.stdout.write(self.style.SUCCESS("Balances match the ledger."))
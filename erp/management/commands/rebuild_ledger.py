@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from erp.models import LedgerEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreates the ledger entries that balance sheets read from the purchases "
+        "and fundings, and verifies them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the ledger entries, without rewriting them.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, check=False, batch_size, **options):
+        if not check:
+            count = LedgerEntry.rebuild(batch_size)
+            self.stdout.write(f"Wrote {count} ledger entries.")
+
+        mismatched = LedgerEntry.verify()
+        if mismatched:
+            raise CommandError(
+                f"Ledger entries do not match the transactions of cost centers: "
+                f"{', '.join(map(str, mismatched))}"
+            )
+        self.stdout.write(self.style.SUCCESS("Ledger entries match the transactions."))
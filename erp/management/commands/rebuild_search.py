@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from erp.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreates the full-text search index of purchases and fundings, and "
+        "verifies it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the index, without rewriting it.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, check=False, batch_size, **options):
+        if not check:
+            count = SearchDocument.rebuild(batch_size)
+            self.stdout.write(f"Indexed {count} transactions.")
+
+        mismatched = SearchDocument.verify()
+        if mismatched:
+            raise CommandError(
+                f"The search index does not match the transactions: "
+                f"{', '.join(mismatched)}"
+            )
+        self.stdout.write(self.style.SUCCESS("The search index matches."))
@@ -0,0 +1,167 @@
+"""
+Per-request SQL and template timing of a sample of requests, logged as a
+structured line for slow requests. Staff users, and everyone when DEBUG is
+on, also get it as a Server-Timing header, which would otherwise tell
+anyone how much work a page takes.
+
+Settings:
+
+REQUEST_TIMING_SAMPLE_RATE
+    Fraction of requests to instrument, between 0 and 1. Defaults to 0.01.
+REQUEST_TIMING_SLOW_MS
+    Instrumented requests taking at least this long are logged to
+    "erp.timing".
+REQUEST_TIMING_SLOWEST_STATEMENTS
+    How many of the slowest statements to include in the log line.
+"""
+
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from typing import List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("erp.timing")
+
+
+class RequestTiming:
+    """
+    Timings collected for one request. Also installed as an execute wrapper
+    on every database connection, so queries are timed without DEBUG.
+    """
+
+    def __init__(self, keep_slowest: int):
+        self.keep_slowest = keep_slowest
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest: List[Tuple[float, str]] = []
+        self.template_seconds: Optional[float] = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_seconds += duration
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, (duration, sql))
+            elif self.slowest and duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (duration, sql))
+
+    def server_timing(self, total_seconds: float) -> str:
+        metrics = [
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        if self.template_seconds is not None:
+            metrics.append(f"tpl;dur={self.template_seconds * 1000:.1f}")
+        metrics.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+class RequestTimingMiddleware:
+    # Supports both modes, so that async views (see erp.api) are not run in
+    # a worker thread because of it.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "REQUEST_TIMING_SAMPLE_RATE", 0.01)
+        self.slow_ms = getattr(settings, "REQUEST_TIMING_SLOW_MS", 500)
+        self.keep_slowest = getattr(settings, "REQUEST_TIMING_SLOWEST_STATEMENTS", 3)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timing = request.timing = RequestTiming(self.keep_slowest)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.install(stack, timing)
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        self.log(request, response, timing, total)
+        if self.shows_timing(request):
+            response["Server-Timing"] = timing.server_timing(total)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        timing = request.timing = RequestTiming(self.keep_slowest)
+        start = time.perf_counter()
+        # Connections belong to the thread that the request's ORM calls run
+        # in, so the wrappers are installed there too.
+        stack = ExitStack()
+        await sync_to_async(self.install)(stack, timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        total = time.perf_counter() - start
+        self.log(request, response, timing, total)
+        # Loading the user queries the database.
+        if await sync_to_async(self.shows_timing)(request):
+            response["Server-Timing"] = timing.server_timing(total)
+        return response
+
+    @staticmethod
+    def install(stack: ExitStack, timing: RequestTiming):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing))
+
+    @staticmethod
+    def shows_timing(request) -> bool:
+        user = getattr(request, "user", None)
+        return settings.DEBUG or (user is not None and user.is_staff)
+
+    def log(self, request, response, timing: RequestTiming, total: float):
+        if total * 1000 >= self.slow_ms:
+            logger.warning(
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "status": response.status_code,
+                        "total_ms": round(total * 1000, 1),
+                        "db_ms": round(timing.db_seconds * 1000, 1),
+                        "queries": timing.queries,
+                        "template_ms": (
+                            None
+                            if timing.template_seconds is None
+                            else round(timing.template_seconds * 1000, 1)
+                        ),
+                        "slowest": [
+                            {"ms": round(duration * 1000, 1), "sql": sql}
+                            for duration, sql in sorted(timing.slowest, reverse=True)
+                        ],
+                    }
+                )
+            )
+
+    def process_template_response(self, request, response):
+        # TemplateResponses are rendered right after this hook, so the render
+        # time is the time until the post-render callback. Views that call
+        # render() themselves have it counted as part of the view.
+        timing = getattr(request, "timing", None)
+        if timing is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                timing.template_seconds = time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
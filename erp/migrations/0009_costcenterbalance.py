@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def populate_balances(apps, schema_editor):
+    CostCenter = apps.get_model("erp", "CostCenter")
+    CostCenterBalance = apps.get_model("erp", "CostCenterBalance")
+    Purchase = apps.get_model("erp", "Purchase")
+    Funding = apps.get_model("erp", "Funding")
+
+    own_credit = dict(
+        Funding.objects.values("cost_center")
+        .annotate(s=Sum("credit"))
+        .values_list("cost_center", "s")
+    )
+    own_debit = dict(
+        Purchase.objects.values("cost_center")
+        .annotate(s=Sum("total_price"))
+        .values_list("cost_center", "s")
+    )
+
+    balances = {
+        cc_id: CostCenterBalance(
+            cost_center_id=cc_id,
+            own_credit=own_credit.get(cc_id) or Decimal(0),
+            own_debit=own_debit.get(cc_id) or Decimal(0),
+            subtree_credit=Decimal(0),
+            subtree_debit=Decimal(0),
+        )
+        for cc_id in CostCenter.objects.values_list("id", flat=True)
+    }
+    for cc_id, path in CostCenter.objects.values_list("id", "path"):
+        for ancestor_id in (int(p) for p in path.split("/") if p):
+            if ancestor_id in balances:
+                balances[ancestor_id].subtree_credit += balances[cc_id].own_credit
+                balances[ancestor_id].subtree_debit += balances[cc_id].own_debit
+
+    CostCenterBalance.objects.bulk_create(balances.values())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0008_rename_actual_price_purchase_total_price"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CostCenterBalance",
+            fields=[
+                (
+                    "cost_center",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="balance",
+                        serialize=False,
+                        to="erp.costcenter",
+                    ),
+                ),
+                (
+                    "own_credit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "own_debit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "subtree_credit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "subtree_debit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+            ],
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0009_costcenterbalance"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="funding",
+            index=models.Index(
+                fields=["funding_date", "id"], name="erp_funding_funding_989aec_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="purchase",
+            index=models.Index(
+                fields=["purchase_date", "id"], name="erp_purchas_purchas_d6e89e_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0010_purchase_funding_date_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="costcenter",
+            name="path",
+            field=models.CharField(db_index=True, default="", max_length=128),
+        ),
+        migrations.AddIndex(
+            model_name="funding",
+            index=models.Index(
+                fields=["cost_center", "funding_date"],
+                name="erp_funding_cost_ce_67da18_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="purchase",
+            index=models.Index(
+                fields=["cost_center", "purchase_date"],
+                name="erp_purchas_cost_ce_d75447_idx",
+            ),
+        ),
+    ]
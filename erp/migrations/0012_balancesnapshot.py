@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0011_subtree_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BalanceSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("as_of", models.DateTimeField(db_index=True)),
+                (
+                    "own_credit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "own_debit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "subtree_credit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "subtree_debit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "cost_center",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="erp.costcenter",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="balancesnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("cost_center", "as_of"), name="unique_snapshot_per_period"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0012_balancesnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="costcenterbalance",
+            name="version",
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+def merge_item_kinds(apps, schema_editor):
+    """
+    Normalizes item kind names, and merges kinds that only differed in case
+    or whitespace into the oldest one.
+    """
+    ItemKind = apps.get_model("erp", "ItemKind")
+    Purchase = apps.get_model("erp", "Purchase")
+
+    kept = {}
+    for item_kind in ItemKind.objects.order_by("id"):
+        item_kind.name = " ".join(item_kind.name.split())
+        item_kind.normalized_name = item_kind.name.casefold()
+        if item_kind.normalized_name in kept:
+            Purchase.objects.filter(item_id=item_kind.id).update(
+                item_id=kept[item_kind.normalized_name]
+            )
+            item_kind.delete()
+        else:
+            kept[item_kind.normalized_name] = item_kind.id
+            item_kind.save(update_fields=["name", "normalized_name"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0013_costcenterbalance_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="itemkind",
+            name="normalized_name",
+            field=models.CharField(default="", editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_item_kinds, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="itemkind",
+            name="normalized_name",
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:02
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_ledger_entries(apps, schema_editor):
+    LedgerEntry = apps.get_model("erp", "LedgerEntry")
+    Purchase = apps.get_model("erp", "Purchase")
+    Funding = apps.get_model("erp", "Funding")
+
+    def purchases():
+        for p in Purchase.objects.select_related("item", "cost_center").iterator():
+            yield LedgerEntry(
+                source=f"P{p.id}",
+                cost_center_id=p.cost_center_id,
+                path=p.cost_center.path,
+                date=p.purchase_date,
+                name=f"{p.item.name} x{Decimal(p.quantity).normalize():f}",
+                amount=-p.total_price,
+            )
+
+    def fundings():
+        for f in Funding.objects.select_related("cost_center").iterator():
+            yield LedgerEntry(
+                source=f"F{f.id}",
+                cost_center_id=f.cost_center_id,
+                path=f.cost_center.path,
+                date=f.funding_date,
+                name=f.name,
+                amount=f.credit,
+            )
+
+    LedgerEntry.objects.bulk_create(purchases(), batch_size=10000)
+    LedgerEntry.objects.bulk_create(fundings(), batch_size=10000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0014_itemkind_normalized_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                (
+                    "source",
+                    models.CharField(max_length=24, primary_key=True, serialize=False),
+                ),
+                ("path", models.CharField(max_length=128)),
+                ("date", models.DateTimeField()),
+                ("name", models.CharField(max_length=128)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=16)),
+                (
+                    "cost_center",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ledger_entries",
+                        to="erp.costcenter",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["path", "date", "source"],
+                        name="erp_ledgere_path_3f3192_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_ledger_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0015_ledgerentry"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                """
+                CREATE VIRTUAL TABLE erp_search USING fts5(
+                    source UNINDEXED,
+                    title,
+                    body,
+                    tokenize = "unicode61 remove_diacritics 2",
+                    prefix = "2 3"
+                )
+                """,
+                """
+                INSERT INTO erp_search (rowid, source, title, body)
+                SELECT 2 * p.id, 'P' || p.id, i.name,
+                    p.comment || char(10) || i.description || char(10) || p.supplier
+                FROM erp_purchase p JOIN erp_itemkind i ON i.id = p.item_id
+                """,
+                """
+                INSERT INTO erp_search (rowid, source, title, body)
+                SELECT 2 * f.id + 1, 'F' || f.id, f.name, f.comment
+                FROM erp_funding f
+                """,
+            ],
+            "DROP TABLE erp_search",
+        ),
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                ("rowid", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("source", models.CharField(max_length=24)),
+                ("title", models.TextField()),
+                ("body", models.TextField()),
+            ],
+            options={
+                "db_table": "erp_search",
+                "managed": False,
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_closure(apps, schema_editor):
+    CostCenter = apps.get_model("erp", "CostCenter")
+    CostCenterClosure = apps.get_model("erp", "CostCenterClosure")
+
+    CostCenterClosure.objects.bulk_create(
+        CostCenterClosure(ancestor_id=ancestor_id, descendant_id=cc_id, depth=depth)
+        for cc_id, path in CostCenter.objects.values_list("id", "path")
+        for depth, ancestor_id in enumerate(
+            reversed([int(p) for p in path.split("/") if p])
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0016_search"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="costcenter",
+            name="path",
+            field=models.TextField(db_index=True, default=""),
+        ),
+        migrations.AlterField(
+            model_name="ledgerentry",
+            name="path",
+            field=models.TextField(),
+        ),
+        migrations.CreateModel(
+            name="CostCenterClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="erp.costcenter",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="erp.costcenter",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "depth"],
+                        name="erp_costcen_descend_9de4c4_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="costcenterclosure",
+            constraint=models.UniqueConstraint(
+                fields=("ancestor", "descendant"), name="unique_closure_pair"
+            ),
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:21
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def populate_daily_spend(apps, schema_editor):
+    DailySpend = apps.get_model("erp", "DailySpend")
+    Purchase = apps.get_model("erp", "Purchase")
+
+    totals = defaultdict(Decimal)
+    for cc_id, when, amount in Purchase.objects.values_list(
+        "cost_center_id", "purchase_date", "total_price"
+    ).iterator(chunk_size=10000):
+        totals[cc_id, timezone.localdate(when)] += amount
+    DailySpend.objects.bulk_create(
+        (
+            DailySpend(cost_center_id=cc_id, day=day, amount=amount)
+            for (cc_id, day), amount in totals.items()
+            if amount
+        ),
+        batch_size=10000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0017_costcenterclosure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySpend",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "cost_center",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_spend",
+                        to="erp.costcenter",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["day", "cost_center"], name="erp_dailysp_day_4b82c2_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailyspend",
+            constraint=models.UniqueConstraint(
+                fields=("cost_center", "day"), name="unique_daily_spend"
+            ),
+        ),
+        migrations.RunPython(populate_daily_spend, migrations.RunPython.noop),
+    ]
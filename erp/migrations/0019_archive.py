@@ -0,0 +1,115 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("erp", "0018_dailyspend"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CarryForward",
+            fields=[
+                (
+                    "cost_center",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        primary_key=True,
+                        related_name="carry_forward",
+                        serialize=False,
+                        to="erp.costcenter",
+                    ),
+                ),
+                ("date", models.DateTimeField()),
+                (
+                    "credit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "debit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedPurchase",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("purchase_date", models.DateTimeField()),
+                ("comment", models.CharField(default="", max_length=64)),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("total_price", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("supplier", models.URLField(default="")),
+                ("create_date", models.DateTimeField()),
+                ("last_update_date", models.DateTimeField()),
+                ("archive_date", models.DateTimeField(auto_now_add=True)),
+                (
+                    "cost_center",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archived_purchases",
+                        to="erp.costcenter",
+                    ),
+                ),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archived_purchases",
+                        to="erp.itemkind",
+                    ),
+                ),
+                (
+                    "purchaser",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["cost_center", "purchase_date"],
+                        name="erp_archive_cost_ce_a46958_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedFunding",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=64)),
+                ("funding_date", models.DateTimeField()),
+                ("credit", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("comment", models.CharField(default="", max_length=64)),
+                ("create_date", models.DateTimeField()),
+                ("last_update_date", models.DateTimeField()),
+                ("archive_date", models.DateTimeField(auto_now_add=True)),
+                (
+                    "cost_center",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archived_fundings",
+                        to="erp.costcenter",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["cost_center", "funding_date"],
+                        name="erp_archive_cost_ce_acb824_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("erp", "0019_archive"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="itemkind",
+            name="normalized_name",
+            field=models.CharField(editable=False, max_length=192, unique=True),
+        ),
+    ]
@@ -1,16 +1,90 @@
-from typing import List, Iterable, NamedTuple
-from datetime import datetime
+import re
+from collections import defaultdict
+from itertools import islice
+from typing import (
+    Dict,
+    List,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models, transaction
-from django.db.models import F, Value, ExpressionWrapper, CharField, Sum
-from django.db.models.functions import Concat
+from django.db.models import (
+    Count,
+    F,
+    Q,
+    Max,
+    Min,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Value,
+    DecimalField,
+    Exists,
+    Sum,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, Substr, TruncDate
 from django.urls import reverse
+from django.utils import timezone
+
+from .db import retry_on_locked
 
 
 MAX_NAME_LENGTH = 64
 
+CENTS = Decimal("0.01")
+# SQLite's default limit on the terms of a compound SELECT.
+MAX_MERGED_PATHS = 500
+_AMOUNT_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def to_amount(value) -> Decimal:
+    """
+    Converts a price to the Decimal that actually ends up in the database.
+    """
+    return _AMOUNT_FIELD.to_python(value).quantize(CENTS)
+
+
+def subtree_q(path: str, prefix: str = "") -> Q:
+    """
+    Matches the cost center with the given path and all of its descendants.
+
+    This is a range rather than a startswith, which SQLite compiles to a LIKE
+    that cannot use the path index. "0" is the character right after "/", so
+    the range covers exactly the paths equal to `path` or below "`path`/".
+    """
+    return Q(**{f"{prefix}path__gte": path, f"{prefix}path__lt": f"{path}0"})
+
+
+def normalize_item_name(name: str) -> str:
+    """
+    Strips an item kind name and collapses runs of whitespace.
+    """
+    return " ".join(name.split())
+
+
+def item_name_key(name: str) -> str:
+    """
+    The normalized, case-insensitive form of an item kind name, which is
+    unique among item kinds.
+    """
+    return normalize_item_name(name).casefold()
+
+
+def path_ids(path: str) -> List[int]:
+    """
+    Splits a cost center path like "/1/4/9" into its ids, root first.
+    """
+    return [int(p) for p in path.split("/") if p]
+
 
 class Purchase(models.Model):
     """
@@ -35,6 +109,39 @@ class Purchase(models.Model):
     create_date = models.DateTimeField(auto_now_add=True)
     last_update_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["purchase_date", "id"]),
+            models.Index(fields=["cost_center", "purchase_date"]),
+        ]
+
+    @retry_on_locked
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = (
+                Purchase.objects.filter(pk=self.pk)
+                .values_list("cost_center_id", "purchase_date", "total_price")
+                .first()
+                if self.pk is not None
+                else None
+            )
+            self.total_price = to_amount(self.total_price)
+            super().save(*args, **kwargs)
+
+            changes = [self.ledger_change()]
+            if previous is not None:
+                cost_center_id, date, total_price = previous
+                changes.append(
+                    LedgerChange(cost_center_id, date, Decimal(0), -total_price)
+                )
+            apply_ledger_changes(changes)
+            LedgerEntry.write([self])
+
+    def ledger_change(self) -> "LedgerChange":
+        return LedgerChange(
+            self.cost_center_id, self.purchase_date, Decimal(0), self.total_price
+        )
+
     def __str__(self) -> str:
         return self.comment or f"{self.item.name} x{self.quantity}"
 
@@ -56,6 +163,37 @@ class Funding(models.Model):
     create_date = models.DateTimeField(auto_now_add=True)
     last_update_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["funding_date", "id"]),
+            models.Index(fields=["cost_center", "funding_date"]),
+        ]
+
+    @retry_on_locked
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = (
+                Funding.objects.filter(pk=self.pk)
+                .values_list("cost_center_id", "funding_date", "credit")
+                .first()
+                if self.pk is not None
+                else None
+            )
+            self.credit = to_amount(self.credit)
+            super().save(*args, **kwargs)
+
+            changes = [self.ledger_change()]
+            if previous is not None:
+                cost_center_id, date, credit = previous
+                changes.append(LedgerChange(cost_center_id, date, -credit, Decimal(0)))
+            apply_ledger_changes(changes)
+            LedgerEntry.write([self])
+
+    def ledger_change(self) -> "LedgerChange":
+        return LedgerChange(
+            self.cost_center_id, self.funding_date, self.credit, Decimal(0)
+        )
+
     def __str__(self) -> str:
         return self.name
 
@@ -63,14 +201,225 @@ class Funding(models.Model):
         return reverse('funding', kwargs={'pk': self.id})
 
 
+class ArchivedPurchase(models.Model):
+    """
+    A purchase moved out of the purchase table by archive_transactions(),
+    under its original id. Its total lives on in its cost center's
+    CarryForward.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    purchase_date = models.DateTimeField()
+
+    comment = models.CharField(max_length=MAX_NAME_LENGTH, null=False, default="")
+    item = models.ForeignKey(
+        "ItemKind", on_delete=models.PROTECT, related_name="archived_purchases"
+    )
+
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    supplier = models.URLField(null=False, default="")
+
+    cost_center = models.ForeignKey(
+        "CostCenter", on_delete=models.PROTECT, related_name="archived_purchases"
+    )
+
+    purchaser = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+
+    create_date = models.DateTimeField()
+    last_update_date = models.DateTimeField()
+    archive_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["cost_center", "purchase_date"])]
+
+    def __str__(self) -> str:
+        return self.comment or f"{self.item.name} x{self.quantity}"
+
+    def get_absolute_url(self) -> str:
+        return reverse("purchase", kwargs={"pk": self.id})
+
+
+class ArchivedFunding(models.Model):
+    """
+    A funding moved out of the funding table by archive_transactions(),
+    under its original id. Its credit lives on in its cost center's
+    CarryForward.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=MAX_NAME_LENGTH)
+    cost_center = models.ForeignKey(
+        "CostCenter", on_delete=models.PROTECT, related_name="archived_fundings"
+    )
+    funding_date = models.DateTimeField()
+    credit = models.DecimalField(max_digits=12, decimal_places=2)
+    comment = models.CharField(max_length=MAX_NAME_LENGTH, null=False, default="")
+
+    create_date = models.DateTimeField()
+    last_update_date = models.DateTimeField()
+    archive_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["cost_center", "funding_date"])]
+
+    def __str__(self) -> str:
+        return self.name
+
+    def get_absolute_url(self) -> str:
+        return reverse("funding", kwargs={"pk": self.id})
+
+
+class CarryForward(models.Model):
+    """
+    The totals of a cost center's archived purchases and fundings. They
+    count towards its stored balances like the transactions did, and its
+    balance sheet shows them as one opening entry dated at the latest
+    archive cutoff.
+    """
+
+    cost_center = models.OneToOneField(
+        "CostCenter",
+        primary_key=True,
+        on_delete=models.PROTECT,
+        related_name="carry_forward",
+    )
+    # The latest cutoff that transactions of the cost center were archived at.
+    date = models.DateTimeField()
+    credit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    debit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    NAME = "Carried forward"
+
+    def __str__(self) -> str:
+        return f"Carried forward to {self.cost_center_id}: {self.balance}"
+
+    @property
+    def balance(self) -> Decimal:
+        return self.credit - self.debit
+
+    @classmethod
+    def add(cls, changes: List["LedgerChange"], date: datetime):
+        """
+        Adds the amounts of archived transactions to the carry-forwards of
+        their cost centers, dated no earlier than `date`, and rewrites their
+        ledger entries.
+        """
+        totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        for change in changes:
+            totals[change.cost_center_id][0] += change.credit
+            totals[change.cost_center_id][1] += change.debit
+        current = cls.objects.in_bulk(totals.keys())
+
+        rows = []
+        for cc_id, (credit, debit) in totals.items():
+            row = current.get(cc_id) or cls(cost_center_id=cc_id, date=date)
+            row.date = max(row.date, date)
+            row.credit += credit
+            row.debit += debit
+            rows.append(row)
+        cls.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["cost_center"],
+            update_fields=["date", "credit", "debit"],
+        )
+        LedgerEntry.upsert(LedgerEntry.build(rows))
+
+    @classmethod
+    def compute(cls) -> Dict[int, Tuple[Decimal, Decimal]]:
+        """
+        Computes the (credit, debit) totals of every cost center's archived
+        transactions.
+        """
+        totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        for model, field, i in (
+            (ArchivedFunding, "credit", 0),
+            (ArchivedPurchase, "total_price", 1),
+        ):
+            for cc_id, amount in (
+                model.objects.values("cost_center")
+                .annotate(s=Sum(field))
+                .values_list("cost_center", "s")
+            ):
+                totals[cc_id][i] += amount
+        return {k: tuple(v) for k, v in totals.items()}
+
+    @classmethod
+    def verify(cls) -> List[int]:
+        """
+        Returns the ids of cost centers whose carry-forward does not match
+        their archived transactions.
+        """
+        totals = cls.compute()
+        stored = {
+            cc_id: (credit, debit)
+            for cc_id, credit, debit in cls.objects.values_list(
+                "cost_center_id", "credit", "debit"
+            )
+        }
+        return sorted(
+            cc_id
+            for cc_id in totals.keys() | stored.keys()
+            if totals.get(cc_id) != stored.get(cc_id)
+        )
+
+
 class ItemKind(models.Model):
     """
     A kind of item.
+
+    Names are unique up to case and whitespace, see item_name_key().
     """
 
     name = models.CharField(max_length=MAX_NAME_LENGTH)
     description = models.TextField()
 
+    # item_name_key(name), kept up to date by save(). Indexed for lookups
+    # and prefix searches. Case folding turns a character into up to three
+    # ("ß" becomes "ss"), so the key may be longer than the name.
+    normalized_name = models.CharField(
+        max_length=3 * MAX_NAME_LENGTH, unique=True, editable=False
+    )
+
+    def clean(self):
+        # normalized_name is not editable, so forms do not check it.
+        duplicates = ItemKind.objects.filter(normalized_name=item_name_key(self.name))
+        if duplicates.exclude(pk=self.pk).exists():
+            raise ValidationError({"name": "An item kind with this name exists."})
+
+    def save(self, *args, **kwargs):
+        self.name = normalize_item_name(self.name)
+        self.normalized_name = item_name_key(self.name)
+        with transaction.atomic():
+            old = (
+                ItemKind.objects.filter(pk=self.pk)
+                .values_list("name", "description")
+                .first()
+                if self.pk is not None
+                else None
+            )
+            super().save(*args, **kwargs)
+            if old is None:
+                return
+
+            if old[0] != self.name:
+                # Item names show up in the balance sheets of every cost
+                # center with purchases of this kind.
+                paths = (
+                    Purchase.objects.filter(item=self)
+                    .values_list("cost_center__path", flat=True)
+                    .distinct()
+                )
+                CostCenterBalance.touch({id for path in paths for id in path_ids(path)})
+            if old != (self.name, self.description):
+                LedgerEntry.refresh_item_kind(self)
+
     def __str__(self) -> str:
         return self.name
 
@@ -78,6 +427,65 @@ class ItemKind(models.Model):
     def url(self) -> str:
         return f"/item-kinds/{self.id}"
 
+    @classmethod
+    def ids_for_names(
+        cls, names: Iterable[str], description: str = ""
+    ) -> Dict[str, int]:
+        """
+        Returns the ids of the item kinds with the given names by
+        item_name_key(), creating the missing ones with bulk inserts.
+
+        Kinds created concurrently by someone else are picked up rather than
+        duplicated, thanks to the unique normalized_name.
+        """
+        # The first spelling of each name is the one created.
+        spellings = {}
+        for name in names:
+            spellings.setdefault(item_name_key(name), normalize_item_name(name))
+        names = spellings
+
+        ids = dict(
+            cls.objects.filter(normalized_name__in=names).values_list(
+                "normalized_name", "id"
+            )
+        )
+        missing = [key for key in names if key not in ids]
+        if missing:
+            cls.objects.bulk_create(
+                [
+                    cls(name=names[key], normalized_name=key, description=description)
+                    for key in missing
+                ],
+                ignore_conflicts=True,
+            )
+            ids.update(
+                cls.objects.filter(normalized_name__in=missing).values_list(
+                    "normalized_name", "id"
+                )
+            )
+        return ids
+
+    @classmethod
+    def search(cls, prefix: str, limit: int):
+        """
+        Returns up to `limit` item kinds whose names start with `prefix`,
+        ignoring case, in alphabetical order.
+
+        Like subtree_q(), this is a range on the index rather than a LIKE.
+        """
+        return cls.objects.filter(cls.prefix_q(prefix)).order_by("normalized_name")[
+            :limit
+        ]
+
+    @staticmethod
+    def prefix_q(prefix: str) -> Q:
+        """
+        Selects the item kinds whose names start with `prefix`, ignoring case
+        and whitespace. U+10FFFF sorts after every other character.
+        """
+        key = item_name_key(prefix)
+        return Q(normalized_name__gte=key, normalized_name__lt=f"{key}\U0010ffff")
+
 
 class CostCenter(models.Model):
     """
@@ -90,7 +498,9 @@ class CostCenter(models.Model):
         "CostCenter", null=True, on_delete=models.SET_NULL, related_name="children"
     )
 
-    path = models.CharField(max_length=128, default="")
+    # Ids from the root down to this cost center, e.g. "/1/4/9". Unbounded,
+    # like the tree. CostCenterClosure has the same information in rows.
+    path = models.TextField(default="", db_index=True)
     # return str(self.id) if self.parent is None else f"{self.parent.path}/{self.id}"
 
     def save(self, *args, **kwargs):
@@ -107,25 +517,59 @@ class CostCenter(models.Model):
                 super().save(
                     force_update=True
                 )  # Must be an update to prevent double-insert
+                CostCenterClosure.add([self])
+                CostCenterBalance.objects.create(cost_center=self)
+                BalanceSnapshot.add_cost_center(self.id)
+                # The new child shows up on the pages of its ancestors.
+                CostCenterBalance.touch(path_ids(self.path))
             return
 
-        # Otherwise, we already know the ID and must update child paths.
+        # Otherwise, we already know the ID and may have to update child paths.
         with transaction.atomic():
-            visited = []
-            nodes = [(self, self.parent.path if self.parent else "/")]
-            while nodes:
-                n, parent_path = nodes[-1]
-                nodes.pop()
+            old_parent_id, old_path = CostCenter.objects.values_list(
+                "parent_id", "path"
+            ).get(pk=self.pk)
+
+            if self.parent_id == old_parent_id:
+                # Not a reparent, so no path in the subtree changes. The name
+                # may have, which shows up in the balance sheets above it and
+                # in the breadcrumbs below it.
+                self.path = old_path
+                super().save(*args, **kwargs)
+                CostCenterBalance.touch_subtree(old_path)
+                return
+
+            parent_path = (
+                ""
+                if self.parent_id is None
+                else CostCenter.objects.values_list("path", flat=True).get(
+                    pk=self.parent_id
+                )
+            )
+            if self.id in path_ids(parent_path):
+                raise ValueError(f"{self!r} cannot be moved below its own descendant")
+
+            self.path = f"{parent_path}/{self.id}"
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "path"}
+            super().save(*args, **kwargs)
 
-                n.path = f"{parent_path}/{n.id}"
-                visited.append(n)
+            # Rewrite the old path prefix of every descendant in one go.
+            CostCenter.objects.filter(subtree_q(old_path), path__gt=old_path).update(
+                path=Concat(Value(self.path), Substr("path", len(old_path) + 1))
+            )
 
-                for c in n.children.all():
-                    nodes.append((c, n.path))
+            apply_reparent(self.pk, old_path, self.path)
 
-            for n in visited:
-                print(n, n.path)
-                models.Model.save(n, force_update=True)
+    def clean(self):
+        if (
+            self.id is not None
+            and self.parent is not None
+            and self.id in path_ids(self.parent.path)
+        ):
+            raise ValidationError(
+                {"parent": "A cost center cannot be moved below its own descendant."}
+            )
 
     def get_absolute_url(self) -> str:
         return reverse('cost-center', kwargs={'pk': self.id})
@@ -136,73 +580,1768 @@ class CostCenter(models.Model):
     def __repr__(self):
         return f"Cost Center {self.name} ({self.id})"
 
+    @classmethod
+    def build_tree(cls) -> List["CostCenterNode"]:
+        """
+        Loads every cost center along with its balance in a single query and
+        returns the root nodes of the assembled hierarchy.
+        """
+        nodes = {
+            cc.id: CostCenterNode(cc, [])
+            for cc in cls.objects.select_related("balance").order_by("id")
+        }
+
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node.cost_center.parent_id)
+            if parent is None:
+                roots.append(node)
+            else:
+                parent.children.append(node)
+        return roots
+
+    def ancestors(self):
+        """
+        Returns the ancestors of this cost center, root first.
+        """
+        return CostCenter.objects.filter(
+            descendant_links__descendant=self, descendant_links__depth__gt=0
+        ).order_by("-descendant_links__depth")
+
+    def descendants(self, max_depth: Optional[int] = None):
+        """
+        Returns the descendants of this cost center, down to `max_depth`
+        levels below it if given, level by level.
+        """
+        links = {"ancestor_links__ancestor": self, "ancestor_links__depth__gt": 0}
+        if max_depth is not None:
+            links["ancestor_links__depth__lte"] = max_depth
+        return CostCenter.objects.filter(**links).order_by(
+            "ancestor_links__depth", "path"
+        )
+
+    @property
+    def depth(self) -> int:
+        """
+        The number of ancestors of this cost center.
+        """
+        return CostCenterClosure.objects.filter(descendant=self).aggregate(
+            d=Max("depth")
+        )["d"]
+
     def iter_upwards(self) -> Iterable["CostCenter"]:
         """
         Iterator that goes upwards, starting from this node.
         """
-        n = self
-        while n is not None:
-            yield n
-            n = n.parent
+        yield self
+        yield from reversed(list(self.ancestors()))
 
     def nav_path(self) -> List["CostCenter"]:
-        path = list(self.iter_upwards())
-        path.reverse()
-        return path
+        if self.parent_id is None:
+            return [self]
+        return [*self.ancestors(), self]
 
     @property
-    def total_balance(self) -> float:
-        return (
-            self.recursive_fundings.aggregate(b=Sum("credit"))["b"]
-            - self.recursive_purchases.aggregate(b=Sum("total_price"))["b"]
+    def total_balance(self) -> Decimal:
+        return self.balance.subtree_balance
+
+    def balance_as_of(self, when: Union[date, datetime]) -> Decimal:
+        """
+        Returns the balance of this cost center's subtree as of the given
+        date (inclusive) or datetime (exclusive), starting from the nearest
+        earlier period-close snapshot.
+        """
+        if not isinstance(when, datetime):
+            when = timezone.make_aware(
+                datetime.combine(when + timedelta(days=1), time.min)
+            )
+
+        snapshot = (
+            self.snapshots.filter(as_of__lte=when)
+            .annotate(
+                archived_until=Subquery(
+                    CarryForward.objects.order_by("-date").values("date")[:1]
+                )
+            )
+            .order_by("-as_of")
+            .first()
         )
+        sources = [(self.recursive_purchases, self.recursive_fundings)]
+        # Archiving closes a period at its cutoff, so archived transactions
+        # are only read for dates before the latest cutoff.
+        if snapshot is None or (
+            snapshot.archived_until is not None
+            and snapshot.as_of < snapshot.archived_until
+        ):
+            sources.append(
+                (
+                    ArchivedPurchase.objects.filter(cost_center__in=self.subtree()),
+                    ArchivedFunding.objects.filter(cost_center__in=self.subtree()),
+                )
+            )
+
+        balance = snapshot.subtree_balance if snapshot is not None else Decimal(0)
+        for purchases, fundings in sources:
+            purchases = purchases.filter(purchase_date__lt=when)
+            fundings = fundings.filter(funding_date__lt=when)
+            if snapshot is not None:
+                purchases = purchases.filter(purchase_date__gte=snapshot.as_of)
+                fundings = fundings.filter(funding_date__gte=snapshot.as_of)
+            balance += fundings.aggregate(s=Sum("credit"))["s"] or Decimal(0)
+            balance -= purchases.aggregate(s=Sum("total_price"))["s"] or Decimal(0)
+        return balance
+
+    def subtree(self):
+        """
+        Returns this cost center and all of its descendants.
+        """
+        return CostCenter.objects.filter(subtree_q(self.path))
 
     @property
     def recursive_purchases(self):
-        return Purchase.objects.filter(cost_center__path__startswith=self.path)
+        return Purchase.objects.filter(cost_center__in=self.subtree())
 
     @property
     def recursive_fundings(self):
-        return Funding.objects.filter(cost_center__path__startswith=self.path)
+        return Funding.objects.filter(cost_center__in=self.subtree())
+
+    def _balance_sheet_entries(self, q: Optional[Q] = None):
+        """
+        Returns the ledger entries under this cost center (or matching `q`),
+        annotated with their balance sheet sort key (t_date, t_id).
+        """
+        return LedgerEntry.objects.filter(
+            subtree_q(self.path) if q is None else q
+        ).annotate(t_id=F("source"), t_date=F("date"))
 
-    def query_balance_sheet(self):
+    def query_balance_sheet(
+        self,
+        after: Optional[Tuple[datetime, str]] = None,
+        before: Optional[Tuple[datetime, str]] = None,
+        paths: Optional[List[str]] = None,
+    ):
         """
         Returns the balance sheet for all transactions in
         this cost center and all of its children.
+
+        If given, `after` and `before` are (t_date, t_id) keys that restrict
+        the result to rows strictly after/before them in balance sheet order.
+        `paths` are those of the subtree, if already loaded.
+
+        The entries of each cost center are read in balance sheet order from
+        the (path, date, source) index and merged by a UNION ALL, so ordered
+        pages never sort the subtree. Subtrees with more cost centers than a
+        compound SELECT may have are read with one range scan instead.
         """
+        if paths is None:
+            paths = list(self.subtree().values_list("path", flat=True))
+        if len(paths) > MAX_MERGED_PATHS:
+            return self._balance_sheet_rows(None, after, before)
+        rows = [self._balance_sheet_rows(Q(path=p), after, before) for p in paths]
+        return rows[0].union(*rows[1:], all=True) if len(rows) > 1 else rows[0]
 
-        purchases = self.recursive_purchases.values(
-            t_id=ExpressionWrapper(
-                Concat(Value("P"), F("pk")), output_field=CharField()
-            ),
-            t_date=F("purchase_date"),
-            t_name=ExpressionWrapper(
-                Concat(F("item__name"), Value(" x"), F("quantity")),
-                output_field=CharField(),
-            ),
+    def _balance_sheet_rows(
+        self,
+        q: Optional[Q],
+        after: Optional[Tuple[datetime, str]],
+        before: Optional[Tuple[datetime, str]],
+    ):
+        entries = self._balance_sheet_entries(q)
+        if after is not None:
+            entries = entries.filter(_key_after(after))
+        if before is not None:
+            entries = entries.filter(_key_before(before))
+
+        return entries.values(
+            "t_id",
+            "t_date",
+            t_name=F("name"),
             t_cost_center=F("cost_center__name"),
-            t_cost_center_id=F("cost_center__id"),
-            t_price=-F("total_price"),
-            t_href=ExpressionWrapper(
-                Concat(Value("/purchases/"), F("pk")), output_field=CharField()
-            ),
+            t_cost_center_id=F("cost_center_id"),
+            t_price=F("amount"),
         )
 
-        fundings = self.recursive_fundings.values(
-            t_id=ExpressionWrapper(
-                Concat(Value("F"), F("pk")), output_field=CharField()
+    def opening_balance(
+        self, key: Tuple[datetime, str], paths: Optional[List[str]] = None
+    ) -> Decimal:
+        """
+        Returns the balance of this cost center's subtree just before the
+        balance sheet row with the given (t_date, t_id) key.
+
+        Starts from the known balance closest to the key in time, so deep
+        pages cost no more than the first (see _opening_balance_terms()).
+        """
+        balance, sign, entries = self._opening_balance_terms(key, paths)
+        return balance + sign * (entries.aggregate(s=Sum("amount"))["s"] or 0)
+
+    def _opening_balance_terms(
+        self, key: Tuple[datetime, str], paths: Optional[List[str]] = None
+    ) -> Tuple[Decimal, int, QuerySet]:
+        """
+        Returns (balance, sign, entries), where the opening balance at `key`
+        is `balance` plus `sign` times the sum of `entries`.
+
+        The balance is that of the nearest period-close snapshot before or
+        after the key, of the start of the ledger (zero) or of the stored
+        current balance, whichever is closest in time. The entries are those
+        between it and the key, read from the (path, date, source) index.
+        """
+        t_date, t_id = key
+        if paths is None:
+            paths = list(self.subtree().values_list("path", flat=True))
+        entries = LedgerEntry.objects.filter(path__in=paths)
+        before_key = Q(date__lte=t_date) & (Q(date__lt=t_date) | Q(source__lt=t_id))
+        from_key = Q(date__gte=t_date) & (Q(date__gt=t_date) | Q(source__gte=t_id))
+
+        # Snapshots up to an archive cutoff count the archived transactions,
+        # which carry-forward entries dated at the cutoff count again.
+        archived_until = CarryForward.objects.order_by("-date").values("date")[:1]
+        snapshots = self.snapshots.filter(
+            Q(as_of__gt=Subquery(archived_until)) | ~Exists(archived_until)
+        ).values_list("as_of", "subtree_credit", "subtree_debit")
+        earlier = later = None
+        for as_of, credit, debit in snapshots:
+            if as_of <= t_date:
+                if earlier is None or as_of > earlier[0]:
+                    earlier = (as_of, credit - debit)
+            elif later is None or as_of < later[0]:
+                later = (as_of, credit - debit)
+
+        # The start and the stored balance are as far from the key as the
+        # first and last entries.
+        if earlier is None:
+            first = self.query_balance_sheet(paths=paths).order_by("t_date", "t_id")[:1]
+            earlier = (first[0]["t_date"] if first else t_date, None)
+        if later is None:
+            last = self.query_balance_sheet(paths=paths).order_by("-t_date", "-t_id")[
+                :1
+            ]
+            later = (last[0]["t_date"] if last else t_date, None)
+
+        if t_date - earlier[0] <= later[0] - t_date:
+            as_of, balance = earlier
+            if balance is None:
+                return Decimal(0), 1, entries.filter(before_key)
+            return balance, 1, entries.filter(before_key, date__gte=as_of)
+
+        as_of, balance = later
+        if balance is None:
+            # Read afresh, since self.balance may have been cached before the
+            # latest writes.
+            balance = CostCenterBalance.objects.get(pk=self.pk).subtree_balance
+            return balance, -1, entries.filter(from_key)
+        return balance, -1, entries.filter(from_key, date__lt=as_of)
+
+    def balance_sheet_page(
+        self,
+        size: int,
+        after: Optional[Tuple[datetime, str]] = None,
+        before: Optional[Tuple[datetime, str]] = None,
+    ) -> "BalanceSheetPage":
+        """
+        Returns one page of the balance sheet in (t_date, t_id) order,
+        starting after or ending before the given key. Every row gets a
+        running `t_balance`, seeded from the opening balance of the page,
+        and a link `t_href`.
+        """
+        paths = list(self.subtree().values_list("path", flat=True))
+        if before is not None:
+            rows = list(
+                self.query_balance_sheet(before=before, paths=paths).order_by(
+                    "-t_date", "-t_id"
+                )[: size + 1]
+            )
+            has_previous = len(rows) > size
+            rows = rows[:size]
+            rows.reverse()
+            has_next = True
+        else:
+            rows = list(
+                self.query_balance_sheet(after=after, paths=paths).order_by(
+                    "t_date", "t_id"
+                )[: size + 1]
+            )
+            has_next = len(rows) > size
+            rows = rows[:size]
+            has_previous = after is not None
+
+        if rows and has_previous:
+            balance = self.opening_balance((rows[0]["t_date"], rows[0]["t_id"]), paths)
+        else:
+            balance = Decimal(0)
+        for row in rows:
+            balance += row["t_price"]
+            row["t_balance"] = balance
+            row["t_href"] = LedgerEntry.href(row["t_id"])
+
+        return BalanceSheetPage(
+            rows=rows,
+            previous_key=(
+                (rows[0]["t_date"], rows[0]["t_id"]) if rows and has_previous else None
             ),
-            t_date=F("funding_date"),
-            t_name=F("name"),
-            t_cost_center=F("cost_center__name"),
-            t_cost_center_id=F("cost_center__id"),
-            t_price=F("credit"),
-            t_href=ExpressionWrapper(
-                Concat(Value("/fundings/"), F("pk")), output_field=CharField()
+            next_key=(
+                (rows[-1]["t_date"], rows[-1]["t_id"]) if rows and has_next else None
+            ),
+        )
+
+
+# The date bound on its own lets SQLite seek in the (path, date, source)
+# index, which it does not for the equivalent "date > ? OR (date = ? AND ...)".
+
+
+def _key_after(key: Tuple[datetime, str]) -> Q:
+    t_date, t_id = key
+    return Q(t_date__gte=t_date) & (Q(t_date__gt=t_date) | Q(t_id__gt=t_id))
+
+
+def _key_before(key: Tuple[datetime, str]) -> Q:
+    t_date, t_id = key
+    return Q(t_date__lte=t_date) & (Q(t_date__lt=t_date) | Q(t_id__lt=t_id))
+
+
+class BalanceSheetPage(NamedTuple):
+    """
+    A page of a cost center's balance sheet, with the keys to continue from
+    in either direction (None if there are no more rows that way).
+    """
+
+    rows: List[dict]
+    previous_key: Optional[Tuple[datetime, str]]
+    next_key: Optional[Tuple[datetime, str]]
+
+
+class CostCenterClosure(models.Model):
+    """
+    One row for every cost center and each of its ancestors, and one for the
+    cost center itself at depth 0. Answers ancestor and descendant queries
+    with one indexed lookup, however deep the tree.
+
+    Kept up to date by CostCenter.save(), in the same transaction.
+    """
+
+    ancestor = models.ForeignKey(
+        CostCenter,
+        on_delete=models.CASCADE,
+        related_name="descendant_links",
+        db_index=False,
+    )
+    descendant = models.ForeignKey(
+        CostCenter,
+        on_delete=models.CASCADE,
+        related_name="ancestor_links",
+        db_index=False,
+    )
+    # Levels between the two, 0 if they are the same.
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index for descendant lookups.
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"], name="unique_closure_pair"
+            )
+        ]
+        indexes = [models.Index(fields=["descendant", "depth"])]
+
+    def __str__(self) -> str:
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
+
+    @classmethod
+    def rows_for(cls, cost_center_id: int, path: str) -> List["CostCenterClosure"]:
+        ids = path_ids(path)
+        return [
+            cls(ancestor_id=ancestor_id, descendant_id=cost_center_id, depth=depth)
+            for depth, ancestor_id in enumerate(reversed(ids))
+        ]
+
+    @classmethod
+    def add(cls, cost_centers: Iterable[CostCenter]):
+        """
+        Adds the rows of new cost centers, whose paths are set.
+        """
+        cls.objects.bulk_create(
+            row for cc in cost_centers for row in cls.rows_for(cc.id, cc.path)
+        )
+
+    @classmethod
+    def move_subtree(cls, cost_center_id: int, old_path: str, new_path: str):
+        """
+        Links the subtree of a cost center that moved from `old_path` to
+        `new_path` to its new ancestors instead of the old ones.
+        """
+        subtree = list(
+            cls.objects.filter(ancestor_id=cost_center_id).values_list(
+                "descendant_id", "depth"
+            )
+        )
+        cls.objects.filter(
+            descendant__in=Subquery(
+                cls.objects.filter(ancestor_id=cost_center_id).values("descendant")
             ),
+            ancestor__in=path_ids(old_path)[:-1],
+        ).delete()
+
+        new_ancestors = path_ids(new_path)[:-1]
+        cls.objects.bulk_create(
+            cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=i + depth)
+            for i, ancestor_id in enumerate(reversed(new_ancestors), start=1)
+            for descendant_id, depth in subtree
+        )
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        Recreates every row from the cost center paths. Returns the number
+        of rows written.
+        """
+        with transaction.atomic():
+            cls.objects.all().delete()
+            rows = cls.objects.bulk_create(
+                row
+                for cc_id, path in CostCenter.objects.values_list("id", "path")
+                for row in cls.rows_for(cc_id, path)
+            )
+        return len(rows)
+
+
+class CostCenterNode(NamedTuple):
+    """
+    A cost center in a tree built by CostCenter.build_tree().
+    """
+
+    cost_center: CostCenter
+    children: List["CostCenterNode"]
+
+
+class CostCenterBalance(models.Model):
+    """
+    Stored credit/debit totals of a cost center, both for its own
+    transactions and for its whole subtree.
+
+    Kept up to date by Purchase/Funding writes and by reparenting, in the same
+    transaction. Run `manage.py rebuild_balances` to recompute from scratch.
+
+    Also holds a version stamp, set together with the totals, which
+    identifies the state of the subtree for caches and HTTP validators.
+    Every change stamps the affected rows with a value higher than any
+    existing one, so the highest version identifies the state of the whole
+    ledger.
+    """
+
+    cost_center = models.OneToOneField(
+        CostCenter, primary_key=True, on_delete=models.CASCADE, related_name="balance"
+    )
+
+    own_credit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    own_debit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    subtree_credit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    subtree_debit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    # Raised whenever anything in the subtree changes, see next_version().
+    version = models.PositiveBigIntegerField(default=0, db_index=True)
+
+    def __str__(self) -> str:
+        return f"Balance of {self.cost_center_id}: {self.subtree_balance}"
+
+    @property
+    def own_balance(self) -> Decimal:
+        return self.own_credit - self.own_debit
+
+    @property
+    def subtree_balance(self) -> Decimal:
+        return self.subtree_credit - self.subtree_debit
+
+    @classmethod
+    def next_version(cls):
+        """
+        An expression for a version higher than every stored one. Writes
+        are serialized, so it is unique per UPDATE statement.
+        """
+        latest = cls.objects.order_by("-version").values("version")[:1]
+        return Coalesce(Subquery(latest), 0) + 1
+
+    @classmethod
+    def latest_version(cls) -> int:
+        return cls.objects.aggregate(v=Max("version"))["v"] or 0
+
+    @classmethod
+    def apply_deltas(cls, deltas: Dict[int, Tuple[Decimal, Decimal]]):
+        """
+        Adds (credit, debit) amounts to the own totals of the given cost
+        centers, and to the subtree totals of them and all of their ancestors.
+        Zero deltas still raise the versions, since the transactions may have
+        changed in other ways.
+        """
+        deltas = {k: v for k, v in deltas.items() if k is not None}
+        if not deltas:
+            return
+
+        paths = CostCenter.objects.filter(pk__in=deltas.keys()).values_list(
+            "id", "path"
+        )
+        changes = defaultdict(lambda: [Decimal(0)] * 4)
+        for cc_id, path in paths:
+            credit, debit = deltas[cc_id]
+            changes[cc_id][0] += credit
+            changes[cc_id][1] += debit
+            for ancestor_id in path_ids(path):
+                changes[ancestor_id][2] += credit
+                changes[ancestor_id][3] += debit
+
+        cls._apply_changes(changes)
+
+    @classmethod
+    def move_subtree(cls, cost_center_id: int, old_path: str, new_path: str):
+        """
+        Moves the subtree totals of a reparented cost center from its
+        old ancestors to its new ones.
+        """
+        old_ancestors = set(path_ids(old_path)) - {cost_center_id}
+        new_ancestors = set(path_ids(new_path)) - {cost_center_id}
+        if old_ancestors == new_ancestors:
+            return
+
+        credit, debit = cls.objects.values_list("subtree_credit", "subtree_debit").get(
+            pk=cost_center_id
+        )
+
+        changes = defaultdict(lambda: [Decimal(0)] * 4)
+        changes[cost_center_id] = [Decimal(0)] * 4
+        for ancestor_id in old_ancestors - new_ancestors:
+            changes[ancestor_id][2] -= credit
+            changes[ancestor_id][3] -= debit
+        for ancestor_id in new_ancestors - old_ancestors:
+            changes[ancestor_id][2] += credit
+            changes[ancestor_id][3] += debit
+
+        cls._apply_changes(changes)
+
+    @classmethod
+    def _apply_changes(cls, changes: Dict[int, List[Decimal]]):
+        # Cost centers receiving the same change are updated together, so a
+        # single transaction usually costs two UPDATEs regardless of depth.
+        groups = defaultdict(list)
+        for cc_id, change in changes.items():
+            groups[tuple(change)].append(cc_id)
+
+        for change, ids in groups.items():
+            own_credit, own_debit, subtree_credit, subtree_debit = change
+            cls.objects.filter(pk__in=ids).update(
+                own_credit=F("own_credit") + own_credit,
+                own_debit=F("own_debit") + own_debit,
+                subtree_credit=F("subtree_credit") + subtree_credit,
+                subtree_debit=F("subtree_debit") + subtree_debit,
+                version=cls.next_version(),
+            )
+
+    @classmethod
+    def touch(cls, cost_center_ids: Iterable[int]):
+        """
+        Raises the version of the given cost centers without changing their
+        totals.
+        """
+        cls.objects.filter(pk__in=cost_center_ids).update(version=cls.next_version())
+
+    @classmethod
+    def touch_subtree(cls, path: str):
+        """
+        Raises the version of the cost center at `path`, of its ancestors and
+        of its descendants, whose pages show its name in balance sheets and
+        breadcrumbs, with one UPDATE.
+        """
+        cls.objects.filter(
+            Q(pk__in=path_ids(path)) | subtree_q(path, "cost_center__")
+        ).update(version=cls.next_version())
+
+    @classmethod
+    def compute(cls) -> Dict[int, Tuple[Decimal, Decimal, Decimal, Decimal]]:
+        """
+        Computes the totals of every cost center from the ledger and the
+        carry-forwards of archived transactions, as (own_credit, own_debit,
+        subtree_credit, subtree_debit).
+        """
+        own_credit = dict(
+            Funding.objects.values("cost_center")
+            .annotate(s=Sum("credit"))
+            .values_list("cost_center", "s")
+        )
+        own_debit = dict(
+            Purchase.objects.values("cost_center")
+            .annotate(s=Sum("total_price"))
+            .values_list("cost_center", "s")
+        )
+
+        carried = {
+            cc_id: (credit, debit)
+            for cc_id, credit, debit in CarryForward.objects.values_list(
+                "cost_center_id", "credit", "debit"
+            )
+        }
+
+        totals = {}
+        paths = list(CostCenter.objects.values_list("id", "path"))
+        for cc_id, _ in paths:
+            carried_credit, carried_debit = carried.get(cc_id, (0, 0))
+            credit = (own_credit.get(cc_id) or Decimal(0)) + carried_credit
+            debit = (own_debit.get(cc_id) or Decimal(0)) + carried_debit
+            totals[cc_id] = [credit, debit, Decimal(0), Decimal(0)]
+
+        for cc_id, path in paths:
+            for ancestor_id in path_ids(path):
+                if ancestor_id in totals:
+                    totals[ancestor_id][2] += totals[cc_id][0]
+                    totals[ancestor_id][3] += totals[cc_id][1]
+
+        return {k: tuple(v) for k, v in totals.items()}
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        Recomputes every stored balance from the ledger. Returns the number
+        of cost centers written.
+        """
+        totals = cls.compute()
+        with transaction.atomic():
+            # Versions only ever go up, so nothing cached before the rebuild
+            # can be mistaken for current.
+            version = cls.latest_version() + 1
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls(
+                    cost_center_id=cc_id,
+                    own_credit=own_credit,
+                    own_debit=own_debit,
+                    subtree_credit=subtree_credit,
+                    subtree_debit=subtree_debit,
+                    version=version,
+                )
+                for cc_id, (
+                    own_credit,
+                    own_debit,
+                    subtree_credit,
+                    subtree_debit,
+                ) in totals.items()
+            )
+        return len(totals)
+
+    @classmethod
+    def verify(cls) -> List[int]:
+        """
+        Returns the ids of cost centers whose stored balance does not match
+        the ledger.
+        """
+        totals = cls.compute()
+        stored = {
+            cc_id: tuple(rest)
+            for cc_id, *rest in cls.objects.values_list(
+                "cost_center_id",
+                "own_credit",
+                "own_debit",
+                "subtree_credit",
+                "subtree_debit",
+            )
+        }
+        return sorted(
+            cc_id
+            for cc_id in totals.keys() | stored.keys()
+            if totals.get(cc_id) != stored.get(cc_id)
+        )
+
+
+class BalanceSnapshot(models.Model):
+    """
+    The totals of a cost center as of a period close, i.e. over all
+    transactions dated before `as_of`.
+
+    Created by `manage.py close_periods`. Back-dated writes adjust the
+    snapshots after them, so they stay correct without being recomputed.
+    """
+
+    cost_center = models.ForeignKey(
+        CostCenter, on_delete=models.CASCADE, related_name="snapshots"
+    )
+    as_of = models.DateTimeField(db_index=True)
+
+    own_credit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    own_debit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    subtree_credit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    subtree_debit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    # Above this many changes at once, affected snapshots are recomputed
+    # instead of being adjusted one change at a time.
+    BULK_CHANGES = 50
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cost_center", "as_of"], name="unique_snapshot_per_period"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"Balance of {self.cost_center_id} as of {self.as_of}"
+
+    @property
+    def subtree_balance(self) -> Decimal:
+        return self.subtree_credit - self.subtree_debit
+
+    @classmethod
+    def apply_changes(cls, changes: List["LedgerChange"]):
+        """
+        Adjusts the snapshots taken after each change's date.
+        """
+        latest = cls.objects.aggregate(m=Max("as_of"))["m"]
+        changes = [c for c in changes if latest is not None and c.date < latest]
+        if not changes:
+            return
+        if len(changes) > cls.BULK_CHANGES:
+            cls.recompute(
+                cls.objects.filter(as_of__gt=min(c.date for c in changes))
+                .values_list("as_of", flat=True)
+                .distinct()
+            )
+            return
+
+        paths = dict(
+            CostCenter.objects.filter(
+                pk__in={c.cost_center_id for c in changes}
+            ).values_list("id", "path")
+        )
+        for change in changes:
+            later = cls.objects.filter(as_of__gt=change.date)
+            later.filter(cost_center_id=change.cost_center_id).update(
+                own_credit=F("own_credit") + change.credit,
+                own_debit=F("own_debit") + change.debit,
+            )
+            later.filter(
+                cost_center_id__in=path_ids(paths[change.cost_center_id])
+            ).update(
+                subtree_credit=F("subtree_credit") + change.credit,
+                subtree_debit=F("subtree_debit") + change.debit,
+            )
+
+    @classmethod
+    def move_subtree(cls, cost_center_id: int, old_path: str, new_path: str):
+        """
+        Moves the subtree totals of a reparented cost center from its old
+        ancestors' snapshots to its new ones', period by period.
+        """
+        old_ancestors = set(path_ids(old_path)) - {cost_center_id}
+        new_ancestors = set(path_ids(new_path)) - {cost_center_id}
+        node = cls.objects.filter(
+            cost_center_id=cost_center_id, as_of=OuterRef("as_of")
+        )
+
+        def node_total(field):
+            return Coalesce(
+                Subquery(node.values(field)),
+                Value(Decimal(0)),
+                output_field=DecimalField(),
+            )
+
+        cls.objects.filter(cost_center_id__in=old_ancestors - new_ancestors).update(
+            subtree_credit=F("subtree_credit") - node_total("subtree_credit"),
+            subtree_debit=F("subtree_debit") - node_total("subtree_debit"),
+        )
+        cls.objects.filter(cost_center_id__in=new_ancestors - old_ancestors).update(
+            subtree_credit=F("subtree_credit") + node_total("subtree_credit"),
+            subtree_debit=F("subtree_debit") + node_total("subtree_debit"),
+        )
+
+    @classmethod
+    def add_cost_center(cls, cost_center_id: int):
+        """
+        Gives a new cost center empty snapshots for every closed period, so
+        that every cost center has one per period.
+        """
+        cls.objects.bulk_create(
+            cls(cost_center_id=cost_center_id, as_of=as_of)
+            for as_of in cls.objects.values_list("as_of", flat=True).distinct()
+        )
+
+    @classmethod
+    def compute(
+        cls, as_ofs: Iterable[datetime], incremental: bool = True
+    ) -> Dict[Tuple[int, datetime], tuple]:
+        """
+        Computes the snapshots of every cost center at the given times from
+        the ledger, archived transactions included, as (own_credit,
+        own_debit, subtree_credit, subtree_debit).
+
+        If incremental, starts from the closest earlier stored snapshot, so
+        only the transactions since then are read.
+        """
+        as_ofs = sorted(set(as_ofs))
+        if not as_ofs:
+            return {}
+
+        start = None
+        if incremental:
+            start = cls.objects.filter(as_of__lt=as_ofs[0]).aggregate(m=Max("as_of"))[
+                "m"
+            ]
+        paths = list(CostCenter.objects.values_list("id", "path"))
+        own = {cc_id: [Decimal(0), Decimal(0)] for cc_id, _ in paths}
+        if start is not None:
+            for cc_id, credit, debit in cls.objects.filter(as_of=start).values_list(
+                "cost_center_id", "own_credit", "own_debit"
+            ):
+                own[cc_id] = [credit, debit]
+
+        result = {}
+        for as_of in as_ofs:
+            for fundings, purchases in (
+                (Funding.objects, Purchase.objects),
+                (ArchivedFunding.objects, ArchivedPurchase.objects),
+            ):
+                fundings = fundings.filter(funding_date__lt=as_of)
+                purchases = purchases.filter(purchase_date__lt=as_of)
+                if start is not None:
+                    fundings = fundings.filter(funding_date__gte=start)
+                    purchases = purchases.filter(purchase_date__gte=start)
+                for cc_id, credit in (
+                    fundings.values("cost_center")
+                    .annotate(s=Sum("credit"))
+                    .values_list("cost_center", "s")
+                ):
+                    own[cc_id][0] += credit
+                for cc_id, debit in (
+                    purchases.values("cost_center")
+                    .annotate(s=Sum("total_price"))
+                    .values_list("cost_center", "s")
+                ):
+                    own[cc_id][1] += debit
+
+            subtree = {cc_id: [Decimal(0), Decimal(0)] for cc_id, _ in paths}
+            for cc_id, path in paths:
+                for ancestor_id in path_ids(path):
+                    if ancestor_id in subtree:
+                        subtree[ancestor_id][0] += own[cc_id][0]
+                        subtree[ancestor_id][1] += own[cc_id][1]
+
+            for cc_id, _ in paths:
+                result[cc_id, as_of] = (*own[cc_id], *subtree[cc_id])
+            start = as_of
+
+        return result
+
+    @classmethod
+    def recompute(cls, as_ofs: Iterable[datetime], incremental: bool = True) -> int:
+        """
+        (Re)writes the snapshots of every cost center at the given times.
+        Returns the number of snapshots written.
+        """
+        snapshots = cls.compute(as_ofs, incremental)
+        with transaction.atomic():
+            cls.objects.filter(as_of__in={as_of for _, as_of in snapshots}).delete()
+            cls.objects.bulk_create(
+                cls(
+                    cost_center_id=cc_id,
+                    as_of=as_of,
+                    own_credit=own_credit,
+                    own_debit=own_debit,
+                    subtree_credit=subtree_credit,
+                    subtree_debit=subtree_debit,
+                )
+                for (cc_id, as_of), (
+                    own_credit,
+                    own_debit,
+                    subtree_credit,
+                    subtree_debit,
+                ) in snapshots.items()
+            )
+        return len(snapshots)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        Recomputes every stored snapshot from the ledger.
+        """
+        return cls.recompute(
+            cls.objects.values_list("as_of", flat=True).distinct(), incremental=False
+        )
+
+    @classmethod
+    def verify(cls) -> List[Tuple[int, datetime]]:
+        """
+        Returns the (cost center id, as_of) of snapshots that are missing or
+        do not match the ledger.
+        """
+        stored = {
+            (cc_id, as_of): tuple(rest)
+            for cc_id, as_of, *rest in cls.objects.values_list(
+                "cost_center_id",
+                "as_of",
+                "own_credit",
+                "own_debit",
+                "subtree_credit",
+                "subtree_debit",
+            )
+        }
+        expected = cls.compute((as_of for _, as_of in stored), incremental=False)
+
+        return sorted(
+            key
+            for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        )
+
+
+class DailySpend(models.Model):
+    """
+    The total of a cost center's own purchases on one day, so that spend
+    rates can be read without scanning purchases.
+
+    Kept up to date by apply_ledger_changes(). Days are in TIME_ZONE.
+    """
+
+    cost_center = models.ForeignKey(
+        CostCenter, on_delete=models.CASCADE, related_name="daily_spend"
+    )
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cost_center", "day"], name="unique_daily_spend"
+            )
+        ]
+        indexes = [models.Index(fields=["day", "cost_center"])]
+
+    def __str__(self) -> str:
+        return f"Spend of {self.cost_center_id} on {self.day}: {self.amount}"
+
+    @classmethod
+    def apply_changes(cls, changes: List["LedgerChange"], batch_size: int = 500):
+        """
+        Adds the debits of the given changes to their days.
+        """
+        deltas = defaultdict(Decimal)
+        for change in changes:
+            if change.debit and change.cost_center_id is not None:
+                key = (change.cost_center_id, timezone.localdate(change.date))
+                deltas[key] += change.debit
+
+        for batch in _batches(deltas.items(), batch_size):
+            # Writes hold the database lock already, so reading the current
+            # amounts and writing the sums back cannot interleave with others.
+            current = {
+                (cc_id, day): amount
+                for cc_id, day, amount in cls.objects.filter(
+                    cost_center_id__in={cc_id for (cc_id, _), _ in batch},
+                    day__in={day for (_, day), _ in batch},
+                ).values_list("cost_center_id", "day", "amount")
+            }
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        cost_center_id=cc_id,
+                        day=day,
+                        amount=current.get((cc_id, day), Decimal(0)) + delta,
+                    )
+                    for (cc_id, day), delta in batch
+                ],
+                update_conflicts=True,
+                unique_fields=["cost_center", "day"],
+                update_fields=["amount"],
+            )
+
+    @classmethod
+    def compute(cls) -> Dict[Tuple[int, date], Decimal]:
+        """
+        Computes the non-zero daily totals of every cost center from the
+        ledger.
+        """
+        totals = defaultdict(Decimal)
+        for cc_id, when, amount in Purchase.objects.values_list(
+            "cost_center_id", "purchase_date", "total_price"
+        ).iterator(chunk_size=10000):
+            totals[cc_id, timezone.localdate(when)] += amount
+        return {key: amount for key, amount in totals.items() if amount}
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        Recomputes every daily total from the ledger. Returns the number of
+        rows written.
+        """
+        totals = cls.compute()
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                (
+                    cls(cost_center_id=cc_id, day=day, amount=amount)
+                    for (cc_id, day), amount in totals.items()
+                ),
+                batch_size=10000,
+            )
+        return len(totals)
+
+    @classmethod
+    def verify(cls) -> List[Tuple[int, date]]:
+        """
+        Returns the (cost center id, day) of daily totals that are missing or
+        do not match the ledger. Stored zeros count as missing rows.
+        """
+        totals = cls.compute()
+        stored = {
+            (cc_id, day): amount
+            for cc_id, day, amount in cls.objects.exclude(amount=0).values_list(
+                "cost_center_id", "day", "amount"
+            )
+        }
+        return sorted(
+            key
+            for key in totals.keys() | stored.keys()
+            if totals.get(key) != stored.get(key)
+        )
+
+
+class Runway(NamedTuple):
+    """
+    How long a cost center's subtree can keep spending at its recent rate.
+    """
+
+    as_of: datetime
+    # Balance as of `as_of`, i.e. without the transactions dated after it.
+    balance: Decimal
+    # Transactions dated after `as_of`, e.g. scheduled fundings.
+    scheduled: Decimal
+    daily_spend: Decimal
+    # None if the balance never runs out at this rate.
+    runs_out: Optional[datetime]
+
+    @property
+    def days(self) -> Optional[int]:
+        if self.runs_out is None:
+            return None
+        return (self.runs_out - self.as_of).days
+
+    def as_dict(self) -> Dict:
+        return {
+            "as_of": self.as_of.isoformat(),
+            "balance": str(self.balance),
+            "scheduled": str(self.scheduled),
+            "daily_spend": str(self.daily_spend),
+            "runs_out": self.runs_out and self.runs_out.isoformat(),
+            "days": self.days,
+        }
+
+
+def compute_runways(
+    cost_center: Optional[CostCenter] = None,
+    window_days: Optional[int] = None,
+    now: Optional[datetime] = None,
+    loaded: Optional[Iterable[CostCenter]] = None,
+) -> Dict[int, Runway]:
+    """
+    Projects when the subtree of every cost center (or of every cost center
+    below `cost_center`) runs out of money, spending the daily average of the
+    last `window_days` days on top of the scheduled transactions.
+
+    Reads the stored balances, the daily totals of the window and the
+    transactions dated after `now`, in three queries for the whole tree.
+    The first is skipped if the cost centers are passed as `loaded`, along
+    with their balances (see build_tree()).
+    """
+    if window_days is None:
+        window_days = getattr(settings, "RUNWAY_WINDOW_DAYS", 90)
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+
+    cost_centers = CostCenter.objects.all()
+    scoped = {}
+    if cost_center is not None:
+        cost_centers = cost_centers.filter(subtree_q(cost_center.path))
+        scoped = {"cost_center__in": cost_centers}
+    if loaded is not None:
+        balances = {cc.id: (cc.path, cc.total_balance) for cc in loaded}
+    else:
+        balance = F("balance__subtree_credit") - F("balance__subtree_debit")
+        balances = {
+            cc_id: (path, amount or Decimal(0))
+            for cc_id, path, amount in cost_centers.values_list("id", "path", balance)
+        }
+    paths = {cc_id: path for cc_id, (path, _) in balances.items()}
+
+    spend = defaultdict(Decimal)
+    for cc_id, amount in (
+        DailySpend.objects.filter(
+            day__gt=today - timedelta(days=window_days), day__lte=today, **scoped
+        )
+        .values("cost_center")
+        .annotate(s=Sum("amount"))
+        .values_list("cost_center", "s")
+    ):
+        for ancestor_id in path_ids(paths[cc_id]):
+            spend[ancestor_id] += amount
+
+    scheduled = defaultdict(list)
+    for path, when, amount in (
+        LedgerEntry.objects.filter(date__gt=now, **scoped)
+        .order_by("date")
+        .values_list("path", "date", "amount")
+    ):
+        for ancestor_id in path_ids(path):
+            scheduled[ancestor_id].append((when, amount))
+
+    runways = {}
+    for cc_id in paths:
+        rate = (spend[cc_id] / window_days).quantize(CENTS)
+        events = scheduled[cc_id]
+        later = sum((amount for _, amount in events), Decimal(0))
+        balance = balances[cc_id][1] - later
+        runways[cc_id] = Runway(
+            as_of=now,
+            balance=balance,
+            scheduled=later,
+            daily_spend=rate,
+            runs_out=_runs_out(now, balance, rate, events),
+        )
+    return runways
+
+
+def _runs_out(
+    now: datetime,
+    balance: Decimal,
+    rate: Decimal,
+    events: List[Tuple[datetime, Decimal]],
+) -> Optional[datetime]:
+    """
+    When a balance that decreases by `rate` per day, and changes by the
+    amounts of the (sorted) events at their dates, first drops below zero.
+    """
+    if balance < 0:
+        return now
+
+    def exhausted(start: datetime, money: Decimal) -> Optional[datetime]:
+        if rate <= 0:
+            return None
+        return start + timedelta(days=float(money / rate))
+
+    t, money = now, balance
+    for when, amount in events:
+        spent = rate * Decimal((when - t).total_seconds()) / 86400
+        if spent > money:
+            return exhausted(t, money)
+        money += amount - spent
+        t = when
+        if money < 0:
+            return t
+    return exhausted(t, money)
+
+
+class LedgerEntry(models.Model):
+    """
+    A purchase or funding in the form the balance sheets show it, so that
+    they read a single indexed table.
+
+    Written by Purchase/Funding saves and removed by their deletion, in the
+    same transaction. Run `manage.py rebuild_ledger` to recompute from
+    scratch.
+    """
+
+    # "P" or "F" and the id of the purchase or funding, or "C" and the id of
+    # the cost center for carry-forwards.
+    source = models.CharField(max_length=24, primary_key=True)
+
+    cost_center = models.ForeignKey(
+        CostCenter, on_delete=models.CASCADE, related_name="ledger_entries"
+    )
+    # The cost center's path, kept up to date by reparenting, for subtree
+    # range scans in date order.
+    path = models.TextField()
+    date = models.DateTimeField()
+    name = models.CharField(max_length=2 * MAX_NAME_LENGTH)
+    # Positive for fundings, negative for purchases.
+    amount = models.DecimalField(max_digits=16, decimal_places=2)
+
+    class Meta:
+        indexes = [models.Index(fields=["path", "date", "source"])]
+
+    def __str__(self) -> str:
+        return f"{self.source}: {self.name}"
+
+    @staticmethod
+    def href(source: str) -> str:
+        kind = {"P": "purchases", "F": "fundings", "C": "cost-centers"}[source[0]]
+        return f"/{kind}/{source[1:]}"
+
+    @staticmethod
+    def source_of(t: Union[Purchase, Funding, CarryForward]) -> str:
+        if isinstance(t, CarryForward):
+            return f"C{t.cost_center_id}"
+        return f"{'P' if isinstance(t, Purchase) else 'F'}{t.pk}"
+
+    @classmethod
+    def build(
+        cls, transactions: Iterable[Union[Purchase, Funding, CarryForward]]
+    ) -> List["LedgerEntry"]:
+        """
+        Returns unsaved entries for the given purchases, fundings and
+        carry-forwards, looking up cost center paths and item names in bulk.
+        """
+        transactions = list(transactions)
+        paths = dict(
+            CostCenter.objects.filter(
+                pk__in={t.cost_center_id for t in transactions}
+            ).values_list("id", "path")
+        )
+        item_ids = {
+            t.item_id
+            for t in transactions
+            if isinstance(t, Purchase) and not Purchase.item.is_cached(t)
+        }
+        item_names = (
+            dict(ItemKind.objects.filter(pk__in=item_ids).values_list("id", "name"))
+            if item_ids
+            else {}
+        )
+
+        entries = []
+        for t in transactions:
+            if isinstance(t, Purchase):
+                item_name = (
+                    t.item.name if Purchase.item.is_cached(t) else item_names[t.item_id]
+                )
+                name = purchase_name(item_name, t.quantity)
+                date, amount = t.purchase_date, -to_amount(t.total_price)
+            elif isinstance(t, CarryForward):
+                name, date, amount = CarryForward.NAME, t.date, t.balance
+            else:
+                name, date, amount = t.name, t.funding_date, to_amount(t.credit)
+            entries.append(
+                cls(
+                    source=cls.source_of(t),
+                    cost_center_id=t.cost_center_id,
+                    path=paths[t.cost_center_id],
+                    date=date,
+                    name=name,
+                    amount=amount,
+                )
+            )
+        return entries
+
+    @classmethod
+    def write(cls, transactions: Iterable[Union[Purchase, Funding]]):
+        """
+        Creates or overwrites the entries and search documents of the given
+        saved purchases and fundings.
+        """
+        transactions = list(transactions)
+        cls.upsert(cls.build(transactions))
+        SearchDocument.write(transactions)
+
+    @classmethod
+    def upsert(cls, entries: List["LedgerEntry"]):
+        cls.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=["source"],
+            update_fields=["cost_center", "path", "date", "name", "amount"],
+        )
+
+    @classmethod
+    def remove(cls, transactions: Iterable[Union[Purchase, Funding]]):
+        transactions = list(transactions)
+        # Entries have no dependents or signals, so they are deleted without
+        # the deletion collector, which would load every row first.
+        entries = cls.objects.filter(pk__in=[cls.source_of(t) for t in transactions])
+        entries._raw_delete(entries.db)
+        SearchDocument.remove(transactions)
+
+    @classmethod
+    def move_subtree(cls, old_path: str, new_path: str):
+        cls.objects.filter(subtree_q(old_path)).update(
+            path=Concat(Value(new_path), Substr("path", len(old_path) + 1))
+        )
+
+    @classmethod
+    def refresh_item_kind(cls, item_kind: ItemKind):
+        """
+        Rewrites the entries of purchases of a renamed or redescribed kind.
+        """
+        purchases = Purchase.objects.filter(item=item_kind).select_related("item")
+        for batch in _batches(purchases.iterator(chunk_size=2000), 2000):
+            cls.write(batch)
+
+    @classmethod
+    def rebuild(cls, batch_size: int = 10000) -> int:
+        """
+        Recreates every entry from the purchases, fundings and
+        carry-forwards. Returns the number of entries written.
+        """
+        count = 0
+        with transaction.atomic():
+            cls.objects.all().delete()
+            for queryset in (
+                Purchase.objects.select_related("item"),
+                Funding.objects.all(),
+                CarryForward.objects.all(),
+            ):
+                for batch in _batches(
+                    queryset.iterator(chunk_size=batch_size), batch_size
+                ):
+                    cls.objects.bulk_create(cls.build(batch))
+                    count += len(batch)
+        return count
+
+    @classmethod
+    def verify(cls) -> List[int]:
+        """
+        Returns the ids of cost centers whose entries do not match their
+        purchases, fundings and carry-forward in number, total or path.
+        """
+        expected = defaultdict(lambda: [0, Decimal(0)])
+        for cc_id, n, s in (
+            Purchase.objects.values("cost_center")
+            .annotate(n=Count("id"), s=Sum("total_price"))
+            .values_list("cost_center", "n", "s")
+        ):
+            expected[cc_id][0] += n
+            expected[cc_id][1] -= s
+        for cc_id, n, s in (
+            Funding.objects.values("cost_center")
+            .annotate(n=Count("id"), s=Sum("credit"))
+            .values_list("cost_center", "n", "s")
+        ):
+            expected[cc_id][0] += n
+            expected[cc_id][1] += s
+        for cc_id, credit, debit in CarryForward.objects.values_list(
+            "cost_center_id", "credit", "debit"
+        ):
+            expected[cc_id][0] += 1
+            expected[cc_id][1] += credit - debit
+
+        stored = {
+            cc_id: [n, s]
+            for cc_id, n, s in cls.objects.values("cost_center")
+            .annotate(n=Count("source"), s=Sum("amount"))
+            .values_list("cost_center", "n", "s")
+        }
+        stale_paths = set(
+            cls.objects.exclude(path=F("cost_center__path")).values_list(
+                "cost_center_id", flat=True
+            )
+        )
+        return sorted(
+            cc_id
+            for cc_id in expected.keys() | stored.keys()
+            if expected.get(cc_id) != stored.get(cc_id) or cc_id in stale_paths
+        )
+
+
+class SearchDocument(models.Model):
+    """
+    The full-text search index of purchases and fundings: an SQLite FTS5
+    table, created by migration 0017 rather than by Django.
+
+    The rowid is derived from the transaction, see rowid_of(), so documents
+    can be replaced without looking them up. They are written and removed
+    together with the ledger entries. Run `manage.py rebuild_search` to
+    recreate them.
+    """
+
+    rowid = models.BigIntegerField(primary_key=True)
+    # LedgerEntry.source, to join with the entries for filters and display.
+    source = models.CharField(max_length=24)
+    # Item kind or funding name, weighted higher than the rest.
+    title = models.TextField()
+    # Comments, item descriptions and suppliers.
+    body = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = "erp_search"
+
+    # bm25() weights of the source, title and body columns.
+    WEIGHTS = (0.0, 10.0, 1.0)
+
+    @staticmethod
+    def rowid_of(t: Union[Purchase, Funding]) -> int:
+        return 2 * t.pk + isinstance(t, Funding)
+
+    @classmethod
+    def build(
+        cls, transactions: Iterable[Union[Purchase, Funding]]
+    ) -> List["SearchDocument"]:
+        transactions = list(transactions)
+        item_ids = {
+            t.item_id
+            for t in transactions
+            if isinstance(t, Purchase) and not Purchase.item.is_cached(t)
+        }
+        items = (
+            {i.id: i for i in ItemKind.objects.filter(pk__in=item_ids)}
+            if item_ids
+            else {}
+        )
+
+        documents = []
+        for t in transactions:
+            if isinstance(t, Purchase):
+                item = t.item if Purchase.item.is_cached(t) else items[t.item_id]
+                title = item.name
+                body = "\n".join([t.comment, item.description, t.supplier])
+            else:
+                title, body = t.name, t.comment
+            documents.append(
+                cls(
+                    rowid=cls.rowid_of(t),
+                    source=LedgerEntry.source_of(t),
+                    title=title,
+                    body=body,
+                )
+            )
+        return documents
+
+    @classmethod
+    def write(cls, transactions: Iterable[Union[Purchase, Funding]]):
+        """
+        Creates or replaces the documents of the given saved purchases and
+        fundings.
+        """
+        transactions = list(transactions)
+        cls.remove(transactions)
+        cls.objects.bulk_create(cls.build(transactions))
+
+    @classmethod
+    def remove(cls, transactions: Iterable[Union[Purchase, Funding]]):
+        documents = cls.objects.filter(pk__in=[cls.rowid_of(t) for t in transactions])
+        documents._raw_delete(documents.db)
+
+    @classmethod
+    def rebuild(cls, batch_size: int = 10000) -> int:
+        """
+        Recreates every document from the purchases and fundings. Returns the
+        number of documents written.
+        """
+        count = 0
+        with transaction.atomic():
+            cls.objects.all().delete()
+            for queryset in (
+                Purchase.objects.select_related("item"),
+                Funding.objects.all(),
+            ):
+                for batch in _batches(
+                    queryset.iterator(chunk_size=batch_size), batch_size
+                ):
+                    cls.objects.bulk_create(cls.build(batch))
+                    count += len(batch)
+        return count
+
+    @classmethod
+    def verify(cls) -> List[str]:
+        """
+        Returns the sources of purchases and fundings that are missing from
+        the index or indexed but gone.
+        """
+        expected = {
+            2 * id: f"P{id}" for id in Purchase.objects.values_list("id", flat=True)
+        }
+        expected.update(
+            (2 * id + 1, f"F{id}")
+            for id in Funding.objects.values_list("id", flat=True)
+        )
+        stored = dict(cls.objects.values_list("rowid", "source"))
+        return sorted(
+            expected.get(rowid) or stored[rowid]
+            for rowid in expected.keys() ^ stored.keys()
+        )
+
+    @classmethod
+    def search(
+        cls,
+        text: str,
+        cost_center: Optional[CostCenter] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 50,
+    ):
+        """
+        Returns the best matches for `text` as ledger entries, best first,
+        restricted to a cost center subtree and a [start, end) date range.
+        Each entry also has the `cost_center_name` and bm25 `rank` (lower is
+        better) attributes.
+
+        Every word must match, the last one as a prefix, so that the query
+        works while typing. Quoting the words keeps FTS5 query syntax in the
+        user's text from being interpreted.
+        """
+        words = re.findall(r"\w+", text)
+        if not words:
+            return LedgerEntry.objects.none()
+        query = " ".join(f'"{word}"' for word in words) + "*"
+
+        conditions = ["erp_search MATCH %s"]
+        params = [query]
+        if cost_center is not None:
+            conditions.append("f.path >= %s AND f.path < %s")
+            params += [cost_center.path, f"{cost_center.path}0"]
+        if start is not None:
+            conditions.append("f.date >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("f.date < %s")
+            params.append(end)
+
+        # The filters are applied before the limit, so that only the best
+        # matches are joined with the cost centers and read in full.
+        filters_join = (
+            "JOIN erp_ledgerentry f ON f.source = erp_search.source"
+            if len(conditions) > 1
+            else ""
+        )
+        weights = ", ".join(map(str, cls.WEIGHTS))
+        return LedgerEntry.objects.raw(
+            f"""
+            SELECT e.*, c.name AS cost_center_name, m.rank
+            FROM (
+                SELECT erp_search.source, bm25(erp_search, {weights}) AS rank
+                FROM erp_search
+                {filters_join}
+                WHERE {" AND ".join(conditions)}
+                ORDER BY rank
+                LIMIT %s
+            ) m
+            JOIN erp_ledgerentry e ON e.source = m.source
+            JOIN erp_costcenter c ON c.id = e.cost_center_id
+            ORDER BY m.rank
+            """,
+            [*params, limit],
+        )
+
+
+def purchase_name(item_name: str, quantity: Decimal) -> str:
+    """
+    The name of a purchase on balance sheets, e.g. "Beaker x2.5".
+    """
+    return f"{item_name} x{Decimal(quantity).normalize():f}"
+
+
+def _batches(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class LedgerChange(NamedTuple):
+    """
+    A change to one cost center's ledger, as seen by the tables derived
+    from it.
+    """
+
+    cost_center_id: int
+    date: datetime
+    credit: Decimal
+    debit: Decimal
+
+    def negated(self) -> "LedgerChange":
+        return self._replace(credit=-self.credit, debit=-self.debit)
+
+
+def apply_ledger_changes(changes: List[LedgerChange]):
+    """
+    Brings every table derived from the ledger up to date with the given
+    changes. Call it in the same transaction as the writes themselves.
+    """
+    deltas = defaultdict(lambda: (Decimal(0), Decimal(0)))
+    for change in changes:
+        credit, debit = deltas[change.cost_center_id]
+        deltas[change.cost_center_id] = (credit + change.credit, debit + change.debit)
+
+    CostCenterBalance.apply_deltas(deltas)
+    BalanceSnapshot.apply_changes(changes)
+    DailySpend.apply_changes(changes)
+
+
+def apply_reparent(cost_center_id: int, old_path: str, new_path: str):
+    """
+    Brings every table derived from the hierarchy up to date after a cost
+    center moved from `old_path` to `new_path`.
+    """
+    CostCenterClosure.move_subtree(cost_center_id, old_path, new_path)
+    CostCenterBalance.move_subtree(cost_center_id, old_path, new_path)
+    # The breadcrumbs of the whole subtree change.
+    CostCenterBalance.touch_subtree(new_path)
+    BalanceSnapshot.move_subtree(cost_center_id, old_path, new_path)
+    LedgerEntry.move_subtree(old_path, new_path)
+
+
+@retry_on_locked
+def create_transactions(
+    model: type[Union[Purchase, Funding]], objects: List[Union[Purchase, Funding]]
+) -> List[Union[Purchase, Funding]]:
+    """
+    Inserts new purchases or fundings with one bulk INSERT and brings the
+    derived tables up to date once for the whole batch, all in one
+    transaction. Amounts must already be rounded (see to_amount()).
+    """
+    with transaction.atomic():
+        objects = model.objects.bulk_create(objects)
+        apply_ledger_changes([o.ledger_change() for o in objects])
+        LedgerEntry.write(objects)
+    return objects
+
+
+@retry_on_locked
+def _daily_ledger_changes(queryset: QuerySet) -> Tuple[List[LedgerChange], int]:
+    """
+    Returns the ledger changes adding the purchases or fundings of
+    `queryset`, one per cost center and day, and their number. Only reads
+    the totals, never the transactions themselves.
+    """
+    is_purchase = queryset.model is Purchase
+    date_field = "purchase_date" if is_purchase else "funding_date"
+    # Snapshots are taken at midnight (see close_periods), so all transactions
+    # of a day are on the same side of each of them, as they are for
+    # DailySpend.
+    days = (
+        queryset.values("cost_center", day=TruncDate(date_field))
+        .annotate(
+            first=Min(date_field),
+            total=Sum("total_price" if is_purchase else "credit"),
+            count=Count("pk"),
+        )
+        .order_by()
+    )
+    changes = []
+    count = 0
+    for day in days:
+        credit, debit = Decimal(0), day["total"]
+        if not is_purchase:
+            credit, debit = debit, credit
+        changes.append(LedgerChange(day["cost_center"], day["first"], credit, debit))
+        count += day["count"]
+    return changes, count
+
+
+def _ledger_entries_of(queryset: QuerySet) -> QuerySet:
+    """
+    Returns the ledger entries of the purchases or fundings of `queryset`,
+    selected through a subquery.
+    """
+    prefix = "P" if queryset.model is Purchase else "F"
+    sources = queryset.annotate(
+        source=Concat(
+            Value(prefix),
+            Cast("pk", models.CharField()),
+            output_field=models.CharField(),
+        )
+    ).values("source")
+    return LedgerEntry.objects.filter(pk__in=sources)
+
+
+def reassign_transactions(queryset: QuerySet, cost_center: CostCenter) -> int:
+    """
+    Moves the purchases or fundings of `queryset` to another cost center with
+    one UPDATE, and brings the derived tables up to date from their totals per
+    cost center and day, without loading the transactions themselves.
+    Returns the number of transactions moved.
+    """
+    queryset = queryset.exclude(cost_center=cost_center)
+    with transaction.atomic():
+        changes, count = _daily_ledger_changes(queryset)
+        if not count:
+            return 0
+        # Before the transactions move, while `queryset` still selects them.
+        _ledger_entries_of(queryset).update(
+            cost_center=cost_center, path=cost_center.path
+        )
+        queryset.update(cost_center=cost_center, last_update_date=timezone.now())
+        apply_ledger_changes(
+            [c.negated() for c in changes]
+            + [c._replace(cost_center_id=cost_center.id) for c in changes]
+        )
+    return count
+
+
+def delete_transactions(queryset: QuerySet) -> int:
+    """
+    Deletes the purchases or fundings of `queryset` and their ledger entries
+    and search documents with one DELETE each, and brings the derived tables
+    up to date from their totals per cost center and day. Unlike
+    QuerySet.delete(), which goes through the deletion collector and the
+    signals one row at a time. Returns the number of transactions deleted.
+    """
+    is_purchase = queryset.model is Purchase
+    queryset = queryset.order_by()
+    with transaction.atomic():
+        changes, count = _daily_ledger_changes(queryset)
+        if not count:
+            return 0
+        # Nothing else refers to transactions or to their derived rows, so
+        # they are deleted without the collector. Dependents first, while
+        # `queryset` still selects the transactions.
+        entries = _ledger_entries_of(queryset)
+        entries._raw_delete(entries.db)
+        rowids = queryset.annotate(rowid=F("pk") * 2 + int(not is_purchase))
+        documents = SearchDocument.objects.filter(pk__in=rowids.values("rowid"))
+        documents._raw_delete(documents.db)
+        queryset._raw_delete(queryset.db)
+        apply_ledger_changes([c.negated() for c in changes])
+    return count
+
+
+def archive_transactions(cutoff: datetime, batch_size: int = 2000) -> Dict[str, int]:
+    """
+    Moves the purchases and fundings dated before `cutoff` into the archive
+    tables, `batch_size` at a time, and carries their totals forward (see
+    CarryForward). Returns the number of rows moved per model.
+
+    Stored balances stay as they are. Archiving closes a period at the
+    cutoff first, so balances as of later dates never read the archive.
+    """
+    if not BalanceSnapshot.objects.filter(as_of=cutoff).exists():
+        BalanceSnapshot.recompute([cutoff])
+
+    counts = {}
+    for model, archive, date_field in (
+        (Purchase, ArchivedPurchase, "purchase_date"),
+        (Funding, ArchivedFunding, "funding_date"),
+    ):
+        old = model.objects.filter(**{f"{date_field}__lt": cutoff}).order_by(
+            date_field, "id"
+        )
+        count = 0
+        while batch := list(old[:batch_size]):
+            _archive_batch(model, archive, batch, cutoff)
+            count += len(batch)
+        counts[model._meta.verbose_name_plural] = count
+    return counts
+
+
+@retry_on_locked
+def _archive_batch(
+    model: type[Union[Purchase, Funding]],
+    archive: type[Union[ArchivedPurchase, ArchivedFunding]],
+    batch: List[Union[Purchase, Funding]],
+    cutoff: datetime,
+):
+    fields = [f.attname for f in model._meta.concrete_fields]
+    changes = [t.ledger_change() for t in batch]
+    with transaction.atomic():
+        archive.objects.bulk_create(
+            archive(**{name: getattr(t, name) for name in fields}) for t in batch
+        )
+        # Not delete(), whose signals would take the amounts out of the
+        # balances, where they are carried forward instead.
+        archived = model.objects.filter(pk__in=[t.pk for t in batch])
+        archived._raw_delete(archived.db)
+        LedgerEntry.remove(batch)
+        CarryForward.add(changes, cutoff)
+
+        DailySpend.apply_changes([c.negated() for c in changes])
+        emptied = DailySpend.objects.filter(
+            cost_center_id__in={c.cost_center_id for c in changes}, amount=0
         )
+        emptied._raw_delete(emptied.db)
 
-        return purchases.union(fundings)
+        paths = CostCenter.objects.filter(
+            pk__in={c.cost_center_id for c in changes}
+        ).values_list("path", flat=True)
+        CostCenterBalance.touch({i for path in paths for i in path_ids(path)})
 
 
 class TransactionRow(NamedTuple):
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caching import bump_item_kind_version
+from .models import (
+    CostCenter,
+    CostCenterBalance,
+    Funding,
+    ItemKind,
+    LedgerEntry,
+    Purchase,
+    apply_ledger_changes,
+    path_ids,
+)
+
+# Deletions go through signals rather than Model.delete() so that bulk
+# QuerySet.delete() calls (e.g. from the admin) are covered too. The deletion
+# collector sends these inside its own transaction.
+
+
+@receiver(post_delete, sender=Purchase)
+def purchase_deleted(sender, instance: Purchase, **kwargs):
+    apply_ledger_changes([instance.ledger_change().negated()])
+    LedgerEntry.remove([instance])
+
+
+@receiver(post_delete, sender=Funding)
+def funding_deleted(sender, instance: Funding, **kwargs):
+    apply_ledger_changes([instance.ledger_change().negated()])
+    LedgerEntry.remove([instance])
+
+
+@receiver(pre_delete, sender=CostCenter)
+def cost_center_deleting(sender, instance: CostCenter, **kwargs):
+    # The children become roots. Moving them explicitly, rather than leaving
+    # it to SET_NULL, keeps their paths and everything derived from them
+    # consistent.
+    for child in instance.children.all():
+        child.parent = None
+        child.save()
+
+
+@receiver(post_delete, sender=CostCenter)
+def cost_center_deleted(sender, instance: CostCenter, **kwargs):
+    # It no longer shows up among the children of its ancestors.
+    CostCenterBalance.touch(path_ids(instance.path))
+
+
+# The item kind version is raised only once the change is committed, so that
+# no process can remember the old id under the new version.
+
+
+@receiver(post_save, sender=ItemKind)
+def item_kind_saved(sender, instance: ItemKind, created: bool, **kwargs):
+    if not created:
+        transaction.on_commit(bump_item_kind_version)
+
+
+@receiver(post_delete, sender=ItemKind)
+def item_kind_deleted(sender, instance: ItemKind, **kwargs):
+    transaction.on_commit(bump_item_kind_version)
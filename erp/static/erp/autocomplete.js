@@ -0,0 +1,29 @@
+// Fills the datalist of inputs with a data-autocomplete URL with prefix
+// matches from that URL as the user types.
+document.querySelectorAll("input[data-autocomplete]").forEach((input) => {
+    const datalist = document.getElementById(input.getAttribute("list"));
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener("input", () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            const url = `${input.dataset.autocomplete}?q=${encodeURIComponent(input.value)}`;
+            try {
+                const response = await fetch(url, { signal: controller.signal });
+                const { results } = await response.json();
+                datalist.replaceChildren(
+                    ...results.map(({ name }) => new Option(name))
+                );
+            } catch (e) {
+                if (e.name !== "AbortError") {
+                    throw e;
+                }
+            }
+        }, 150);
+    });
+});
@@ -1,6 +1,60 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+import json
+from io import StringIO
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
 
-from erp.models import CostCenter
+from django.contrib.admin import site
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, resolve
+
+from erp.caching import (
+    get_cache,
+    get_stats,
+    item_kind_ids,
+    item_kind_version,
+    LRUCache,
+    local_stats,
+    resolve_item_kind,
+)
+from erp.admin import EstimatedCountPaginator, ItemKindAdmin
+from erp.analytics import Ledger
+from erp.db import retry_on_locked
+from erp.benchmarks import (
+    URLS,
+    benchmark_operations,
+    benchmark_throughput,
+    benchmark_urls,
+)
+from erp.views import LedgerListView
+from erp.models import (
+    ArchivedFunding,
+    ArchivedPurchase,
+    BalanceSnapshot,
+    CarryForward,
+    CostCenter,
+    CostCenterBalance,
+    CostCenterClosure,
+    DailySpend,
+    Funding,
+    ItemKind,
+    LedgerEntry,
+    MAX_NAME_LENGTH,
+    Purchase,
+    SearchDocument,
+    apply_ledger_changes,
+    compute_runways,
+    reassign_transactions,
+)
+from scripts.generate_transactions import generate
 
 
 class CostCenterPaths(TestCase):
@@ -80,3 +134,1798 @@ class CostCenterPaths(TestCase):
             CostCenter.objects.get(id=cc3.id).path,
             f"/{cc4.id}/{cc5.id}/{cc2.id}/{cc3.id}",
         )
+
+    def test_reparent_to_root(self):
+        cc1 = CostCenter.objects.create(name="Slush Fund", description="Gay")
+        cc2 = CostCenter.objects.create(
+            name="Engineering", description="Gay", parent=cc1
+        )
+        cc3 = CostCenter.objects.create(name="Chemistry", description="Gay", parent=cc2)
+
+        cc2.parent = None
+        cc2.save()
+
+        self.assertEqual(CostCenter.objects.get(id=cc2.id).path, f"/{cc2.id}")
+        self.assertEqual(CostCenter.objects.get(id=cc3.id).path, f"/{cc2.id}/{cc3.id}")
+
+    def test_reparent_below_descendant_is_rejected(self):
+        cc1 = CostCenter.objects.create(name="Slush Fund", description="Gay")
+        cc2 = CostCenter.objects.create(
+            name="Engineering", description="Gay", parent=cc1
+        )
+
+        cc1.parent = cc2
+        with self.assertRaises(ValidationError):
+            cc1.clean()
+        with self.assertRaises(ValueError):
+            cc1.save()
+        self.assertEqual(CostCenter.objects.get(id=cc1.id).path, f"/{cc1.id}")
+
+    def test_subtree_size_does_not_affect_query_count(self):
+        def make_chain(length):
+            top = parent = CostCenter.objects.create(name="Top", description="Gay")
+            for _ in range(length):
+                parent = CostCenter.objects.create(
+                    name="Node", description="Gay", parent=parent
+                )
+            return top
+
+        target = CostCenter.objects.create(name="Target", description="Gay")
+        counts = []
+        for length in [1, 20]:
+            top = make_chain(length)
+            with CaptureQueriesContext(connection) as rename:
+                top.name = "Renamed"
+                top.save()
+            with CaptureQueriesContext(connection) as reparent:
+                top.parent = target
+                top.save()
+            counts.append((len(rename), len(reparent)))
+
+        self.assertEqual(counts[0], counts[1])
+        # Renaming only writes the node itself, not its subtree.
+        self.assertEqual(
+            sum(q["sql"].startswith('UPDATE "erp_costcenter"') for q in rename), 1
+        )
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class LedgerTestCase(TestCase):
+    """
+    Creates the "Slush Fund" root with "Engineering" below it, the separate
+    "Finance" root and a "Beaker" item kind, with helpers to record
+    transactions against them.
+    """
+
+    def setUp(self):
+        self.root = CostCenter.objects.create(name="Slush Fund", description="Gay")
+        self.eng = CostCenter.objects.create(
+            name="Engineering", description="Gay", parent=self.root
+        )
+        self.finance = CostCenter.objects.create(name="Finance", description="Gay")
+        self.item = ItemKind.objects.create(name="Beaker", description="Glass")
+
+    def purchase(self, cost_center, price, date=utc(2023, 1, 1), **fields):
+        return Purchase.objects.create(
+            purchase_date=date,
+            total_price=price,
+            cost_center=cost_center,
+            **{"item": self.item, "quantity": 1, **fields},
+        )
+
+    def fund(self, cost_center, credit, date=utc(2023, 1, 1), **fields):
+        return Funding.objects.create(
+            funding_date=date,
+            credit=credit,
+            cost_center=cost_center,
+            **{"name": "Grant", **fields},
+        )
+
+
+class CostCenterHierarchy(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chem = CostCenter.objects.create(
+            name="Chemistry", description="Gay", parent=self.eng
+        )
+
+    def closure(self):
+        return set(
+            CostCenterClosure.objects.values_list(
+                "ancestor_id", "descendant_id", "depth"
+            )
+        )
+
+    def assertClosureConsistent(self):
+        stored = self.closure()
+        CostCenterClosure.rebuild()
+        self.assertEqual(stored, self.closure())
+
+    def test_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.chem.ancestors()), [self.root, self.eng])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.chem.nav_path(), [self.root, self.eng, self.chem])
+        self.assertEqual(list(self.root.descendants()), [self.eng, self.chem])
+        self.assertEqual(list(self.root.descendants(max_depth=1)), [self.eng])
+        self.assertEqual(self.chem.depth, 2)
+        self.assertEqual(list(self.chem.iter_upwards())[1:], [self.eng, self.root])
+
+    def test_reparent(self):
+        self.eng.parent = self.finance
+        self.eng.save()
+        self.assertEqual(list(self.chem.ancestors()), [self.finance, self.eng])
+        self.assertEqual(list(self.root.descendants()), [])
+        self.assertClosureConsistent()
+
+        self.eng.parent = None
+        self.eng.save()
+        self.assertEqual(self.chem.depth, 1)
+        self.assertClosureConsistent()
+
+    def test_delete_makes_children_roots(self):
+        self.eng.delete()
+        self.chem.refresh_from_db()
+        self.assertEqual(self.chem.path, f"/{self.chem.id}")
+        self.assertEqual(list(self.chem.ancestors()), [])
+        self.assertClosureConsistent()
+
+    def test_depth_is_unlimited(self):
+        node = self.root
+        for _ in range(50):
+            node = CostCenter.objects.create(
+                name="Node", description="Gay", parent=node
+            )
+        node.full_clean()
+        self.assertGreater(len(node.path), 128)
+        self.assertEqual(node.depth, 50)
+        self.assertEqual(node.ancestors().first(), self.root)
+
+
+class CostCenterBalances(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chem = CostCenter.objects.create(
+            name="Chemistry", description="Gay", parent=self.eng
+        )
+
+    def balance(self, cost_center):
+        return CostCenter.objects.get(id=cost_center.id).total_balance
+
+    def test_writes_update_subtree_balances(self):
+        self.fund(self.root, 100)
+        self.fund(self.chem, 50)
+        p = self.purchase(self.chem, "12.50")
+
+        self.assertEqual(self.balance(self.root), Decimal("137.50"))
+        self.assertEqual(self.balance(self.eng), Decimal("37.50"))
+        self.assertEqual(self.balance(self.chem), Decimal("37.50"))
+
+        p.cost_center = self.finance
+        p.total_price = 20
+        p.save()
+
+        self.assertEqual(self.balance(self.root), Decimal("150.00"))
+        self.assertEqual(self.balance(self.chem), Decimal("50.00"))
+        self.assertEqual(self.balance(self.finance), Decimal("-20.00"))
+
+        p.delete()
+        Funding.objects.filter(cost_center=self.chem).delete()
+
+        self.assertEqual(self.balance(self.root), Decimal("100.00"))
+        self.assertEqual(self.balance(self.eng), Decimal("0.00"))
+        self.assertEqual(self.balance(self.finance), Decimal("0.00"))
+        self.assertEqual(CostCenterBalance.verify(), [])
+
+    def test_reparent_moves_subtree_balance(self):
+        self.fund(self.chem, 50)
+        self.purchase(self.eng, 10)
+
+        self.eng.parent = self.finance
+        self.eng.save()
+
+        self.assertEqual(self.balance(self.root), Decimal("0.00"))
+        self.assertEqual(self.balance(self.finance), Decimal("40.00"))
+        self.assertEqual(self.balance(self.eng), Decimal("40.00"))
+        self.assertEqual(CostCenterBalance.verify(), [])
+
+    def test_rebuild_repairs_drift(self):
+        self.fund(self.chem, 50)
+        CostCenterBalance.objects.filter(pk=self.root.pk).update(subtree_credit=0)
+        self.assertEqual(CostCenterBalance.verify(), [self.root.id])
+
+        call_command("rebuild_balances", stdout=StringIO())
+
+        self.assertEqual(CostCenterBalance.verify(), [])
+        self.assertEqual(self.balance(self.root), Decimal("50.00"))
+
+
+class CostCenterTree(TestCase):
+    def test_tree_is_assembled_from_one_query(self):
+        cc1 = CostCenter.objects.create(name="Slush Fund", description="Gay")
+        cc2 = CostCenter.objects.create(
+            name="Engineering", description="Gay", parent=cc1
+        )
+        cc3 = CostCenter.objects.create(name="Chemistry", description="Gay", parent=cc2)
+        cc4 = CostCenter.objects.create(name="Finance", description="Gay")
+
+        with self.assertNumQueries(1):
+            roots = CostCenter.build_tree()
+
+        self.assertEqual([n.cost_center for n in roots], [cc1, cc4])
+        self.assertEqual([n.cost_center for n in roots[0].children], [cc2])
+        self.assertEqual([n.cost_center for n in roots[0].children[0].children], [cc3])
+
+    def test_tree_page_query_count_does_not_grow(self):
+        parent = None
+        for i in range(10):
+            parent = CostCenter.objects.create(
+                name=f"Level {i}", description="Gay", parent=parent
+            )
+            CostCenter.objects.create(
+                name=f"Leaf {i}", description="Gay", parent=parent
+            )
+
+        # The tree with balances, plus daily spend and scheduled transactions
+        # for the runways.
+        with self.assertNumQueries(3):
+            response = self.client.get("/cost-centers")
+        self.assertContains(response, "Leaf 9")
+
+
+class BalanceSheetPagination(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        for day in range(1, 8):
+            self.purchase(self.eng, day, utc(2023, 8, day))
+        # Shares its date with a purchase, so the t_id tie-breaker matters.
+        self.fund(self.root, 100, utc(2023, 8, 3))
+
+    def test_pages_cover_all_rows_with_running_balance(self):
+        rows = []
+        page = self.root.balance_sheet_page(3)
+        self.assertIsNone(page.previous_key)
+        while True:
+            rows += page.rows
+            if page.next_key is None:
+                break
+            page = self.root.balance_sheet_page(3, after=page.next_key)
+
+        self.assertEqual(
+            [r["t_id"] for r in rows],
+            [
+                r["t_id"]
+                for r in self.root.query_balance_sheet().order_by("t_date", "t_id")
+            ],
+        )
+        self.assertEqual(
+            [r["t_balance"] for r in rows],
+            [-1, -3, 97, 94, 90, 85, 79, 72],
+        )
+
+        back = self.root.balance_sheet_page(3, before=page.previous_key)
+        self.assertEqual(back.rows, rows[3:6])
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        for week in range(52):
+            self.purchase(self.eng, 1, utc(2022, 1, 3) + timedelta(weeks=week))
+        rows = list(self.root.query_balance_sheet().order_by("t_date", "t_id"))
+        last = (rows[-1]["t_date"], rows[-1]["t_id"])
+
+        # Without snapshots, the last page starts from the stored balance.
+        _, sign, entries = self.root._opening_balance_terms(last)
+        self.assertEqual((sign, entries.count()), (-1, 1))
+
+        # With them, every page sums at most the rows of half a period.
+        call_command("close_periods", "--until=2023-07-31", stdout=StringIO())
+        balance = Decimal(0)
+        for row in rows:
+            key = (row["t_date"], row["t_id"])
+            with self.subTest(key=key):
+                _, _, entries = self.root._opening_balance_terms(key)
+                self.assertLessEqual(entries.count(), 4)
+                self.assertEqual(self.root.opening_balance(key), balance)
+            balance += row["t_price"]
+
+    def test_detail_view_follows_cursor(self):
+        page = self.root.balance_sheet_page(2)
+        response = self.client.get(
+            f"/cost-centers/{self.root.id}",
+            {"after": f"{page.next_key[0].isoformat()},{page.next_key[1]}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["transactions"][0]["t_balance"], 97)
+
+        response = self.client.get(f"/cost-centers/{self.root.id}", {"after": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class Exports(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in range(1, 5):
+            self.purchase(self.eng, day, utc(2023, 8, day, 12), quantity=2)
+        self.fund(self.root, 100, utc(2023, 8, 2))
+
+    def test_balance_sheet_csv_respects_date_range(self):
+        response = self.client.get(
+            f"/cost-centers/{self.root.id}/export",
+            {"format": "csv", "start": "2023-08-02", "end": "2023-08-03"},
+        )
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0], "t_id,t_date,t_name,t_cost_center,t_cost_center_id,t_price"
+        )
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["F1", "P2", "P3"])
+
+    def test_purchases_ndjson_gzipped(self):
+        response = self.client.get(
+            "/purchases/export",
+            {"format": "ndjson", "start": "2023-08-04"},
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        rows = [
+            json.loads(line)
+            for line in gzip.decompress(
+                b"".join(response.streaming_content)
+            ).splitlines()
+        ]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["item_name"], "Beaker")
+        self.assertEqual(rows[0]["total_price"], "4.00")
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.client.get("/fundings/export").status_code, 400)
+        response = self.client.get(
+            "/fundings/export",
+            {"format": "csv", "start": "2023-09-01", "end": "2023-08-01"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportTransactions(LedgerTestCase):
+    def import_file(self, kind, suffix, content, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_transactions", kind, f.name, *args, stdout=stdout, stderr=stderr
+        )
+        return stderr.getvalue()
+
+    def test_import_purchases_csv(self):
+        errors = self.import_file(
+            "purchases",
+            ".csv",
+            "purchase_date,item,quantity,total_price,cost_center,supplier\n"
+            f"2023-08-01 10:00,Beaker,2,10.50,{self.eng.id},\n"
+            f"2023-08-02,Flask,1,4,{self.eng.path},https://example.com\n"
+            f"2023-08-03,Flask,1,4,{self.eng.path},\n"
+            f"2023-08-04,Flask,1,abc,{self.eng.id},\n"
+            "2023-08-05,Flask,1,3,/999,\n",
+            "--batch-size=2",
+        )
+
+        self.assertEqual(Purchase.objects.count(), 3)
+        self.assertEqual(ItemKind.objects.filter(name="Flask").count(), 1)
+        self.assertEqual(
+            Purchase.objects.filter(item=self.item).get().total_price,
+            Decimal("10.50"),
+        )
+        self.assertIn("Line 5: total_price", errors)
+        self.assertIn("Line 6: cost_center", errors)
+        self.assertEqual(
+            CostCenter.objects.get(id=self.root.id).total_balance, Decimal("-18.50")
+        )
+        self.assertEqual(CostCenterBalance.verify(), [])
+
+    def test_import_fundings_jsonl(self):
+        errors = self.import_file(
+            "fundings",
+            ".jsonl",
+            json.dumps(
+                {
+                    "name": "Grant",
+                    "funding_date": "2023-08-01T00:00:00+00:00",
+                    "credit": 100,
+                    "cost_center": self.eng.id,
+                }
+            )
+            + "\nnot json\n"
+            + json.dumps({"name": "Grant", "cost_center": self.eng.id})
+            + "\n",
+        )
+
+        self.assertEqual(Funding.objects.get().credit, Decimal("100.00"))
+        self.assertIn("Line 2: invalid JSON", errors)
+        self.assertIn("Line 3: funding_date", errors)
+        self.assertEqual(
+            CostCenter.objects.get(id=self.root.id).total_balance, Decimal("100.00")
+        )
+
+
+class GenerateTransactions(TestCase):
+    def test_same_seed_generates_same_dataset(self):
+        def snapshot():
+            return list(
+                Purchase.objects.order_by("id").values_list(
+                    "purchase_date", "item__name", "total_price", "cost_center__name"
+                )
+            )
+
+        counts = generate(log=lambda _: None, seed=3, purchases=40, depth=2, fan_out=2)
+        first = snapshot()
+        Purchase.objects.all().delete()
+        Funding.objects.all().delete()
+        generate(log=lambda _: None, seed=3, purchases=40, depth=2, fan_out=2)
+
+        self.assertEqual(counts["cost_centers"], 7)
+        self.assertEqual(snapshot(), first)
+        self.assertEqual(CostCenterBalance.verify(), [])
+
+
+class QueryCounts(TestCase):
+    def test_every_url_is_benchmarked(self):
+        ids = {"cost_center": 1, "purchase": 1, "funding": 1}
+        benchmarked = {
+            resolve(url.format(**ids).split("?")[0]).route for _, url in URLS
+        }
+        for pattern in get_resolver().url_patterns:
+            route = str(pattern.pattern)
+            if isinstance(pattern, URLPattern) and not route.startswith("^"):
+                self.assertIn(route, benchmarked)
+
+    def test_query_counts_do_not_grow_with_data(self):
+        generate(log=lambda _: None, seed=1, purchases=20, fundings=5, fan_out=2)
+        small = benchmark_urls()
+        small.update(benchmark_operations())
+        generate(log=lambda _: None, seed=2, purchases=200, fundings=50, fan_out=2)
+        large = benchmark_urls()
+        large.update(benchmark_operations())
+
+        for name in small:
+            with self.subTest(name):
+                self.assertEqual(small[name]["queries"], large[name]["queries"])
+
+    def test_throughput_benchmark(self):
+        generate(log=lambda _: None, seed=1, purchases=20, fundings=5, fan_out=2)
+        results = benchmark_throughput(concurrency=2, requests=4)
+        self.assertEqual(
+            set(results), {"purchase_html", "purchase_api", "transactions_api"}
+        )
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual(result["statuses"], [200])
+                self.assertGreater(result["requests_per_second"], 0)
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+class RequestTimingMiddlewareTests(TestCase):
+    def test_server_timing_header(self):
+        CostCenter.objects.create(name="Slush Fund", description="Gay")
+        self.assertNotIn("Server-Timing", self.client.get("/cost-centers"))
+
+        user = get_user_model().objects.create_user("staff", is_staff=True)
+        self.client.force_login(user)
+        response = self.client.get("/cost-centers")
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="3 queries", tpl;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        with override_settings(DEBUG=True):
+            self.client.logout()
+            self.assertIn("Server-Timing", self.client.get("/cost-centers"))
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs("erp.timing") as logs:
+            response = self.client.get("/")
+        self.assertNotIn("Server-Timing", response)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["path"], "/")
+        self.assertEqual(line["queries"], 1)
+        self.assertIn("erp_costcenter", line["slowest"][0]["sql"])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_instrumented(self):
+        self.assertNotIn("Server-Timing", self.client.get("/"))
+
+
+class LedgerLists(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        flask = ItemKind.objects.create(name="Flask", description="Glass")
+        for day in range(1, 8):
+            self.purchase(
+                self.eng if day < 6 else self.finance,
+                day,
+                utc(2023, 8, day),
+                item=self.item if day % 2 else flask,
+            )
+
+    def test_pages_follow_cursor_newest_first(self):
+        LedgerListView.page_size = 3
+        self.addCleanup(setattr, LedgerListView, "page_size", 100)
+
+        seen = []
+        url = "/purchases"
+        while url:
+            response = self.client.get(url)
+            seen += [p.total_price for p in response.context["purchases"]]
+            url = (
+                response.context["next_url"]
+                and "/purchases" + response.context["next_url"]
+            )
+        self.assertEqual(seen, [7, 6, 5, 4, 3, 2, 1])
+
+        previous = response.context["previous_url"]
+        response = self.client.get("/purchases" + previous)
+        self.assertEqual(
+            [p.total_price for p in response.context["purchases"]], [4, 3, 2]
+        )
+
+    def test_filters(self):
+        response = self.client.get(
+            "/purchases",
+            {
+                "cost_center": self.root.id,
+                "item": self.item.id,
+                "start": "2023-08-02",
+            },
+        )
+        self.assertEqual([p.total_price for p in response.context["purchases"]], [5, 3])
+
+        response = self.client.get("/purchases", {"start": "bad"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_query_count_is_constant(self):
+        with self.assertNumQueries(3):
+            self.client.get("/purchases")
+        with self.assertNumQueries(3):
+            self.client.get("/fundings")
+
+
+class SubtreeQueries(TestCase):
+    def test_subtree_does_not_match_sibling_with_shared_prefix(self):
+        cc = CostCenter.objects.create(name="Slush Fund", description="Gay")
+        child = CostCenter.objects.create(name="Child", description="Gay", parent=cc)
+        # A root whose id starts with the digits of cc's id, e.g. /4 and /41.
+        (lookalike,) = CostCenter.objects.bulk_create(
+            [
+                CostCenter(
+                    id=cc.id * 10 + 1,
+                    name="Lookalike",
+                    description="Gay",
+                    path=f"/{cc.id * 10 + 1}",
+                )
+            ]
+        )
+
+        self.assertEqual(set(cc.subtree()), {cc, child})
+        self.assertEqual(set(lookalike.subtree()), {lookalike})
+
+    def test_subtree_predicates_use_indexes(self):
+        cc = CostCenter.objects.create(name="Slush Fund", description="Gay")
+
+        plan = cc.subtree().explain()
+        self.assertRegex(
+            plan, r"SEARCH erp_costcenter USING (COVERING )?INDEX erp_costcenter_path"
+        )
+
+        plan = cc.recursive_purchases.filter(
+            purchase_date__gte=datetime(2023, 1, 1, tzinfo=timezone.utc)
+        ).explain()
+        self.assertRegex(
+            plan, r"SEARCH erp_purchase USING INDEX erp_purchas_cost_ce_\w+"
+        )
+        self.assertNotIn("SCAN", plan)
+
+        plan = cc.recursive_fundings.explain()
+        self.assertRegex(
+            plan, r"SEARCH erp_funding USING INDEX erp_funding_cost_ce_\w+"
+        )
+
+
+class BalanceSnapshots(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fund(self.root, 1000, utc(2023, 1, 15))
+        for month in range(1, 7):
+            self.purchase(self.eng, 10, utc(2023, month, 10))
+
+        call_command(
+            "close_periods", "--period=quarter", "--until=2023-06-30", stdout=StringIO()
+        )
+
+    def test_close_creates_snapshots_per_period(self):
+        self.assertEqual(
+            sorted(set(BalanceSnapshot.objects.values_list("as_of", flat=True))),
+            [
+                datetime(2023, 4, 1, tzinfo=timezone.utc),
+                datetime(2023, 7, 1, tzinfo=timezone.utc),
+            ],
+        )
+        snapshot = self.root.snapshots.get(as_of__month=7)
+        self.assertEqual(snapshot.subtree_balance, Decimal("940.00"))
+
+    def test_balance_as_of(self):
+        self.purchase(self.eng, 5, utc(2023, 7, 2))
+
+        with self.assertNumQueries(3):
+            balance = self.root.balance_as_of(date(2023, 7, 5))
+        self.assertEqual(balance, Decimal("935.00"))
+        self.assertEqual(self.root.balance_as_of(date(2023, 3, 31)), Decimal("970.00"))
+        self.assertEqual(self.eng.balance_as_of(date(2023, 1, 1)), Decimal("0"))
+
+    def test_backdated_writes_adjust_later_snapshots(self):
+        p = self.purchase(self.eng, 100, utc(2023, 2, 1))
+        self.assertEqual(self.root.balance_as_of(date(2023, 4, 30)), Decimal("860.00"))
+
+        p.purchase_date = datetime(2023, 5, 1, tzinfo=timezone.utc)
+        p.cost_center = self.finance
+        p.save()
+        self.assertEqual(self.root.balance_as_of(date(2023, 4, 30)), Decimal("960.00"))
+        self.assertEqual(
+            self.finance.balance_as_of(date(2023, 6, 30)), Decimal("-100.00")
+        )
+        self.assertEqual(BalanceSnapshot.verify(), [])
+
+        Funding.objects.all().delete()
+        self.assertEqual(BalanceSnapshot.verify(), [])
+
+    def test_bulk_changes_recompute_later_snapshots(self):
+        purchases = Purchase.objects.bulk_create(
+            Purchase(
+                purchase_date=datetime(2023, 5, 1, tzinfo=timezone.utc),
+                item=self.item,
+                quantity=1,
+                total_price=Decimal(1),
+                cost_center=self.eng,
+            )
+            for _ in range(BalanceSnapshot.BULK_CHANGES + 1)
+        )
+        apply_ledger_changes([p.ledger_change() for p in purchases])
+
+        self.assertEqual(BalanceSnapshot.verify(), [])
+        self.assertEqual(self.root.balance_as_of(date(2023, 6, 30)), Decimal("889.00"))
+
+    def test_reparent_and_new_cost_centers_keep_snapshots_consistent(self):
+        new = CostCenter.objects.create(name="Chemistry", description="Gay")
+        self.assertEqual(new.snapshots.count(), 2)
+
+        self.eng.parent = self.finance
+        self.eng.save()
+
+        self.assertEqual(BalanceSnapshot.verify(), [])
+        self.assertEqual(self.root.balance_as_of(date(2023, 6, 30)), Decimal("1000.00"))
+        self.assertEqual(
+            self.finance.balance_as_of(date(2023, 6, 30)), Decimal("-60.00")
+        )
+
+
+class CostCenterCache(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        local_stats.clear()
+        self.ops = CostCenter.objects.create(
+            name="Operations", description="Gay", parent=self.root
+        )
+        self.purchase(self.eng, 10)
+
+    def get(self, cost_center):
+        response = self.client.get(f"/cost-centers/{cost_center.id}")
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_second_request_is_a_hit(self):
+        self.get(self.root)
+        with self.assertNumQueries(3):
+            response = self.get(self.root)
+        self.assertEqual(len(response.context["transactions"]), 1)
+        self.assertEqual(local_stats, {"misses": 1, "hits": 1})
+        self.assertEqual(get_stats(), {"misses": 1, "hits": 1})
+
+    def test_writes_invalidate_ancestors_only(self):
+        self.get(self.root)
+        self.get(self.ops)
+        self.purchase(self.eng, 5)
+
+        self.assertEqual(len(self.get(self.root).context["transactions"]), 2)
+        self.get(self.ops)
+        self.assertEqual(local_stats, {"misses": 3, "hits": 1})
+
+    def test_renames_and_reparents_invalidate(self):
+        self.get(self.root)
+        self.eng.name = "R&D"
+        self.eng.save()
+        response = self.get(self.root)
+        self.assertEqual(response.context["transactions"][0]["t_cost_center"], "R&D")
+
+        self.eng.parent = None
+        self.eng.save()
+        self.assertEqual(self.get(self.root).context["transactions"], [])
+
+    def test_rebuild_invalidates(self):
+        self.get(self.root)
+        CostCenterBalance.rebuild()
+        self.get(self.root)
+        self.assertEqual(local_stats, {"misses": 2})
+
+    def test_cache_stats_command(self):
+        self.get(self.root)
+        self.get(self.root)
+        out = StringIO()
+        call_command("cache_stats", "--reset", stdout=out)
+        self.assertIn("hits: 1, misses: 1, hit ratio: 50.0%", out.getvalue())
+        self.assertEqual(get_stats(), {"hits": 0, "misses": 0})
+
+
+class ConditionalRequests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.beakers = self.purchase(self.eng, 10)
+
+    def urls(self):
+        return [
+            f"/cost-centers/{self.root.id}",
+            f"/cost-centers/{self.root.id}/export?format=csv",
+            "/purchases",
+            "/purchases/export?format=csv",
+            "/fundings",
+        ]
+
+    def etags(self):
+        return {url: self.client.get(url)["ETag"] for url in self.urls()}
+
+    def assertAllModified(self, etags):
+        for url, etag in etags.items():
+            with self.subTest(url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        for url, etag in self.etags().items():
+            with self.subTest(url):
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_edits_change_etags(self):
+        etags = self.etags()
+        # Does not change any amount.
+        self.beakers.comment = "For the lab"
+        self.beakers.save()
+        self.assertAllModified(etags)
+
+    def test_deletes_change_etags(self):
+        etags = self.etags()
+        self.beakers.delete()
+        self.assertAllModified(etags)
+
+    def test_renames_change_etags(self):
+        etags = self.etags()
+        self.item.name = "Flask"
+        self.item.save()
+        self.assertAllModified(etags)
+
+        etags = self.etags()
+        self.eng.name = "R&D"
+        self.eng.save()
+        self.assertAllModified(etags)
+
+    def test_children_change_etags(self):
+        url = f"/cost-centers/{self.root.id}"
+        etag = self.client.get(url)["ETag"]
+        child = CostCenter.objects.create(
+            name="Chemistry", description="Gay", parent=self.root
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        child.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_ancestor_changes_change_descendant_etags(self):
+        # Descendant pages show the ancestor's name and place in breadcrumbs.
+        url = f"/cost-centers/{self.eng.id}"
+        etag = self.client.get(url)["ETag"]
+        self.root.name = "Petty Cash"
+        self.root.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Petty Cash")
+
+        self.root.parent = self.finance
+        self.root.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Finance")
+
+    def test_other_subtrees_keep_etags(self):
+        url = f"/cost-centers/{self.finance.id}"
+        etag = self.client.get(url)["ETag"]
+        self.beakers.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class ItemKinds(TestCase):
+    def setUp(self):
+        item_kind_ids.clear()
+        self.beaker = ItemKind.objects.create(name=" Glass  Beaker", description="")
+        self.cost_center = CostCenter.objects.create(name="Lab", description="Gay")
+
+    def test_names_are_normalized_and_unique(self):
+        self.assertEqual(self.beaker.name, "Glass Beaker")
+        self.assertEqual(self.beaker.normalized_name, "glass beaker")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ItemKind.objects.create(name="GLASS beaker", description="")
+        with self.assertRaises(ValidationError):
+            ItemKind(name="GLASS beaker", description="").full_clean()
+
+    def test_normalized_name_fits_longer_case_folding(self):
+        item_kind = ItemKind.objects.create(
+            name="ß" * MAX_NAME_LENGTH, description="German"
+        )
+        self.assertEqual(item_kind.normalized_name, "ss" * MAX_NAME_LENGTH)
+        item_kind.full_clean()
+
+    def test_ids_for_names(self):
+        ids = ItemKind.ids_for_names(["glass  BEAKER", "Flask", "flask"])
+        self.assertEqual(ids, {"glass beaker": self.beaker.id, "flask": ids["flask"]})
+        self.assertEqual(ItemKind.objects.get(id=ids["flask"]).name, "Flask")
+        self.assertEqual(ItemKind.objects.count(), 2)
+
+    def test_resolve_uses_lru_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(resolve_item_kind("glass beaker"), self.beaker.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_item_kind("Glass Beaker "), self.beaker.id)
+
+    def test_renames_outdate_ids_in_every_process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resolve_item_kind("glass beaker")
+        version = item_kind_version()
+
+        # Other processes only share the version, not item_kind_ids.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beaker.name = "Beaker"
+            self.beaker.save()
+        self.assertGreater(item_kind_version(), version)
+        self.assertEqual(len(item_kind_ids), 1)
+        self.assertNotEqual(resolve_item_kind("glass beaker"), self.beaker.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(resolve_item_kind("beaker"), self.beaker.id)
+            beaker_id = self.beaker.id
+            self.beaker.delete()
+        self.assertNotEqual(resolve_item_kind("beaker"), beaker_id)
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_purchase_form_reuses_kinds(self):
+        for name in ["glass beaker", "Test tube", "test TUBE"]:
+            response = self.client.post(
+                "/purchases/create",
+                {
+                    "item": name,
+                    "purchase_date": "2023-01-01 00:00",
+                    "quantity": 1,
+                    "total_price": "1.00",
+                    "cost_center": self.cost_center.id,
+                },
+            )
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(ItemKind.objects.values_list("name", flat=True)),
+            ["Glass Beaker", "Test tube"],
+        )
+        self.assertEqual(Purchase.objects.filter(item=self.beaker).count(), 1)
+
+    def test_search(self):
+        ItemKind.ids_for_names(["Glass Flask", "Glassware", "Flask", "Glas"])
+        response = self.client.get("/item-kinds/search", {"q": "GLASS", "limit": 2})
+        self.assertEqual(
+            [r["name"] for r in response.json()["results"]],
+            ["Glass Beaker", "Glass Flask"],
+        )
+        response = self.client.get("/item-kinds/search", {"limit": 100})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_uses_index(self):
+        sql, params = ItemKind.search("glass", 10).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertRegex(plan, r"SEARCH erp_itemkind USING (COVERING )?INDEX")
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class LedgerEntries(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.beakers = self.purchase(
+            self.eng, 10, utc(2023, 1, 2), quantity=Decimal("2.50")
+        )
+        self.grant = self.fund(self.root, 100)
+
+    def entries(self):
+        return list(
+            LedgerEntry.objects.order_by("date").values_list(
+                "source", "path", "name", "amount"
+            )
+        )
+
+    def test_writes_keep_entries_up_to_date(self):
+        self.assertEqual(
+            self.entries(),
+            [
+                (f"F{self.grant.id}", self.root.path, "Grant", Decimal("100.00")),
+                (
+                    f"P{self.beakers.id}",
+                    self.eng.path,
+                    "Beaker x2.5",
+                    Decimal("-10.00"),
+                ),
+            ],
+        )
+
+        self.beakers.cost_center = self.finance
+        self.beakers.quantity = 3
+        self.beakers.save()
+        self.item.name = "Flask"
+        self.item.save()
+        self.grant.delete()
+        self.assertEqual(
+            self.entries(),
+            [
+                (
+                    f"P{self.beakers.id}",
+                    self.finance.path,
+                    "Flask x3",
+                    Decimal("-10.00"),
+                )
+            ],
+        )
+        self.assertEqual(LedgerEntry.verify(), [])
+
+    def test_reparent_moves_entries(self):
+        self.eng.parent = self.finance
+        self.eng.save()
+        self.assertEqual(LedgerEntry.verify(), [])
+        self.assertEqual(
+            [r["t_price"] for r in self.finance.query_balance_sheet()], [-10]
+        )
+
+    def test_rebuild_ledger_command(self):
+        LedgerEntry.objects.filter(source__startswith="P").delete()
+        LedgerEntry.objects.update(amount=1)
+        self.assertEqual(LedgerEntry.verify(), [self.root.id, self.eng.id])
+        with self.assertRaises(CommandError):
+            call_command("rebuild_ledger", "--check", stdout=StringIO())
+
+        out = StringIO()
+        call_command("rebuild_ledger", stdout=out)
+        self.assertIn("Wrote 2 ledger entries.", out.getvalue())
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_balance_sheet_uses_index(self):
+        key = (datetime(2023, 1, 1, tzinfo=timezone.utc), "F")
+        for cost_center in [self.root, self.eng]:
+            for query in [
+                cost_center.query_balance_sheet().order_by("t_date", "t_id")[:10],
+                cost_center.query_balance_sheet(after=key).order_by("t_date", "t_id")[
+                    :10
+                ],
+                cost_center.query_balance_sheet(before=key).order_by(
+                    "-t_date", "-t_id"
+                )[:10],
+            ]:
+                sql, params = query.query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                    plan = " ".join(row[-1] for row in cursor.fetchall())
+                with self.subTest(cost_center=cost_center.name, plan=plan):
+                    self.assertRegex(
+                        plan, r"SEARCH erp_ledgerentry USING INDEX \S+ \(path=\?"
+                    )
+                    self.assertNotIn("TEMP B-TREE", plan)
+
+
+class Search(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gpu = ItemKind.objects.create(name="GPU", description="Graphics card")
+        self.spring_gpu = self.purchase(
+            self.eng, 100, utc(2023, 4, 1), item=self.gpu, comment="Training rig"
+        )
+        self.autumn_gpu = self.purchase(
+            self.finance, 100, utc(2023, 10, 1), item=self.gpu
+        )
+        self.purchase(
+            self.eng, 100, utc(2023, 5, 1), comment="For the GPU cooling loop"
+        )
+        self.grant = self.fund(self.root, 1000, name="Graphics research grant")
+
+    def purchase(self, cost_center, price, date, **fields):
+        return super().purchase(
+            cost_center, price, date, supplier="https://gpus.example.com", **fields
+        )
+
+    def sources(self, text, **filters):
+        return [e.source for e in SearchDocument.search(text, **filters)]
+
+    def test_ranks_titles_first(self):
+        results = self.sources("gpu")
+        self.assertEqual(
+            sorted(results[:2]),
+            sorted([f"P{self.spring_gpu.id}", f"P{self.autumn_gpu.id}"]),
+        )
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.sources("graph"), [f"F{self.grant.id}", *results[:2]])
+
+    def test_filters(self):
+        self.assertEqual(
+            self.sources(
+                "gpu",
+                cost_center=self.root,
+                end=datetime(2023, 5, 1, tzinfo=timezone.utc),
+            ),
+            [f"P{self.spring_gpu.id}"],
+        )
+        self.assertEqual(
+            self.sources("example com", cost_center=self.finance),
+            [f"P{self.autumn_gpu.id}"],
+        )
+
+    def test_filters_apply_before_the_limit(self):
+        results = SearchDocument.search("gpu", cost_center=self.eng, limit=1)
+        self.assertEqual([e.source for e in results], [f"P{self.spring_gpu.id}"])
+        # Only the best matches are joined with the cost centers.
+        self.assertRegex(results.raw_query, r"LIMIT %s\s*\) m")
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.sources('"gpu OR NOT (rig*'), [])
+        self.assertEqual(self.sources("  "), [])
+
+    def test_index_follows_writes(self):
+        self.spring_gpu.comment = "Replacement fan"
+        self.spring_gpu.save()
+        self.autumn_gpu.delete()
+        self.gpu.description = "Accelerator"
+        self.gpu.save()
+
+        self.assertEqual(self.sources("rig"), [])
+        self.assertEqual(self.sources("fan accelerator"), [f"P{self.spring_gpu.id}"])
+        self.assertEqual(SearchDocument.verify(), [])
+
+    def test_rebuild_search_command(self):
+        SearchDocument.remove([self.grant])
+        self.assertEqual(SearchDocument.verify(), [f"F{self.grant.id}"])
+        with self.assertRaises(CommandError):
+            call_command("rebuild_search", "--check", stdout=StringIO())
+        call_command("rebuild_search", stdout=StringIO())
+        self.assertEqual(self.sources("research"), [f"F{self.grant.id}"])
+
+    def test_view(self):
+        response = self.client.get(
+            "/search", {"q": "gpu", "cost_center": self.finance.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        [entry] = response.context["results"]
+        self.assertEqual(entry.href, f"/purchases/{self.autumn_gpu.id}")
+        self.assertEqual(entry.cost_center_name, "Finance")
+        self.assertContains(response, "GPU x1")
+
+        self.assertEqual(self.client.get("/search").status_code, 200)
+        self.assertEqual(self.client.get("/search", {"q": ""}).status_code, 400)
+
+
+class Analytics(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gpu = ItemKind.objects.create(name="GPU", description="Graphics card")
+        for item, cost_center, when, price, supplier in [
+            (self.gpu, self.eng, utc(2022, 12, 5), "10.50", "a.example"),
+            (self.gpu, self.eng, utc(2023, 1, 5), "20.25", "b.example"),
+            (self.item, self.root, utc(2023, 1, 9), "5", "a.example"),
+            (self.item, self.finance, utc(2023, 3, 1), "7", "c.example"),
+        ]:
+            self.purchase(
+                cost_center, Decimal(price), when, item=item, supplier=supplier
+            )
+        self.fund(self.root, 1000)
+
+    def by_name(self, report):
+        return {cc["name"]: cc for cc in report["cost_centers"]}
+
+    def test_monthly_rolls_up_subtrees(self):
+        report = Ledger().monthly()
+        self.assertEqual(report["months"], ["2022-12", "2023-01", "2023-02", "2023-03"])
+        ccs = self.by_name(report)
+        self.assertEqual(
+            ccs["Engineering"]["spend"], ["10.50", "20.25", "0.00", "0.00"]
+        )
+        self.assertEqual(ccs["Slush Fund"]["spend"], ["0.00", "5.00", "0.00", "0.00"])
+        self.assertEqual(
+            ccs["Slush Fund"]["subtree_spend"], ["10.50", "25.25", "0.00", "0.00"]
+        )
+        self.assertEqual(
+            ccs["Slush Fund"]["subtree_funding"], ["0.00", "1000.00", "0.00", "0.00"]
+        )
+        self.assertEqual(ccs["Finance"]["subtree_spend"][-1], "7.00")
+
+    def test_filters(self):
+        report = Ledger(
+            cost_center=self.root, start=datetime(2023, 1, 1, tzinfo=timezone.utc)
+        ).monthly()
+        self.assertEqual(report["months"], ["2023-01"])
+        self.assertEqual(set(self.by_name(report)), {"Slush Fund", "Engineering"})
+        self.assertEqual(self.by_name(report)["Slush Fund"]["subtree_spend"], ["25.25"])
+
+        empty = Ledger(start=datetime(2030, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(empty.monthly()["months"], [])
+        self.assertEqual(empty.item_kinds(), {"item_kinds": []})
+        self.assertEqual(empty.year_over_year(), {"years": [], "cost_centers": []})
+
+    def test_item_kinds_and_suppliers(self):
+        ledger = Ledger()
+        self.assertEqual(
+            ledger.item_kinds()["item_kinds"],
+            [
+                {"id": self.gpu.id, "name": "GPU", "purchases": 2, "spend": "30.75"},
+                {
+                    "id": self.item.id,
+                    "name": "Beaker",
+                    "purchases": 2,
+                    "spend": "12.00",
+                },
+            ],
+        )
+        self.assertEqual(
+            ledger.top_suppliers(limit=2)["suppliers"],
+            [
+                {"supplier": "b.example", "purchases": 1, "spend": "20.25"},
+                {"supplier": "a.example", "purchases": 2, "spend": "15.50"},
+            ],
+        )
+
+    def test_year_over_year(self):
+        report = Ledger().year_over_year()
+        self.assertEqual(report["years"], [2022, 2023])
+        root = self.by_name(report)["Slush Fund"]
+        self.assertEqual(root["spend"], ["10.50", "25.25"])
+        self.assertEqual(root["change"], [None, "14.75"])
+        self.assertEqual(root["relative_change"], [None, 1.4048])
+        self.assertEqual(
+            self.by_name(report)["Finance"]["relative_change"], [None, None]
+        )
+
+    def test_endpoint_and_command(self):
+        response = self.client.get(
+            f"/analytics/item-kinds?cost_center={self.finance.id}"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([k["name"] for k in response.json()["item_kinds"]], ["Beaker"])
+        self.assertEqual(self.client.get("/analytics/nope").status_code, 404)
+        self.assertEqual(
+            self.client.get("/analytics/monthly?start=bad").status_code, 400
+        )
+
+        out = StringIO()
+        call_command(
+            "analytics", "suppliers", f"--cost-center={self.eng.id}", stdout=out
+        )
+        self.assertEqual(
+            [s["supplier"] for s in json.loads(out.getvalue())["suppliers"]],
+            ["b.example", "a.example"],
+        )
+
+    def test_command_dates_match_endpoint(self):
+        # The end date is inclusive, so the purchase on 2023-01-09 counts.
+        response = self.client.get(
+            "/analytics/suppliers?start=2023-01-05&end=2023-01-09"
+        )
+        out = StringIO()
+        call_command(
+            "analytics",
+            "suppliers",
+            "--start=2023-01-05",
+            "--end=2023-01-09",
+            stdout=out,
+        )
+        self.assertEqual(json.loads(out.getvalue()), response.json())
+        self.assertEqual(
+            [s["supplier"] for s in response.json()["suppliers"]],
+            ["b.example", "a.example"],
+        )
+        with self.assertRaises(CommandError):
+            call_command(
+                "analytics", "suppliers", "--start=2023-02-01", "--end=2023-01-01"
+            )
+
+
+class Runways(LedgerTestCase):
+    now = utc(2024, 1, 1)
+
+    def setUp(self):
+        super().setUp()
+        self.fund(self.root, 1000, utc(2023, 1, 1))
+
+    def daily_spend(self):
+        return {
+            (d.cost_center_id, d.day): d.amount
+            for d in DailySpend.objects.exclude(amount=0)
+        }
+
+    def test_daily_spend_follows_writes(self):
+        p = self.purchase(self.eng, 30, utc(2023, 12, 1, 10))
+        self.purchase(self.eng, 15, utc(2023, 12, 1, 20))
+        self.assertEqual(self.daily_spend(), {(self.eng.id, date(2023, 12, 1)): 45})
+
+        p.purchase_date = datetime(2023, 12, 2, tzinfo=timezone.utc)
+        p.cost_center = self.root
+        p.save()
+        self.assertEqual(
+            self.daily_spend(),
+            {
+                (self.eng.id, date(2023, 12, 1)): 15,
+                (self.root.id, date(2023, 12, 2)): 30,
+            },
+        )
+        p.delete()
+        self.assertEqual(self.daily_spend(), {(self.eng.id, date(2023, 12, 1)): 15})
+        self.assertEqual(DailySpend.verify(), [])
+
+    def test_rebuild(self):
+        self.purchase(self.eng, 30, utc(2023, 12, 1))
+        DailySpend.objects.update(amount=1)
+        self.assertEqual(DailySpend.verify(), [(self.eng.id, date(2023, 12, 1))])
+        call_command("rebuild_balances", stdout=StringIO())
+        self.assertEqual(DailySpend.verify(), [])
+
+    def test_runway(self):
+        # 90 days at 10 per day.
+        self.purchase(self.eng, 450, utc(2023, 10, 15))
+        self.purchase(self.root, 450, utc(2023, 12, 15))
+        # Ignored: outside the window.
+        self.purchase(self.eng, 50, utc(2023, 1, 15))
+
+        with self.assertNumQueries(3):
+            runways = compute_runways(window_days=90, now=self.now)
+        root = runways[self.root.id]
+        self.assertEqual((root.balance, root.daily_spend), (50, 10))
+        self.assertEqual(root.runs_out, datetime(2024, 1, 6, tzinfo=timezone.utc))
+        self.assertEqual(root.days, 5)
+        self.assertEqual(runways[self.eng.id].daily_spend, 5)
+        # Its own balance is negative.
+        self.assertEqual(runways[self.eng.id].runs_out, self.now)
+
+    def test_scheduled_fundings_extend_runway(self):
+        self.purchase(self.root, 900, utc(2023, 12, 1))
+        self.fund(self.root, 200, utc(2024, 1, 10))
+        runway = compute_runways(window_days=90, now=self.now)[self.root.id]
+        self.assertEqual((runway.balance, runway.scheduled), (100, 200))
+        self.assertEqual(runway.runs_out, datetime(2024, 1, 31, tzinfo=timezone.utc))
+
+        # A funding that comes too late does not help.
+        self.fund(self.root, 5000, utc(2024, 6, 1))
+        runway = compute_runways(window_days=90, now=self.now)[self.root.id]
+        self.assertEqual(runway.runs_out, datetime(2024, 1, 31, tzinfo=timezone.utc))
+
+    def test_no_spending(self):
+        runway = compute_runways(now=self.now)[self.root.id]
+        self.assertEqual(runway.runs_out, None)
+        self.assertEqual(runway.days, None)
+
+    def test_endpoint(self):
+        self.purchase(self.root, 90, datetime.now(timezone.utc) - timedelta(days=1))
+        response = self.client.get(f"/cost-centers/{self.root.id}/runway?window=9")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["daily_spend"], "10.00")
+        self.assertEqual(data["days"], 91)
+        self.assertEqual(list(data["descendants"]), [str(self.eng.id)])
+        self.assertEqual(
+            self.client.get(
+                f"/cost-centers/{self.root.id}/runway?window=0"
+            ).status_code,
+            400,
+        )
+
+        response = self.client.get("/cost-centers")
+        self.assertContains(response, "runway: 910 days")
+        self.assertContains(response, "no recent spending")
+
+
+class Api(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        gpu = ItemKind.objects.create(name="GPU", description="Graphics card")
+        self.purchases = [
+            self.purchase(cost_center, price, utc(2023, 1, day), item=gpu)
+            for day, price, cost_center in [
+                (1, 10, self.eng),
+                (2, 20, self.finance),
+                (3, 30, self.root),
+            ]
+        ]
+        self.funding = self.fund(self.root, 1000)
+
+    def get(self, url, status=200):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json() if status == 200 else None
+
+    def test_detail_with_balance(self):
+        data = self.get(f"/api/cost-centers/{self.root.id}")
+        self.assertEqual(data["name"], "Slush Fund")
+        self.assertEqual(Decimal(data["subtree_balance"]), 960)
+        self.assertEqual(
+            self.get(
+                f"/api/purchases/{self.purchases[0].id}?fields=item_name,total_price"
+            ),
+            {"item_name": "GPU", "total_price": "10.00"},
+        )
+        self.get("/api/purchases/0", status=404)
+        self.get("/api/widgets/1", status=404)
+
+    def test_field_selection(self):
+        data = self.get("/api/fundings?fields=name")
+        self.assertEqual(data, {"results": [{"name": "Grant"}], "next": None})
+        self.get("/api/fundings?fields=name,password", status=400)
+
+    def test_batch_fetch(self):
+        p1, p2, _ = self.purchases
+        data = self.get(f"/api/purchases?ids={p2.id},{p1.id},0&fields=id")
+        self.assertEqual(data["results"], [{"id": p1.id}, {"id": p2.id}])
+        self.assertEqual(data["missing"], [0])
+        self.get("/api/purchases?ids=P1", status=400)
+
+        with self.assertNumQueries(1):
+            data = self.get(
+                f"/api/transactions?ids=P{p1.id},F{self.funding.id},P0"
+                f"&fields=name,amount"
+            )
+        self.assertEqual(
+            data["results"],
+            [
+                {"name": "Grant", "amount": "1000.00"},
+                {"name": "GPU x1", "amount": "-10.00"},
+            ],
+        )
+        self.assertEqual(data["missing"], ["P0"])
+
+        # Prefixes are case-insensitive, like /s/<id>.
+        data = self.get(f"/api/transactions?ids=f{self.funding.id},p0&fields=name")
+        self.assertEqual(data, {"results": [{"name": "Grant"}], "missing": ["P0"]})
+        data = self.get(f"/api/transactions/p{p1.id}?fields=amount")
+        self.assertEqual(data, {"amount": "-10.00"})
+
+    def test_transactions_are_paginated_by_short_id(self):
+        sources = []
+        url = "/api/transactions?limit=2&fields=source"
+        while url:
+            data = self.get(url)
+            sources += [row["source"] for row in data["results"]]
+            url = data["next"]
+        self.assertEqual(sources, sorted(sources))
+        self.assertEqual(len(sources), 4)
+        self.assertEqual(
+            self.get("/api/transactions?after=f0&fields=source")["results"],
+            [{"source": source} for source in sources],
+        )
+
+    def test_subtree_and_pagination(self):
+        data = self.get(
+            f"/api/purchases?cost_center={self.root.id}&limit=1&fields=total_price"
+        )
+        self.assertEqual(data["results"], [{"total_price": "10.00"}])
+        data = self.get(data["next"])
+        self.assertEqual(data["results"], [{"total_price": "30.00"}])
+        self.assertEqual(data["next"], None)
+        self.get("/api/purchases?limit=0", status=400)
+        self.get("/api/purchases?cost_center=0", status=400)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1, DEBUG=True)
+    async def test_async_client(self):
+        response = await self.async_client.get(
+            f"/api/cost-centers?ids={self.eng.id}&fields=name"
+        )
+        self.assertEqual(
+            response.json(), {"results": [{"name": "Engineering"}], "missing": []}
+        )
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+
+class PurchaseBatches(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        ItemKind.objects.create(name="Glass Beaker", description="")
+
+    def post(self, lines, **header):
+        data = {
+            "purchase_date": "2023-01-01 00:00",
+            "supplier": "https://glass.example.com",
+            "cost_center": self.eng.id,
+            "lines-TOTAL_FORMS": len(lines),
+            "lines-INITIAL_FORMS": 0,
+            **header,
+        }
+        for i, line in enumerate(lines):
+            data.update({f"lines-{i}-{k}": v for k, v in line.items()})
+        return self.client.post("/purchases/create-batch", data)
+
+    def lines(self, count):
+        return [
+            {
+                "item": "glass beaker" if i % 2 else f"Tube {i}",
+                "quantity": 1,
+                "total_price": "1.50",
+            }
+            for i in range(count)
+        ]
+
+    def test_creates_lines_and_derived_rows(self):
+        response = self.post(
+            [*self.lines(3), {"item": "", "quantity": "", "total_price": ""}]
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Purchase.objects.filter(cost_center=self.eng).count(), 3)
+        self.assertEqual(Purchase.objects.filter(item__name="Glass Beaker").count(), 1)
+        self.assertEqual(
+            CostCenterBalance.objects.get(pk=self.root.id).subtree_debit,
+            Decimal("4.50"),
+        )
+        self.assertEqual(CostCenterBalance.verify(), [])
+        self.assertEqual(DailySpend.verify(), [])
+        self.assertEqual(LedgerEntry.verify(), [])
+        self.assertEqual(SearchDocument.verify(), [])
+
+    def test_query_count_does_not_grow(self):
+        def queries(count):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.post(self.lines(count)).status_code, 302)
+            return len(ctx)
+
+        self.assertEqual(queries(2), queries(40))
+
+    def test_invalid_line_saves_nothing(self):
+        lines = self.lines(3)
+        lines[2]["total_price"] = "lots"
+        response = self.post(lines)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Enter a number.")
+        self.assertFalse(Purchase.objects.exists())
+
+        response = self.post([])
+        self.assertContains(response, "Please submit at least 1 form.")
+
+
+class SqliteProfile(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        pragmas = connection.settings_dict["OPTIONS"]["pragmas"]
+        self.assertEqual(self.pragma("busy_timeout"), pragmas["busy_timeout"])
+        self.assertEqual(self.pragma("cache_size"), pragmas["cache_size"])
+        # NORMAL and MEMORY.
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("temp_store"), 2)
+
+    def test_invalid_pragma(self):
+        options = connection.settings_dict["OPTIONS"]
+        connection.settings_dict["OPTIONS"] = {"pragmas": {"x; DROP": 1}}
+        try:
+            with self.assertRaises(ImproperlyConfigured):
+                connection.pragmas()
+        finally:
+            connection.settings_dict["OPTIONS"] = options
+
+    def test_retries_locked_writes(self):
+        calls = []
+
+        @retry_on_locked
+        def write(fail_times, message="database is locked"):
+            calls.append(connection.in_atomic_block)
+            if len(calls) <= fail_times:
+                raise OperationalError(message)
+            return len(calls)
+
+        # TestCase wraps every test in a transaction, which is what makes
+        # retrying impossible.
+        with self.assertRaises(OperationalError):
+            write(1)
+        self.assertEqual(len(calls), 1)
+
+        calls.clear()
+        with override_settings(WRITE_RETRY_ATTEMPTS=3, WRITE_RETRY_BACKOFF_MS=1):
+            with mock.patch.object(
+                transaction.get_connection(), "in_atomic_block", False
+            ):
+                self.assertEqual(write(2), 3)
+                calls.clear()
+                with self.assertRaises(OperationalError):
+                    write(3)
+                self.assertEqual(len(calls), 3)
+                calls.clear()
+                with self.assertRaises(OperationalError):
+                    write(1, "no such table")
+                self.assertEqual(len(calls), 1)
+
+
+class Archive(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old_funding = self.fund(self.root, 1000, utc(2022, 1, 15))
+        self.old_purchase = self.purchase(self.eng, 40, utc(2022, 3, 10))
+        self.purchase(self.eng, 60, utc(2022, 11, 10))
+        self.new_purchase = self.purchase(self.eng, 25, utc(2023, 2, 10))
+        call_command(
+            "close_periods", "--period=quarter", "--until=2022-12-31", stdout=StringIO()
+        )
+
+    def archive(self, before):
+        out = StringIO()
+        call_command("archive_transactions", f"--before={before}", stdout=out)
+        return out.getvalue()
+
+    def assert_consistent(self):
+        self.assertEqual(CarryForward.verify(), [])
+        self.assertEqual(CostCenterBalance.verify(), [])
+        self.assertEqual(BalanceSnapshot.verify(), [])
+        self.assertEqual(DailySpend.verify(), [])
+        self.assertEqual(LedgerEntry.verify(), [])
+        self.assertEqual(SearchDocument.verify(), [])
+
+    def test_archive_moves_old_transactions(self):
+        version = CostCenterBalance.latest_version()
+        out = self.archive("2022-12-01")
+        self.assertIn("Archived 2 purchases and 1 fundings", out)
+
+        self.assertEqual(Purchase.objects.get().pk, self.new_purchase.pk)
+        self.assertFalse(Funding.objects.exists())
+        archived = ArchivedPurchase.objects.get(pk=self.old_purchase.pk)
+        self.assertEqual(archived.create_date, self.old_purchase.create_date)
+        self.assertEqual(ArchivedFunding.objects.get().credit, Decimal("1000.00"))
+
+        carried = CarryForward.objects.get(cost_center=self.eng)
+        self.assertEqual((carried.credit, carried.debit), (0, Decimal("100.00")))
+        self.assertEqual(carried.date, datetime(2022, 12, 1, tzinfo=timezone.utc))
+        self.assertGreater(CostCenterBalance.latest_version(), version)
+        self.assert_consistent()
+
+    def test_balances_are_carried_forward(self):
+        self.archive("2022-12-01")
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.total_balance, Decimal("875.00"))
+        self.assertEqual(self.root.balance_as_of(date(2022, 12, 31)), Decimal("900.00"))
+        self.assertEqual(self.root.balance_as_of(date(2022, 6, 30)), Decimal("960.00"))
+        self.assertEqual(self.root.balance_as_of(date(2022, 3, 1)), Decimal("1000.00"))
+        # The archive closed a period at its cutoff.
+        with self.assertNumQueries(3):
+            self.root.balance_as_of(date(2023, 3, 1))
+
+        page = self.root.balance_sheet_page(10)
+        self.assertEqual(
+            [(row["t_name"], row["t_balance"]) for row in page.rows],
+            [
+                ("Carried forward", Decimal("1000.00")),
+                ("Carried forward", Decimal("900.00")),
+                ("Beaker x1", Decimal("875.00")),
+            ],
+        )
+        self.assertEqual(page.rows[1]["t_href"], f"/cost-centers/{self.eng.id}")
+        # Snapshots up to the cutoff overlap with the carry-forwards.
+        for row in page.rows:
+            self.assertEqual(
+                self.root.opening_balance((row["t_date"], row["t_id"])),
+                row["t_balance"] - row["t_price"],
+            )
+
+    def test_archiving_again_accumulates(self):
+        self.archive("2022-06-01")
+        self.archive("2022-12-01")
+        carried = CarryForward.objects.get(cost_center=self.eng)
+        self.assertEqual(carried.debit, Decimal("100.00"))
+        self.assertEqual(carried.date, datetime(2022, 12, 1, tzinfo=timezone.utc))
+        self.assertIn("Archived 0 purchases and 0 fundings", self.archive("2022-06-01"))
+        self.assert_consistent()
+
+        LedgerEntry.rebuild()
+        CostCenterBalance.rebuild()
+        self.assert_consistent()
+
+        self.eng.parent = None
+        self.eng.save()
+        self.eng.refresh_from_db()
+        self.assertEqual(self.eng.total_balance, Decimal("-125.00"))
+        self.assert_consistent()
+
+    def test_archived_transactions_keep_their_urls(self):
+        self.archive("2022-12-01")
+        response = self.client.get(f"/s/P{self.old_purchase.pk}", follow=True)
+        self.assertContains(response, "Beaker x1")
+        self.assertContains(response, "Archived")
+        response = self.client.get(f"/fundings/{self.old_funding.pk}")
+        self.assertContains(response, "Grant")
+        self.assertEqual(self.client.get("/purchases/999999").status_code, 404)
+
+    def test_cutoff_must_be_in_the_past(self):
+        with self.assertRaises(CommandError):
+            self.archive(date.today() + timedelta(days=2))
+
+
+class Admin(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(
+            get_user_model().objects.create_superuser("admin", "admin@example.com")
+        )
+        # Dated apart from their prices, two of them before the snapshot that
+        # the action tests take on the 3rd.
+        dates = [utc(2023, 1, day) for day in (1, 2, 5, 9, 20)]
+        self.purchases = [
+            self.purchase(self.eng, price, date)
+            for price, date in enumerate(dates, start=1)
+        ]
+
+    def test_changelists_run_constant_queries(self):
+        urls = [
+            "/admin/erp/purchase/",
+            f"/admin/erp/purchase/?cost_center__id__exact={self.eng.id}",
+            "/admin/erp/funding/",
+            "/admin/erp/costcenter/",
+            "/admin/erp/itemkind/",
+        ]
+        for i, url in enumerate(urls):
+            with CaptureQueriesContext(connection) as before:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            other = ItemKind.objects.create(name=f"Flask {i}", description="Glass")
+            for price in range(1, 6):
+                self.purchase(self.eng, price, item=other)
+            with CaptureQueriesContext(connection) as after:
+                self.client.get(url)
+            self.assertEqual(len(after), len(before), url)
+
+        response = self.client.get(
+            f"/admin/erp/purchase/{self.purchases[0].id}/change/"
+        )
+        self.assertEqual(response.status_code, 200)
+        # Autocomplete widgets only render the current choices.
+        self.assertContains(response, f'<option value="{self.eng.id}" selected>')
+        self.assertNotContains(response, f'<option value="{self.finance.id}"')
+
+    def test_delete_selected_action(self):
+        BalanceSnapshot.recompute([datetime(2023, 1, 3, tzinfo=timezone.utc)])
+        selected = [p.id for p in self.purchases[1:4]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                "/admin/erp/purchase/",
+                {
+                    "action": "delete_selected",
+                    "_selected_action": selected,
+                    "post": "yes",
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        deletes = [
+            q
+            for q in ctx.captured_queries
+            if q["sql"].startswith('DELETE FROM "erp_purchase"')
+        ]
+        self.assertEqual(len(deletes), 1)
+
+        self.assertFalse(Purchase.objects.filter(id__in=selected).exists())
+        self.assertEqual(
+            CostCenter.objects.get(pk=self.root.pk).total_balance, Decimal("-6.00")
+        )
+        self.assertEqual(CostCenterBalance.verify(), [])
+        self.assertEqual(BalanceSnapshot.verify(), [])
+        self.assertEqual(DailySpend.verify(), [])
+        self.assertEqual(LedgerEntry.verify(), [])
+        self.assertEqual(SearchDocument.verify(), [])
+
+    def test_item_kind_search(self):
+        ItemKind.objects.create(name="Glass Beaker", description="")
+        ItemKind.objects.create(name="Flask", description="Glass")
+        response = self.client.get("/admin/erp/itemkind/", {"q": " glass  BEAK"})
+        self.assertContains(response, "Glass Beaker")
+        self.assertNotContains(response, "Flask")
+
+        queryset, _ = ItemKindAdmin(ItemKind, site).get_search_results(
+            None, ItemKind.objects.order_by("normalized_name"), "glass"
+        )
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertRegex(plan, r"SEARCH erp_itemkind USING (COVERING )?INDEX")
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_estimated_counts(self):
+        self.purchases[1].delete()
+        purchases = Purchase.objects.order_by("id")
+        paginator = EstimatedCountPaginator(purchases, 2)
+        self.assertEqual(paginator.count, 4)
+
+        with mock.patch.object(EstimatedCountPaginator, "EXACT_COUNT_LIMIT", 1):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(EstimatedCountPaginator(purchases, 2).count, 5)
+            self.assertNotIn("COUNT", ctx.captured_queries[-1]["sql"])
+            filtered = purchases.filter(total_price__gt=2)
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 3)
+
+    def test_reassign_cost_center_action(self):
+        BalanceSnapshot.recompute([datetime(2023, 1, 3, tzinfo=timezone.utc)])
+        selected = [p.id for p in self.purchases[:3]]
+        data = {"action": "reassign_cost_center", "_selected_action": selected}
+        response = self.client.post("/admin/erp/purchase/", data)
+        self.assertContains(response, "3 selected purchases")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                "/admin/erp/purchase/",
+                {**data, "apply": "1", "cost_center": self.finance.id},
+            )
+        self.assertEqual(response.status_code, 302)
+        updates = [
+            q
+            for q in ctx.captured_queries
+            if q["sql"].startswith('UPDATE "erp_purchase"')
+        ]
+        self.assertEqual(len(updates), 1)
+        # The purchases are only aggregated, never loaded.
+        self.assertFalse(
+            any('"erp_purchase"."comment"' in q["sql"] for q in ctx.captured_queries)
+        )
+
+        self.assertEqual(
+            sorted(self.finance.recursive_purchases.values_list("id", flat=True)),
+            selected,
+        )
+        self.assertEqual(
+            CostCenter.objects.get(pk=self.finance.pk).total_balance, Decimal("-6.00")
+        )
+        self.assertEqual(
+            CostCenter.objects.get(pk=self.root.pk).total_balance, Decimal("-9.00")
+        )
+        self.assertEqual(CostCenterBalance.verify(), [])
+        self.assertEqual(BalanceSnapshot.verify(), [])
+        self.assertEqual(DailySpend.verify(), [])
+        self.assertEqual(LedgerEntry.verify(), [])
+        self.assertEqual(SearchDocument.verify(), [])
+
+        funding = Funding.objects.create(
+            name="Grant",
+            funding_date=datetime(2023, 1, 2, tzinfo=timezone.utc),
+            credit=10,
+            cost_center=self.finance,
+        )
+        fundings = Funding.objects.filter(pk=funding.pk)
+        self.assertEqual(reassign_transactions(fundings, self.eng), 1)
+        self.assertEqual(reassign_transactions(fundings, self.eng), 0)
+        self.assertEqual(
+            CostCenter.objects.get(pk=self.root.pk).total_balance, Decimal("1.00")
+        )
+        self.assertEqual(CostCenterBalance.verify(), [])
+        self.assertEqual(BalanceSnapshot.verify(), [])
+        self.assertEqual(LedgerEntry.verify(), [])
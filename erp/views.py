@@ -1,13 +1,44 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
 from django import forms
-from django.http import Http404, HttpRequest, HttpResponse
-from django.shortcuts import redirect, render
+from django.core.exceptions import BadRequest
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.db.models import F, Q
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic import ListView, CreateView, DetailView
 from django.views.generic.edit import DeleteView, UpdateView
 
-from erp.forms import PurchaseCreateForm
+from erp.analytics import REPORTS, run_report
+from erp.caching import cached_for_cost_center
+from erp.exports import stream_export
+from erp.forms import (
+    ExportForm,
+    FundingFilterForm,
+    ItemKindSearchForm,
+    PurchaseBatchForm,
+    PurchaseCreateForm,
+    PurchaseFilterForm,
+    PurchaseLineFormSet,
+    RunwayForm,
+    SearchForm,
+)
 
-from .models import CostCenter, Funding, Purchase
+from .models import (
+    ArchivedFunding,
+    ArchivedPurchase,
+    CostCenter,
+    CostCenterBalance,
+    Funding,
+    ItemKind,
+    LedgerEntry,
+    Purchase,
+    SearchDocument,
+    compute_runways,
+)
 
 
 def home(request: HttpRequest) -> HttpRequest:
@@ -31,8 +62,20 @@ def resolve_id(request: HttpRequest, id: str) -> HttpResponse:
 
 class CostCenterListView(ListView):
     model = CostCenter
-    context_object_name = "root_cost_centers"
-    queryset = CostCenter.objects.filter(parent__isnull=True)
+    context_object_name = "root_nodes"
+    template_name = "erp/costcenter_list.html"
+
+    def get_queryset(self):
+        roots = CostCenter.build_tree()
+        nodes, cost_centers = list(roots), []
+        while nodes:
+            node = nodes.pop()
+            cost_centers.append(node.cost_center)
+            nodes += node.children
+        runways = compute_runways(loaded=cost_centers)
+        for cc in cost_centers:
+            cc.runway = runways[cc.id]
+        return roots
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -40,20 +83,231 @@ class CostCenterListView(ListView):
         return context
 
 
+def cost_center_runway(request: HttpRequest, pk: int) -> JsonResponse:
+    """
+    The runways of a cost center and of everything below it. Not
+    conditional, since they change with time as well as with the ledger.
+    """
+    cost_center = get_object_or_404(CostCenter, pk=pk)
+    form = RunwayForm(request.GET)
+    if not form.is_valid():
+        raise BadRequest(form.errors.as_text())
+    runways = compute_runways(cost_center, window_days=form.cleaned_data["window"])
+    return JsonResponse(
+        {
+            **runways.pop(cost_center.id).as_dict(),
+            "descendants": {
+                cc_id: runway.as_dict() for cc_id, runway in runways.items()
+            },
+        }
+    )
+
+
+def search_item_kinds(request: HttpRequest) -> JsonResponse:
+    """
+    Item kinds whose names start with the `q` parameter, for autocompletion.
+    """
+    form = ItemKindSearchForm(request.GET)
+    if not form.is_valid():
+        raise BadRequest(form.errors.as_text())
+    item_kinds = ItemKind.search(
+        form.cleaned_data["q"], form.cleaned_data["limit"] or 10
+    ).values("id", "name")
+    return JsonResponse({"results": list(item_kinds)})
+
+
+# ETags of ledger pages are built from balance versions (see
+# CostCenterBalance), so checking them costs one indexed lookup, and 304
+# responses skip the ledger queries entirely. They are weak because exports
+# may be gzipped on the fly. There is no Last-Modified, since deletions
+# would not move it.
+
+
+def ledger_etag(request: HttpRequest, *args, **kwargs) -> str:
+    """
+    The ETag of pages that show transactions of every cost center.
+    """
+    return f'W/"{CostCenterBalance.latest_version()}"'
+
+
+def cost_center_etag(request: HttpRequest, pk: int, **kwargs) -> Optional[str]:
+    """
+    The ETag of pages that show transactions of a cost center's subtree.
+    """
+    version = (
+        CostCenterBalance.objects.filter(pk=pk)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return None if version is None else f'W/"{pk}-{version}"'
+
+
+def _export_form(request: HttpRequest) -> ExportForm:
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        raise BadRequest(form.errors.as_text())
+    return form
+
+
+@condition(etag_func=cost_center_etag)
+def export_balance_sheet(request: HttpRequest, pk: int) -> HttpResponse:
+    cost_center = get_object_or_404(CostCenter, pk=pk)
+    form = _export_form(request)
+    start, end = form.start_datetime, form.end_datetime
+
+    # An empty t_id sorts before every real one, so these keys select
+    # t_date >= start and t_date < end.
+    transactions = cost_center.query_balance_sheet(
+        after=(start, "") if start else None,
+        before=(end, "") if end else None,
+    ).order_by("t_date", "t_id")
+
+    return stream_export(
+        request,
+        transactions,
+        ["t_id", "t_date", "t_name", "t_cost_center", "t_cost_center_id", "t_price"],
+        form.cleaned_data["format"],
+        f"cost-center-{cost_center.id}",
+    )
+
+
+@condition(etag_func=ledger_etag)
+def export_purchases(request: HttpRequest) -> HttpResponse:
+    form = _export_form(request)
+    purchases = Purchase.objects.order_by("purchase_date", "id")
+    if form.start_datetime:
+        purchases = purchases.filter(purchase_date__gte=form.start_datetime)
+    if form.end_datetime:
+        purchases = purchases.filter(purchase_date__lt=form.end_datetime)
+
+    columns = [
+        "id",
+        "purchase_date",
+        "item_name",
+        "quantity",
+        "total_price",
+        "supplier",
+        "comment",
+        "cost_center_id",
+        "cost_center_name",
+    ]
+    purchases = purchases.values(
+        "id",
+        "purchase_date",
+        "quantity",
+        "total_price",
+        "supplier",
+        "comment",
+        "cost_center_id",
+        item_name=F("item__name"),
+        cost_center_name=F("cost_center__name"),
+    )
+    return stream_export(
+        request, purchases, columns, form.cleaned_data["format"], "purchases"
+    )
+
+
+@condition(etag_func=ledger_etag)
+def export_fundings(request: HttpRequest) -> HttpResponse:
+    form = _export_form(request)
+    fundings = Funding.objects.order_by("funding_date", "id")
+    if form.start_datetime:
+        fundings = fundings.filter(funding_date__gte=form.start_datetime)
+    if form.end_datetime:
+        fundings = fundings.filter(funding_date__lt=form.end_datetime)
+
+    columns = [
+        "id",
+        "funding_date",
+        "name",
+        "credit",
+        "comment",
+        "cost_center_id",
+        "cost_center_name",
+    ]
+    fundings = fundings.values(
+        "id",
+        "funding_date",
+        "name",
+        "credit",
+        "comment",
+        "cost_center_id",
+        cost_center_name=F("cost_center__name"),
+    )
+    return stream_export(
+        request, fundings, columns, form.cleaned_data["format"], "fundings"
+    )
+
+
+def format_cursor(key: Optional[Tuple[datetime, str]]) -> Optional[str]:
+    """
+    Encodes a balance sheet (t_date, t_id) key for use in a URL.
+    """
+    if key is None:
+        return None
+    t_date, t_id = key
+    return f"{t_date.isoformat()},{t_id}"
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    """
+    Decodes a cursor made by format_cursor().
+    """
+    if not cursor:
+        return None
+    try:
+        t_date, t_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(t_date), t_id
+    except ValueError:
+        raise BadRequest("Invalid cursor")
+
+
+@method_decorator(condition(etag_func=cost_center_etag), name="dispatch")
 class CostCenterDetailView(DetailView):
     model = CostCenter
+    queryset = CostCenter.objects.select_related("balance")
     context_object_name = "cost_center"
+    page_size = 100
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["transactions"] = self.object.query_balance_sheet().order_by("t_date")
+        after = parse_cursor(self.request.GET.get("after"))
+        before = parse_cursor(self.request.GET.get("before"))
+        page = cached_for_cost_center(
+            self.object,
+            "balance-sheet-page",
+            (self.page_size, after, before),
+            lambda: self.object.balance_sheet_page(
+                self.page_size, after=after, before=before
+            ),
+        )
+        context["transactions"] = page.rows
+        context["previous_cursor"] = format_cursor(page.previous_key)
+        context["next_cursor"] = format_cursor(page.next_key)
         context["page_title"] = f"Cost Center: {self.object.name}"
         return context
 
 
-class PurchaseDetailView(DetailView):
+class ArchivedDetailView(DetailView):
+    """
+    Shows the archived copy of an object that was moved to `archive_model`
+    by `manage.py archive_transactions`, under the same id.
+    """
+
+    archive_model = None
+
+    def get_object(self, queryset=None):
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            return super().get_object(self.archive_model.objects.all())
+
+
+class PurchaseDetailView(ArchivedDetailView):
     model = Purchase
+    archive_model = ArchivedPurchase
     context_object_name = "purchase"
+    template_name = "erp/purchase_detail.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -61,22 +315,139 @@ class PurchaseDetailView(DetailView):
         return context
 
 
-class PurchasesListView(ListView):
-    model = Purchase
-    context_object_name = "purchases"
-    queryset = Purchase.objects.order_by("-purchase_date")
+@method_decorator(condition(etag_func=ledger_etag), name="dispatch")
+class LedgerListView(ListView):
+    """
+    A list of purchases or fundings, newest first, filtered by the query
+    parameters in filter_form_class and paginated by a (date, id) keyset.
+    """
+
+    date_field: str
+    filter_form_class = FundingFilterForm
+    page_size = 100
+    page_title: str
+
+    def filter_queryset(self, queryset, filters: FundingFilterForm):
+        cost_center = filters.cleaned_data["cost_center"]
+        if cost_center is not None:
+            queryset = queryset.filter(cost_center__in=cost_center.subtree())
+        if filters.start_datetime:
+            queryset = queryset.filter(
+                **{f"{self.date_field}__gte": filters.start_datetime}
+            )
+        if filters.end_datetime:
+            queryset = queryset.filter(
+                **{f"{self.date_field}__lt": filters.end_datetime}
+            )
+        return queryset
+
+    def key_q(self, lookup: str, key: Tuple[datetime, str]) -> Q:
+        t_date, t_id = key
+        try:
+            t_id = int(t_id)
+        except ValueError:
+            raise BadRequest("Invalid cursor")
+        return Q(**{f"{self.date_field}__{lookup}": t_date}) | Q(
+            **{self.date_field: t_date, f"id__{lookup}": t_id}
+        )
+
+    def get_queryset(self):
+        self.filters = self.filter_form_class(self.request.GET)
+        if not self.filters.is_valid():
+            raise BadRequest(self.filters.errors.as_text())
+        queryset = self.filter_queryset(super().get_queryset(), self.filters)
+
+        newest_first = (f"-{self.date_field}", "-id")
+        after = parse_cursor(self.request.GET.get("after"))
+        before = parse_cursor(self.request.GET.get("before"))
+        if before is not None:
+            # Newer rows than the cursor, fetched oldest first.
+            rows = list(
+                queryset.filter(self.key_q("gt", before)).order_by(
+                    self.date_field, "id"
+                )[: self.page_size + 1]
+            )
+            has_previous = len(rows) > self.page_size
+            rows = rows[: self.page_size]
+            rows.reverse()
+            has_next = True
+        else:
+            if after is not None:
+                queryset = queryset.filter(self.key_q("lt", after))
+            rows = list(queryset.order_by(*newest_first)[: self.page_size + 1])
+            has_next = len(rows) > self.page_size
+            rows = rows[: self.page_size]
+            has_previous = after is not None
+
+        self.previous_url = (
+            self.page_url("before", rows[0]) if rows and has_previous else None
+        )
+        self.next_url = self.page_url("after", rows[-1]) if rows and has_next else None
+        return rows
+
+    def page_url(self, direction: str, row) -> str:
+        params = self.request.GET.copy()
+        params.pop("after", None)
+        params.pop("before", None)
+        params[direction] = format_cursor((getattr(row, self.date_field), str(row.id)))
+        return f"?{params.urlencode()}"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["page_title"] = "Purchases"
+        context["filters"] = self.filters
+        context["previous_url"] = self.previous_url
+        context["next_url"] = self.next_url
+        context["page_title"] = self.page_title
         return context
 
 
+class PurchasesListView(LedgerListView):
+    model = Purchase
+    context_object_name = "purchases"
+    template_name = "erp/purchase_list.html"
+    date_field = "purchase_date"
+    filter_form_class = PurchaseFilterForm
+    queryset = Purchase.objects.select_related("item", "cost_center").only(
+        "id",
+        "purchase_date",
+        "comment",
+        "quantity",
+        "total_price",
+        "item__name",
+        "cost_center__name",
+    )
+    page_title = "Purchases"
+
+    def filter_queryset(self, queryset, filters: PurchaseFilterForm):
+        queryset = super().filter_queryset(queryset, filters)
+        if filters.cleaned_data["item"] is not None:
+            queryset = queryset.filter(item_id=filters.cleaned_data["item"])
+        return queryset
+
+
 class PurchaseCreateView(CreateView):
     model = Purchase
     form_class = PurchaseCreateForm
 
 
+def create_purchase_batch(request: HttpRequest) -> HttpResponse:
+    """
+    Entry of many purchases at once, e.g. the lines of a supplier invoice.
+    All lines are validated together and saved in one transaction.
+    """
+    data = request.POST if request.method == "POST" else None
+    form = PurchaseBatchForm(data)
+    lines = PurchaseLineFormSet(data, prefix="lines")
+    if data is not None and form.is_valid() and lines.is_valid():
+        form.save(lines)
+        return redirect(f"/purchases?cost_center={form.cleaned_data['cost_center'].id}")
+    return render(
+        request,
+        "erp/purchase_batch_form.html",
+        {"page_title": "Create purchases", "form": form, "lines": lines},
+    )
+
+
 class PurchaseUpdateView(UpdateView):
     model = Purchase
     fields = ["name"]
@@ -87,8 +458,10 @@ class PurchaseDeleteView(DeleteView):
     success_url = reverse_lazy("purchases")
 
 
-class FundingDetailView(DetailView):
+class FundingDetailView(ArchivedDetailView):
     model = Funding
+    archive_model = ArchivedFunding
+    template_name = "erp/funding_detail.html"
     context_object_name = "funding"
 
     def get_context_data(self, **kwargs):
@@ -97,12 +470,65 @@ class FundingDetailView(DetailView):
         return context
 
 
-class FundingsListView(ListView):
+class FundingsListView(LedgerListView):
     model = Funding
     context_object_name = "fundings"
-    queryset = Funding.objects.order_by("-funding_date")
+    template_name = "erp/funding_list.html"
+    date_field = "funding_date"
+    filter_form_class = FundingFilterForm
+    queryset = Funding.objects.select_related("cost_center").only(
+        "id",
+        "funding_date",
+        "name",
+        "credit",
+        "cost_center__name",
+    )
+    page_title = "Fundings"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["page_title"] = "Fundings"
-        return context
+
+@condition(etag_func=ledger_etag)
+def search(request: HttpRequest) -> HttpResponse:
+    """
+    Full-text search over purchases and fundings, best matches first.
+    """
+    form = SearchForm(request.GET or None)
+    results = []
+    if form.is_bound:
+        if not form.is_valid():
+            raise BadRequest(form.errors.as_text())
+        results = list(
+            SearchDocument.search(
+                form.cleaned_data["q"],
+                cost_center=form.cleaned_data["cost_center"],
+                start=form.start_datetime,
+                end=form.end_datetime,
+            )
+        )
+        for entry in results:
+            entry.href = LedgerEntry.href(entry.source)
+    return render(
+        request,
+        "erp/search.html",
+        {"page_title": "Search", "filters": form, "results": results},
+    )
+
+
+@condition(etag_func=ledger_etag)
+def analytics(request: HttpRequest, report: str) -> JsonResponse:
+    """
+    A spend analytics report (see erp.analytics) as JSON, optionally limited
+    to a cost center's subtree and a date range.
+    """
+    if report not in REPORTS:
+        raise Http404(f"Unknown report {report!r}")
+    form = FundingFilterForm(request.GET)
+    if not form.is_valid():
+        raise BadRequest(form.errors.as_text())
+    return JsonResponse(
+        run_report(
+            report,
+            cost_center=form.cleaned_data["cost_center"],
+            start=form.start_datetime,
+            end=form.end_datetime,
+        )
+    )
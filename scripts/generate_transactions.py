@@ -1,68 +1,171 @@
 """
-Generates a bunch of random transactions and fundings.
+Generates a reproducible synthetic dataset of cost centers, item kinds,
+purchases and fundings, for load testing and performance investigations.
+
+Options are passed as key=value pairs, e.g.
+
+    ./manage.py runscript generate_transactions --script-args seed=4 purchases=1000000
+
+The same seed and options always produce the same dataset. Rows are written
+with bulk inserts, and stored balances, snapshots, daily spend, ledger entries
+and the search index are rebuilt once at the end.
 """
 
 import random
-
 from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, List
 
-from erp.models import *
-
-def run():
-    iks = make_item_kinds()
-    ccs = make_cost_centers()
-    now = datetime.now(tz=timezone.utc)
-
-    # Make purchases
-    for i in range(0, 1000):
-        days_before = random.random() * 365 * 3
-        date = now - timedelta(days=days_before)
-        Purchase.objects.create(
-            purchase_date=date,
-            item=random.choice(iks),
-            quantity=random.randint(1, 100),
-            total_price=random.random() * 100,
-            supplier="https://example.com",
-            cost_center=random.choice(ccs)
-        )
+from django.db import transaction
 
-    # Make fundings
-    for i in range(0, 50):
-        days_before = random.random() * 365 * 3
-        date = now - timedelta(days=days_before)
-        Funding.objects.create(
-            name=f"Funding {i}",
-            funding_date=date,
-            cost_center=random.choice(ccs),
-            credit=random.random() * 2000,
-        )
+from erp.models import (
+    BalanceSnapshot,
+    CostCenter,
+    CostCenterBalance,
+    CostCenterClosure,
+    DailySpend,
+    Funding,
+    ItemKind,
+    LedgerEntry,
+    Purchase,
+    SearchDocument,
+    item_name_key,
+)
 
-def make_item_kinds():
-    items = [
-        ItemKind.objects.create(
-            name=name,
-            description="A test item for generating transactions",
-        )
-        for name in ["Apple", "Banana", "Pear", "Lemon", "Lime", "Watermelon"]
-    ]
+DEFAULTS = {
+    "seed": 0,
+    "purchases": 1000,
+    "fundings": 50,
+    # Levels below the root, and children per cost center.
+    "depth": 2,
+    "fan_out": 3,
+    "item_kinds": 6,
+    # Transactions are spread over this many days before `end`.
+    "days": 3 * 365,
+    "end": "2024-01-01",
+    # "uniform", or "recent" to make recent dates more likely.
+    "distribution": "uniform",
+    "batch_size": 10000,
+}
 
-    return items
 
+def run(*args):
+    options = dict(DEFAULTS)
+    for arg in args:
+        key, _, value = arg.partition("=")
+        key = key.replace("-", "_")
+        if key not in DEFAULTS:
+            raise ValueError(
+                f"Unknown option {key!r}, expected one of {list(DEFAULTS)}"
+            )
+        options[key] = type(DEFAULTS[key])(value)
 
-def make_cost_centers():
-    cc1 = CostCenter.objects.create(
-        name="Slush Fund",
-        description="Gay",
-    )
-    cc2 = CostCenter.objects.create(
-        name="Engineering",
-        description="Gay",
-        parent=cc1,
+    generate(**options)
+
+
+def generate(log: Callable[[str], None] = print, **options) -> Dict[str, int]:
+    """
+    Generates a dataset with the given options (see DEFAULTS) and returns the
+    number of rows created per model.
+    """
+    options = {**DEFAULTS, **options}
+    rng = random.Random(options["seed"])
+    end = datetime.fromisoformat(options["end"]).replace(tzinfo=timezone.utc)
+    batch_size = options["batch_size"]
+
+    def random_date() -> datetime:
+        x = rng.random()
+        if options["distribution"] == "recent":
+            x = x * x
+        return end - timedelta(seconds=int(x * options["days"] * 86400))
+
+    def random_amount(low: int, high: int) -> Decimal:
+        return Decimal(rng.randint(low * 100, high * 100)).scaleb(-2)
+
+    with transaction.atomic():
+        ccs = make_cost_centers(options["seed"], options["depth"], options["fan_out"])
+        iks = make_item_kinds(options["seed"], options["item_kinds"])
+    log(f"Created {len(ccs)} cost centers and {len(iks)} item kinds")
+
+    for i in range(0, options["purchases"], batch_size):
+        with transaction.atomic():
+            Purchase.objects.bulk_create(
+                Purchase(
+                    purchase_date=random_date(),
+                    item_id=rng.choice(iks),
+                    quantity=rng.randint(1, 100),
+                    total_price=random_amount(1, 100),
+                    supplier="https://example.com",
+                    cost_center_id=rng.choice(ccs),
+                )
+                for _ in range(i, min(i + batch_size, options["purchases"]))
+            )
+        log(f"Created {min(i + batch_size, options['purchases'])} purchases")
+
+    for i in range(0, options["fundings"], batch_size):
+        with transaction.atomic():
+            Funding.objects.bulk_create(
+                Funding(
+                    name=f"Funding {j}",
+                    funding_date=random_date(),
+                    cost_center_id=rng.choice(ccs),
+                    credit=random_amount(1, 2000),
+                )
+                for j in range(i, min(i + batch_size, options["fundings"]))
+            )
+        log(f"Created {min(i + batch_size, options['fundings'])} fundings")
+
+    CostCenterBalance.rebuild()
+    BalanceSnapshot.rebuild()
+    DailySpend.rebuild()
+    LedgerEntry.rebuild()
+    SearchDocument.rebuild()
+    log(
+        "Rebuilt cost center balances, snapshots, daily spend, ledger entries and "
+        "search index"
     )
-    cc3 = CostCenter.objects.create(
-        name="Chemistry",
-        description="Gay",
-        parent=cc1,
+
+    return {
+        "cost_centers": len(ccs),
+        "item_kinds": len(iks),
+        "purchases": options["purchases"],
+        "fundings": options["fundings"],
+    }
+
+
+def make_item_kinds(seed: int, count: int) -> List[int]:
+    names = [f"Item {seed}-{i}" for i in range(count)]
+    ids = ItemKind.ids_for_names(
+        names, description="A test item for generating transactions"
     )
+    return [ids[item_name_key(name)] for name in names]
+
+
+def make_cost_centers(seed: int, depth: int, fan_out: int) -> List[int]:
+    """
+    Creates a tree with one root, `depth` levels below it and `fan_out`
+    children per node, inserting one level at a time. Returns all ids.
+    """
+    root = CostCenter.objects.create(name=f"Generated {seed}", description="Gay")
+    level = [root]
+    ids = [root.id]
+    for d in range(1, depth + 1):
+        children = CostCenter.objects.bulk_create(
+            CostCenter(
+                name=f"Generated {seed} L{d}-{i}",
+                description="Gay",
+                parent=parent,
+            )
+            for i, parent in enumerate(
+                parent for parent in level for _ in range(fan_out)
+            )
+        )
+        for child in children:
+            child.path = f"{child.parent.path}/{child.id}"
+        CostCenter.objects.bulk_update(children, ["path"])
+        CostCenterClosure.add(children)
+
+        level = children
+        ids += [child.id for child in children]
 
-    return [cc1, cc2, cc3]
+    return ids